@@ -0,0 +1,142 @@
+from collections import defaultdict
+
+from dinheiro import pago_ate, para_centavos
+
+# Contadores por chave, gravados no Meta como "<prefixo>:<chave>"
+CONTADORES_POR_CHAVE = {
+    'por_categoria': 'categoria',
+    'por_cartao': 'cartao',
+    'por_financiamento': 'financiamento',
+    'recebimentos_por_mes': 'mes_recebimentos',
+    'gastos_por_mes': 'mes_gastos',
+}
+
+# Contadores simples: atributo -> chave no Meta
+CONTADORES = {
+    'saldo': 'saldo',
+    'saldo_inicial': 'saldo_inicial',
+    'recebimentos': 'total_recebimentos',
+    'gastos': 'total_gastos',
+    'faturas_pagas': 'faturas_pagas',
+    'parcelas_pagas': 'parcelas_pagas',
+    'descontos': 'descontos',
+}
+
+
+def valor_pago_financiamento(financiamento):
+    # Valor nominal (em centavos) das parcelas já pagas do financiamento, com o
+    # resto da divisão do valor total na última parcela
+    return pago_ate(para_centavos(financiamento['valor_total']), financiamento['parcelas'], financiamento['parcelas_pagas'])
+
+
+# Totais mantidos a cada operação, em centavos, para que o saldo e os
+# relatórios não precisem percorrer os lançamentos
+class Agregados:
+    def __init__(self):
+        self.saldo = 0
+        self.saldo_inicial = 0
+        self.recebimentos = 0
+        self.gastos = 0
+        self.faturas_pagas = 0
+        self.parcelas_pagas = 0
+        self.descontos = 0  # Diferença entre o valor nominal e o pago antecipadamente
+        self.por_categoria = defaultdict(int)
+        self.por_cartao = defaultdict(int)  # Gastos no crédito
+        self.por_financiamento = defaultdict(int)  # Valor nominal pago
+        # Partição mensal ('AAAA-MM') usada pelos relatórios mensal e anual
+        self.recebimentos_por_mes = defaultdict(int)
+        self.gastos_por_mes = defaultdict(int)
+
+    def definir_saldo_inicial(self, centavos):
+        self.saldo += centavos - self.saldo_inicial
+        self.saldo_inicial = centavos
+
+    def recebimento(self, centavos, mes=None):
+        self.recebimentos += centavos
+        self.saldo += centavos
+        if mes:
+            self.recebimentos_por_mes[mes] += centavos
+
+    def gasto(self, centavos, categoria, tipo, cartao, mes=None):
+        self.gastos += centavos
+        self.por_categoria[categoria] += centavos
+        if mes:
+            self.gastos_por_mes[mes] += centavos
+        if tipo == 'débito':
+            self.saldo -= centavos
+        elif tipo == 'crédito':
+            self.por_cartao[cartao] += centavos
+
+    def pagar_fatura(self, centavos):
+        self.faturas_pagas += centavos
+        self.saldo -= centavos
+
+    def pagar_parcelas(self, nominal, pago):
+        self.parcelas_pagas += nominal
+        self.descontos += nominal - pago
+        self.saldo -= pago
+
+    def pagar_financiamento(self, descricao, nominal, pago):
+        self.por_financiamento[descricao] += nominal
+        self.descontos += nominal - pago
+        self.saldo -= pago
+
+    def para_meta(self):
+        meta = {chave: getattr(self, atributo) for atributo, chave in CONTADORES.items()}
+        for atributo, prefixo in CONTADORES_POR_CHAVE.items():
+            for chave, valor in getattr(self, atributo).items():
+                meta[f'{prefixo}:{chave}'] = valor
+        return meta
+
+    @classmethod
+    def de_meta(cls, meta):
+        # None se o arquivo ainda não guarda os agregados
+        if 'saldo' not in meta:
+            return None
+        agregados = cls()
+        for atributo, chave in CONTADORES.items():
+            setattr(agregados, atributo, int(meta.get(chave, 0)))
+        prefixos = {prefixo: atributo for atributo, prefixo in CONTADORES_POR_CHAVE.items()}
+        for chave, valor in meta.items():
+            prefixo, _, nome = str(chave).partition(':')
+            if nome and prefixo in prefixos:
+                getattr(agregados, prefixos[prefixo])[nome] = int(valor)
+        return agregados
+
+    @classmethod
+    def recalcular(cls, financas, base=None):
+        # Recalcula todos os contadores a partir dos lançamentos. O saldo inicial
+        # e os descontos não são deriváveis dos registros e vêm de `base`.
+        agregados = cls()
+        if base is not None:
+            agregados.saldo_inicial = base.saldo_inicial
+            agregados.descontos = base.descontos
+
+        gastos = financas.gastos
+        agregados.recebimentos = financas.recebimentos.soma(em_centavos=True)
+        agregados.gastos = gastos.soma(em_centavos=True)
+        agregados.recebimentos_por_mes.update(financas.recebimentos.somar_por_mes())
+        agregados.gastos_por_mes.update(gastos.somar_por_mes())
+        agregados.por_categoria.update(gastos.somar_por('categoria', em_centavos=True))
+        agregados.por_cartao.update(gastos.somar_por('cartao', mascara=gastos.mascara('tipo', 'crédito'), em_centavos=True))
+        agregados.faturas_pagas = financas.faturas.soma(mascara=financas.faturas.coluna('pago'), em_centavos=True)
+        agregados.parcelas_pagas = financas.parcelas.soma(mascara=financas.parcelas.coluna('pago'), em_centavos=True)
+        for financiamento in financas.financiamentos:
+            agregados.por_financiamento[financiamento['descricao']] = valor_pago_financiamento(financiamento)
+
+        debitos = gastos.soma(mascara=gastos.mascara('tipo', 'débito'), em_centavos=True)
+        agregados.saldo = (agregados.saldo_inicial + agregados.recebimentos - debitos - agregados.faturas_pagas
+                           - agregados.parcelas_pagas - sum(agregados.por_financiamento.values()) + agregados.descontos)
+        return agregados
+
+    def totais_mes(self, ano, mes):
+        # (recebimentos, gastos) do mês, em centavos
+        chave = f'{ano:04d}-{mes:02d}'
+        return self.recebimentos_por_mes.get(chave, 0), self.gastos_por_mes.get(chave, 0)
+
+    def divergencias(self, outro):
+        # Lista de (contador, valor aqui, valor no outro) que não batem
+        meta, meta_outro = self.para_meta(), outro.para_meta()
+        return [(chave, meta.get(chave, 0), meta_outro.get(chave, 0))
+                for chave in dict.fromkeys(list(meta) + list(meta_outro))
+                if meta.get(chave, 0) != meta_outro.get(chave, 0)]
@@ -0,0 +1,642 @@
+import atexit
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+from xml.sax.saxutils import escape, quoteattr, unescape
+
+import numpy as np
+
+# O pandas (e o openpyxl, usado por ele) é importado só dentro das funções que
+# leem ou gravam tabelas, para que comandos simples não paguem esse custo
+
+
+def _para_json(valor):
+    # Converte tipos do numpy/pandas (int64, bool_, Timestamp...) em tipos nativos
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return str(valor)
+
+
+def caminho_diario(arquivo):
+    return os.path.splitext(arquivo)[0] + '.diario'
+
+
+# Diário (write-ahead log) com uma linha JSON por alteração, gravado com fsync
+class DiarioTransacoes:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.seq = 0  # Último número de sequência gravado
+        self.registros = 0  # Registros desde a última compactação
+        self._arquivo = None
+
+    def ler(self):
+        # Retorna os registros válidos, descartando uma última linha truncada
+        registros = []
+        if not os.path.exists(self.caminho):
+            return registros
+
+        posicao_valida = 0
+        with open(self.caminho, 'rb') as arquivo:
+            for linha in arquivo:
+                if not linha.endswith(b'\n'):
+                    break
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    # Linha incompleta de uma gravação interrompida
+                    break
+                registros.append(registro)
+                posicao_valida += len(linha)
+
+        if posicao_valida < os.path.getsize(self.caminho):
+            with open(self.caminho, 'r+b') as arquivo:
+                arquivo.truncate(posicao_valida)
+
+        if registros:
+            self.seq = max(self.seq, registros[-1]['seq'])
+        self.registros = len(registros)
+        return registros
+
+    def registrar(self, alteracoes, meta):
+        if self._arquivo is None:
+            self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+        self.seq += 1
+        registro = {'seq': self.seq, 'alteracoes': alteracoes, 'meta': meta}
+        linha = json.dumps(registro, default=_para_json, ensure_ascii=False)
+        self._arquivo.write(linha + '\n')
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+        self.registros += 1
+
+    def truncar(self, ate=None):
+        # Sem `ate`, esvazia o diário; com `ate`, descarta só os registros até
+        # esse número de sequência, já incorporados ao arquivo principal
+        self.fechar()
+        manter = [] if ate is None else [registro for registro in self.ler() if registro['seq'] > ate]
+        temporario = self.caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            for registro in manter:
+                arquivo.write(json.dumps(registro, default=_para_json, ensure_ascii=False) + '\n')
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, self.caminho)
+        self.registros = len(manter)
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+
+# Thread que grava instantâneos dos dados fora da thread principal.
+# Cada notificação substitui o instantâneo pendente (ou é combinada a ele, se
+# houver `combinar`), então uma rajada de alterações vira uma única gravação,
+# feita quando as notificações param por `atraso` segundos (ou após
+# `espera_maxima`, se não pararem).
+class GravadorSegundoPlano:
+    def __init__(self, gravar, combinar=None, atraso=0.5, espera_maxima=5.0):
+        self.gravar = gravar  # Função(instantaneo) -> True se gravou
+        self.combinar = combinar  # Função(anterior, novo) -> instantâneo com os dois
+        self.atraso = atraso
+        self.espera_maxima = espera_maxima
+        self._condicao = threading.Condition()
+        self._pendente = None
+        self._nao_gravado = None  # Último instantâneo cuja gravação falhou
+        self._gravando = False
+        self._encerrando = False
+        self._thread = threading.Thread(target=self._executar, name='GravadorSegundoPlano', daemon=True)
+        self._thread.start()
+        atexit.register(self.encerrar)
+
+    @property
+    def ocupado(self):
+        return self._pendente is not None or self._gravando
+
+    def notificar(self, instantaneo):
+        with self._condicao:
+            if self._pendente is not None and self.combinar:
+                instantaneo = self.combinar(self._pendente, instantaneo)
+            self._pendente = instantaneo
+            self._condicao.notify_all()
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                while self._pendente is None and not self._encerrando:
+                    self._condicao.wait()
+                limite = time.monotonic() + self.espera_maxima
+                while self._pendente is not None and not self._encerrando:
+                    anterior = self._pendente
+                    espera = min(self.atraso, limite - time.monotonic())
+                    if espera <= 0:
+                        break
+                    self._condicao.wait(espera)
+                    if self._pendente is anterior:
+                        break
+                instantaneo, self._pendente = self._pendente, None
+                if instantaneo is None:
+                    if self._encerrando:
+                        return
+                    continue
+                self._gravando = True
+            gravado = False
+            try:
+                gravado = self.gravar(instantaneo)
+            finally:
+                with self._condicao:
+                    if gravado:
+                        self._nao_gravado = None
+                    elif self._pendente is None:
+                        self._nao_gravado = instantaneo
+                    elif self.combinar:
+                        self._pendente, self._nao_gravado = self.combinar(instantaneo, self._pendente), None
+                    self._gravando = False
+                    self._condicao.notify_all()
+
+    def aguardar(self):
+        # Grava já o instantâneo pendente e espera a gravação em andamento
+        with self._condicao:
+            self._condicao.notify_all()
+            while self._pendente is not None or self._gravando:
+                self._condicao.wait()
+
+    def encerrar(self):
+        # Grava o que estiver pendente, repetindo uma gravação que falhou, e encerra a thread
+        atexit.unregister(self.encerrar)
+        with self._condicao:
+            if self._pendente is None:
+                self._pendente, self._nao_gravado = self._nao_gravado, None
+            self._encerrando = True
+            self._condicao.notify_all()
+        self._thread.join()
+
+
+# Colunas persistidas de cada entidade (abas do Excel / tabelas do SQLite)
+ESQUEMA = {
+    'Recebimentos': [('valor', 'REAL'), ('dia', 'INTEGER'), ('descricao', 'TEXT'), ('data', 'TEXT')],
+    'Gastos': [('Categoria', 'TEXT'), ('Valor', 'REAL'), ('Descricao', 'TEXT'), ('Tipo', 'TEXT'), ('Cartao', 'TEXT'),
+               ('Parcelado', 'INTEGER'), ('ParcelasTotal', 'INTEGER'), ('ParcelasRestantes', 'INTEGER'), ('Data', 'TEXT')],
+    'Financiamentos': [('valor_total', 'REAL'), ('parcelas', 'INTEGER'), ('parcelas_pagas', 'INTEGER'), ('descricao', 'TEXT')],
+    'Cartoes': [('nome', 'TEXT'), ('limite', 'REAL'), ('dia_vencimento', 'INTEGER')],
+    'Faturas': [('cartao', 'TEXT'), ('valor', 'REAL'), ('pago', 'INTEGER')],
+    'Parcelas': [('cartao', 'TEXT'), ('valor', 'REAL'), ('descricao', 'TEXT'), ('parcela_atual', 'INTEGER'),
+                 ('parcelas_total', 'INTEGER'), ('pago', 'INTEGER')],
+    'Investimentos': [('valor', 'REAL'), ('produto', 'TEXT'), ('banco', 'TEXT'), ('rendimento_mensal', 'REAL')],
+    'Categorias': [('nome', 'TEXT')],
+}
+
+# Índices secundários do SQLite: cartão, categoria e data. Os de faturas e
+# parcelas são parciais, só com as não pagas, que são as consultadas no banco.
+INDICES = {
+    'idx_gastos_categoria': ('Gastos', '"Categoria"', None),
+    'idx_gastos_cartao': ('Gastos', '"Cartao"', None),
+    'idx_gastos_data': ('Gastos', '"Data"', None),
+    'idx_recebimentos_data': ('Recebimentos', '"data"', None),
+    'idx_faturas_pendentes': ('Faturas', '"cartao"', '"pago" = 0'),
+    'idx_parcelas_pendentes': ('Parcelas', '"cartao"', '"pago" = 0'),
+}
+
+
+def _nativo(valor):
+    # sqlite3 não aceita tipos do numpy; NaN e NaT do pandas viram NULL e
+    # datas são gravadas como texto AAAA-MM-DD
+    if hasattr(valor, 'item'):
+        valor = valor.item()
+    if isinstance(valor, (float, datetime.date)) and valor != valor:
+        return None
+    if isinstance(valor, datetime.date):
+        return valor.strftime('%Y-%m-%d')
+    return valor
+
+
+def _valores_nativos(serie):
+    # Coluna inteira -> valores aceitos pelo sqlite3, convertidos de uma vez
+    if serie.dtype.kind == 'M':
+        return serie.dt.strftime('%Y-%m-%d').where(serie.notna(), None).tolist()
+    if serie.dtype == object:
+        return [_nativo(valor) for valor in serie]
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+
+# Planilhas gravadas por ArmazenamentoExcel levam esta marca no comentário do
+# zip; a versão muda quando as colunas de alguma aba mudarem, para que abas
+# gravadas por versões anteriores não sejam reaproveitadas
+MARCA_PLANILHA = b'financas-pessoais/1'
+
+ABAS_PLANILHA = list(ESQUEMA) + ['Meta']
+
+_CONTROLE_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_EPOCA_EXCEL = np.datetime64('1899-12-30', 'D')
+_ORDINAL_EPOCA_EXCEL = datetime.date(1899, 12, 30).toordinal()
+_CELULA_VAZIA = '<c/>'
+
+# Células exatamente como _celulas() as escreve: (t, s, valor, texto)
+_CELULA_LIDA = re.compile(rb'<c(?: t="(b|inlineStr)"| s="(1)")?(?:/>|>(?:<v>([^<]*)</v>|<is><t[^>]*>(.*?)</t></is>)</c>)',
+                          re.DOTALL)
+_NAO_INTEIRO = re.compile(rb'[.eEni]')  # Números gravados com repr(float)
+TAMANHO_BLOCO_XML = 1 << 20
+
+_PARTES_FIXAS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        + ''.join(f'<Override PartName="/xl/worksheets/{aba}.xml" '
+                  'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                  for aba in ABAS_PLANILHA)
+        + '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+        + ''.join(f'<sheet name={quoteattr(aba)} sheetId="{i}" r:id="rId{i}"/>'
+                  for i, aba in enumerate(ABAS_PLANILHA, start=1))
+        + '</sheets></workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + ''.join(f'<Relationship Id="rId{i}" Target="worksheets/{aba}.xml" '
+                  'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+                  for i, aba in enumerate(ABAS_PLANILHA, start=1))
+        + f'<Relationship Id="rId{len(ABAS_PLANILHA) + 1}" Target="styles.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+        '</Relationships>'),
+    # Estilo 0 padrão e estilo 1 para datas (aaaa-mm-dd)
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/></numFmts>'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'),
+}
+
+
+def _celula_texto(texto):
+    texto = _CONTROLE_XML.sub('', escape(texto))
+    espaco = ' xml:space="preserve"' if texto != texto.strip() else ''
+    return f'<c t="inlineStr"><is><t{espaco}>{texto}</t></is></c>'
+
+
+def _celula_data(dias):
+    return f'<c s="1"><v>{dias}</v></c>'
+
+
+def _celula(valor):
+    # Célula de um valor avulso (colunas de tipo misto)
+    if valor is None:
+        return _CELULA_VAZIA
+    if isinstance(valor, (bool, np.bool_)):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, np.integer)):
+        return f'<c><v>{int(valor)}</v></c>'
+    if isinstance(valor, (float, np.floating)):
+        return _CELULA_VAZIA if valor != valor else f'<c><v>{float(valor)!r}</v></c>'
+    if isinstance(valor, (datetime.date, np.datetime64)):
+        dias = np.datetime64(valor, 'D')
+        return _CELULA_VAZIA if np.isnat(dias) else _celula_data(int((dias - _EPOCA_EXCEL).astype(np.int64)))
+    return _celula_texto(str(valor))
+
+
+def _celulas(serie):
+    # Células XML de uma coluna, convertidas de forma vetorizada pelo tipo
+    import pandas as pd
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        fragmentos = [_celula(rotulo) for rotulo in serie.cat.categories] + [_CELULA_VAZIA]
+        return np.array(fragmentos, dtype=object)[serie.cat.codes.to_numpy()].tolist()
+    if pd.api.types.is_bool_dtype(serie):
+        return np.where(serie.to_numpy(bool), '<c t="b"><v>1</v></c>', '<c t="b"><v>0</v></c>').tolist()
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        datas = serie.to_numpy('datetime64[D]')
+        dias = (datas - _EPOCA_EXCEL).astype(np.int64).tolist()
+        return [_CELULA_VAZIA if vazia else _celula_data(d) for vazia, d in zip(np.isnat(datas).tolist(), dias)]
+    if pd.api.types.is_integer_dtype(serie):
+        return [f'<c><v>{v}</v></c>' for v in serie.tolist()]
+    if pd.api.types.is_float_dtype(serie):
+        return [_CELULA_VAZIA if v != v else f'<c><v>{v!r}</v></c>' for v in serie.tolist()]
+    return [_celula(v) for v in serie.tolist()]
+
+
+def _xml_aba(df):
+    # Aba completa em SpreadsheetML: cabeçalho na linha 1 e textos embutidos
+    # nas células, sem a tabela de textos compartilhada entre as abas, para que
+    # cada aba possa ser reaproveitada sozinha
+    colunas = [_celulas(df[nome]) for nome in df.columns]
+    partes = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+              '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>',
+              '<row r="1">' + ''.join(_celula_texto(str(nome)) for nome in df.columns) + '</row>']
+    partes.extend(f'<row r="{i}">{"".join(celulas)}</row>' for i, celulas in enumerate(zip(*colunas), start=2))
+    partes.append('</sheetData></worksheet>')
+    return ''.join(partes).encode('utf-8')
+
+
+def _valor_lido(celula):
+    # Célula lida -> texto, número (ainda em bytes), booleano, data ou None
+    tipo, estilo, valor, texto = celula
+    if tipo == b'inlineStr':
+        texto = texto.decode('utf-8')
+        return unescape(texto) if '&' in texto else texto
+    if tipo == b'b':
+        return valor == b'1'
+    if estilo:
+        return datetime.date.fromordinal(_ORDINAL_EPOCA_EXCEL + int(valor))
+    return valor or None
+
+
+def _numero(valor):
+    return float(valor) if _NAO_INTEIRO.search(valor) else int(valor)
+
+
+def _coluna_lida(valores):
+    # Valores de uma coluna -> array com o mesmo tipo que o pandas daria à
+    # coluna lida com read_excel (vazias como NaN/NaT)
+    tipos = {type(valor) for valor in valores if valor is not None}
+    vazias = len(tipos) < len({type(valor) for valor in valores})
+    if not tipos:
+        return np.full(len(valores), np.nan)
+    if tipos == {bytes}:
+        if not vazias and not _NAO_INTEIRO.search(b' '.join(valores)):
+            return np.array(valores).astype(np.int64)
+        return np.array([b'nan' if valor is None else valor for valor in valores]).astype(float)
+    if tipos == {datetime.date}:
+        return np.array(valores, dtype='datetime64[D]').astype('datetime64[ns]')
+    if tipos == {bool} and not vazias:
+        return np.array(valores, dtype=bool)
+    if tipos == {str}:
+        return np.array([np.nan if valor is None else valor for valor in valores], dtype=object)
+    return np.array([np.nan if valor is None else _numero(valor) if isinstance(valor, bytes) else valor
+                     for valor in valores], dtype=object)
+
+
+def _ler_aba_xml(pacote, aba):
+    # Lê uma aba gravada por _xml_aba em blocos de linhas completas, sem montar a
+    # árvore XML: cada linha tem uma célula por coluna, na ordem do cabeçalho
+    import pandas as pd
+    nomes = None
+    colunas = []
+    resto = b''
+    with pacote.open(f'xl/worksheets/{aba}.xml') as arquivo:
+        while True:
+            bloco = arquivo.read(TAMANHO_BLOCO_XML)
+            dados = resto + bloco
+            corte = dados.rfind(b'</row>') + len(b'</row>') if bloco else len(dados)
+            if corte < len(b'</row>'):
+                resto = dados
+                continue
+            parte, resto = dados[:corte], dados[corte:]
+            if nomes is None:
+                fim_cabecalho = parte.index(b'</row>')
+                nomes = [_valor_lido(celula) for celula in _CELULA_LIDA.findall(parte, 0, fim_cabecalho)]
+                colunas = [[] for _ in nomes]
+                parte = parte[fim_cabecalho:]
+            if nomes:
+                celulas = _CELULA_LIDA.findall(parte)
+                for coluna, valores in zip(colunas, (celulas[j::len(nomes)] for j in range(len(nomes)))):
+                    coluna.extend(map(_valor_lido, valores))
+            if not bloco:
+                break
+    return pd.DataFrame({nome: _coluna_lida(valores) for nome, valores in zip(nomes, colunas)})
+
+
+class ArmazenamentoExcel:
+    incremental = False  # Toda gravação regrava o arquivo inteiro
+    abas_adiaveis = ('Faturas', 'Parcelas', 'Investimentos')  # Lidas no primeiro acesso
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self._abas_gravadas = {}  # aba -> XML da última gravação, igual ao arquivo em disco
+
+    def existe(self):
+        return os.path.exists(self.arquivo)
+
+    def carregar(self, abas=None):
+        # Abre a planilha uma única vez e lê só as abas pedidas. As gravadas por
+        # salvar() são lidas direto do XML; as demais, pelo pandas/openpyxl.
+        import pandas as pd
+        abas = list(ESQUEMA) if abas is None else abas
+        if self._planilha_reaproveitavel():
+            with zipfile.ZipFile(self.arquivo) as pacote:
+                tabelas = {aba: _ler_aba_xml(pacote, aba) for aba in abas}
+                return tabelas, self._meta_xml(pacote)
+        tabelas = {}
+        meta = {}
+        with pd.ExcelFile(self.arquivo) as planilha:
+            presentes = set(planilha.sheet_names)
+            for aba in abas:
+                # Abas ausentes em arquivos de versões anteriores ficam vazias
+                tabelas[aba] = planilha.parse(aba) if aba in presentes else pd.DataFrame()
+            if 'Meta' in presentes:
+                df_meta = planilha.parse('Meta')
+                meta = dict(zip(df_meta['Chave'], df_meta['Valor']))
+        return tabelas, meta
+
+    def _meta_xml(self, pacote):
+        df_meta = _ler_aba_xml(pacote, 'Meta')
+        return {chave: valor.item() if hasattr(valor, 'item') else valor
+                for chave, valor in zip(df_meta.get('Chave', ()), df_meta.get('Valor', ()))}
+
+    def carregar_meta(self):
+        # Lê só a aba Meta: do XML nas planilhas gravadas por salvar(), senão pelo openpyxl
+        if self._planilha_reaproveitavel():
+            with zipfile.ZipFile(self.arquivo) as pacote:
+                return self._meta_xml(pacote)
+        from openpyxl import load_workbook
+        planilha = load_workbook(self.arquivo, read_only=True)
+        try:
+            if 'Meta' not in planilha.sheetnames:
+                return {}
+            linhas = planilha['Meta'].iter_rows(min_row=2, values_only=True)
+            return {chave: valor for chave, valor in linhas if chave is not None}
+        finally:
+            planilha.close()
+
+    def _planilha_reaproveitavel(self):
+        # A planilha em disco foi gravada por esta versão do salvar()?
+        try:
+            with zipfile.ZipFile(self.arquivo) as pacote:
+                return pacote.comment == MARCA_PLANILHA
+        except (OSError, zipfile.BadZipFile):
+            return False
+
+    def abas_reaproveitaveis(self):
+        # Abas que salvar() copia da última gravação quando não forem informadas
+        if self._abas_gravadas:
+            return set(self._abas_gravadas)
+        return set(ESQUEMA) if self._planilha_reaproveitavel() else set()
+
+    def salvar(self, tabelas, meta):
+        # Grava em arquivo temporário e renomeia, para que uma interrupção
+        # nunca deixe o Excel truncado. Só as abas de `tabelas` são convertidas;
+        # as demais são copiadas, já convertidas, da última gravação.
+        import pandas as pd
+        abas = {aba: _xml_aba(df) for aba, df in tabelas.items()}
+        faltando = [aba for aba in ESQUEMA if aba not in abas and aba not in self._abas_gravadas]
+        if faltando:
+            if not self._planilha_reaproveitavel():
+                raise ValueError(f"Abas sem dados para gravar: {', '.join(faltando)}")
+            with zipfile.ZipFile(self.arquivo) as pacote:
+                for aba in faltando:
+                    abas[aba] = pacote.read(f'xl/worksheets/{aba}.xml')
+        abas = {aba: abas[aba] if aba in abas else self._abas_gravadas[aba] for aba in ESQUEMA}
+        xml_meta = _xml_aba(pd.DataFrame({'Chave': list(meta), 'Valor': list(meta.values())}))
+
+        base, extensao = os.path.splitext(self.arquivo)
+        arquivo_temp = f"{base}.tmp{extensao}"
+        with zipfile.ZipFile(arquivo_temp, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as pacote:
+            pacote.comment = MARCA_PLANILHA
+            for nome, conteudo in _PARTES_FIXAS.items():
+                pacote.writestr(nome, conteudo)
+            for aba, xml in abas.items():
+                pacote.writestr(f'xl/worksheets/{aba}.xml', xml)
+            pacote.writestr('xl/worksheets/Meta.xml', xml_meta)
+        with open(arquivo_temp, 'rb') as arquivo:
+            os.fsync(arquivo.fileno())
+        os.replace(arquivo_temp, self.arquivo)
+        self._abas_gravadas = abas
+
+    def fechar(self):
+        pass
+
+
+class ArmazenamentoSQLite:
+    incremental = True  # Inserções e atualizações por linha
+    # Ler uma tabela depois custa o mesmo que na abertura, então todas as de
+    # lançamentos ficam para o primeiro acesso; o saldo e os totais vêm do Meta
+    abas_adiaveis = ('Recebimentos', 'Gastos', 'Faturas', 'Parcelas', 'Investimentos')
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self._conexao = None
+
+    def existe(self):
+        return os.path.exists(self.arquivo)
+
+    def conexao(self):
+        if self._conexao is None:
+            # O servidor usa a conexão a partir de threads diferentes, uma de cada vez
+            self._conexao = sqlite3.connect(self.arquivo, check_same_thread=False)
+            self._criar_esquema()
+        return self._conexao
+
+    def _criar_esquema(self):
+        with self._conexao:
+            for tabela, colunas in ESQUEMA.items():
+                definicoes = ', '.join(f'"{nome}" {tipo}' for nome, tipo in colunas)
+                if tabela == 'Categorias':
+                    chave = '"nome" TEXT PRIMARY KEY'
+                else:
+                    chave = '"id" INTEGER PRIMARY KEY, ' + definicoes
+                self._conexao.execute(f'CREATE TABLE IF NOT EXISTS "{tabela}" ({chave})')
+                self._adicionar_colunas(tabela, colunas)
+            self._conexao.execute('CREATE TABLE IF NOT EXISTS "Meta" ("Chave" TEXT PRIMARY KEY, "Valor")')
+            for nome, (tabela, colunas, condicao) in INDICES.items():
+                filtro = f' WHERE {condicao}' if condicao else ''
+                self._conexao.execute(f'CREATE INDEX IF NOT EXISTS {nome} ON "{tabela}" ({colunas}){filtro}')
+
+    def _adicionar_colunas(self, tabela, colunas):
+        # Colunas criadas em versões posteriores (ex.: data das transações)
+        existentes = {linha[1] for linha in self._conexao.execute(f'PRAGMA table_info("{tabela}")')}
+        for nome, tipo in colunas:
+            if nome not in existentes:
+                self._conexao.execute(f'ALTER TABLE "{tabela}" ADD COLUMN "{nome}" {tipo}')
+
+    def carregar(self, abas=None):
+        import pandas as pd
+        conexao = self.conexao()
+        tabelas = {}
+        for tabela in (list(ESQUEMA) if abas is None else abas):
+            colunas = ESQUEMA[tabela]
+            nomes = ', '.join(f'"{nome}"' for nome, _ in colunas)
+            ordem = '"nome"' if tabela == 'Categorias' else '"id"'
+            tabelas[tabela] = pd.read_sql_query(f'SELECT {nomes} FROM "{tabela}" ORDER BY {ordem}', conexao)
+        return tabelas, self.carregar_meta()
+
+    def carregar_meta(self):
+        return dict(self.conexao().execute('SELECT "Chave", "Valor" FROM "Meta"').fetchall())
+
+    def categorias_dos_gastos(self):
+        # Categorias usadas nos gastos, lidas só do índice por categoria
+        return [linha[0] for linha in self.conexao().execute(
+            'SELECT DISTINCT "Categoria" FROM "Gastos" WHERE "Categoria" IS NOT NULL')]
+
+    def pendentes_por_cartao(self, tabela):
+        # Total não pago (em centavos) por cartão nas Faturas ou Parcelas, somado no
+        # banco a partir do índice parcial das linhas não pagas
+        return dict(self.conexao().execute(
+            f'SELECT "cartao", SUM(CAST(ROUND("valor" * 100) AS INTEGER)) FROM "{tabela}" '
+            'WHERE "pago" = 0 GROUP BY "cartao"'))
+
+    def _inserir(self, tabela, linhas):
+        # linhas: [(id, valores na ordem do ESQUEMA)]; Categorias não tem id
+        colunas = [nome for nome, _ in ESQUEMA[tabela]]
+        if tabela != 'Categorias':
+            colunas = ['id'] + colunas
+        nomes = ', '.join(f'"{nome}"' for nome in colunas)
+        marcadores = ', '.join('?' * len(colunas))
+        self._conexao.executemany(f'INSERT OR REPLACE INTO "{tabela}" ({nomes}) VALUES ({marcadores})', linhas)
+
+    def _gravar_meta(self, meta):
+        self._conexao.executemany('INSERT OR REPLACE INTO "Meta" ("Chave", "Valor") VALUES (?, ?)',
+                                  [(chave, _nativo(valor)) for chave, valor in meta.items()])
+
+    def abas_reaproveitaveis(self):
+        # Tabelas ausentes de salvar() ficam como estão no banco
+        return set(ESQUEMA) if self.existe() else set()
+
+    def salvar(self, tabelas, meta):
+        conexao = self.conexao()
+        with conexao:
+            for tabela, df in tabelas.items():
+                conexao.execute(f'DELETE FROM "{tabela}"')
+                colunas = [_valores_nativos(df[nome]) if nome in df else [None] * len(df)
+                           for nome, _ in ESQUEMA[tabela]]
+                if tabela != 'Categorias':
+                    colunas.insert(0, range(len(df)))
+                self._inserir(tabela, zip(*colunas))
+            self._gravar_meta(meta)
+
+    def gravar(self, alteracoes, meta):
+        # Grava apenas as linhas alteradas, numa única transação
+        conexao = self.conexao()
+        with conexao:
+            por_tabela = {}
+            for tabela, chave, linha in alteracoes:
+                valores = [_nativo(linha.get(nome)) for nome, _ in ESQUEMA[tabela]]
+                por_tabela.setdefault(tabela, []).append(valores if tabela == 'Categorias' else [chave] + valores)
+            for tabela, linhas in por_tabela.items():
+                self._inserir(tabela, linhas)
+            self._gravar_meta(meta)
+
+    def fechar(self):
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
+
+
+def abrir_armazenamento(arquivo):
+    # Escolhe o formato pela extensão do arquivo
+    if os.path.splitext(arquivo)[1].lower() in ('.db', '.sqlite', '.sqlite3'):
+        return ArmazenamentoSQLite(arquivo)
+    return ArmazenamentoExcel(arquivo)
@@ -0,0 +1,211 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+import numpy as np
+
+from dinheiro import para_reais
+from main import FinancasPessoais
+
+# Medição de desempenho com ledgers sintéticos:
+#   python benchmark.py --tamanhos 1000 10000 --formatos db xlsx --saida resultados.json
+
+# Tamanhos medidos por padrão; 1000000 e acima só quando pedidos em --tamanhos
+TAMANHOS = (1000, 10000, 100000)
+FORMATOS = ('xlsx', 'db')
+
+
+def gerar_ledger(arquivo, entradas, cartoes=5, categorias=20, anos=3, financiamentos=5,
+                 fracao_credito=0.4, fracao_parcelada=0.2, semente=42):
+    # Cria `arquivo` com `entradas` lançamentos (10% recebimentos e 90% gastos)
+    # espalhados pelos últimos `anos`, gerados de forma vetorizada
+    import pandas as pd
+    gerador = np.random.default_rng(semente)
+    financas = FinancasPessoais(arquivo, saldo_inicial=0)
+    tabelas = {}
+
+    hoje = np.datetime64(date.today(), 'D')
+    mes_atual = hoje.astype('datetime64[M]')
+    nomes_cartoes = np.array([f"Cartão {i}" for i in range(cartoes)], dtype=object)
+    nomes_categorias = np.array([f"Categoria {i}" for i in range(categorias)], dtype=object)
+
+    def datas(quantidade):
+        return hoje - gerador.integers(0, 365 * anos, quantidade)
+
+    def dias(valores):
+        return (valores - valores.astype('datetime64[M]')).astype(np.int64) + 1
+
+    quantidade_recebimentos = max(1, entradas // 10)
+    datas_recebimentos = datas(quantidade_recebimentos)
+    tabelas['Recebimentos'] = pd.DataFrame({
+        'valor': gerador.integers(100000, 1000000, quantidade_recebimentos) / 100,
+        'dia': dias(datas_recebimentos),
+        'descricao': gerador.choice(np.array(['Salário', 'Freelance', 'Bônus'], dtype=object), quantidade_recebimentos),
+        'data': datas_recebimentos,
+    })
+
+    quantidade_gastos = entradas - quantidade_recebimentos
+    datas_gastos = datas(quantidade_gastos)
+    valores = gerador.integers(100, 50000, quantidade_gastos) / 100
+    credito = gerador.random(quantidade_gastos) < fracao_credito
+    parcelado = credito & (gerador.random(quantidade_gastos) < fracao_parcelada)
+    parcelas = np.where(parcelado, gerador.integers(2, 13, quantidade_gastos), 1)
+    cartao = np.where(credito, gerador.choice(nomes_cartoes, quantidade_gastos), None)
+    descricoes = np.array([f"Compra {i}" for i in range(1000)], dtype=object)
+    descricao = gerador.choice(descricoes, quantidade_gastos)
+    tabelas['Gastos'] = pd.DataFrame({
+        'categoria': gerador.choice(nomes_categorias, quantidade_gastos),
+        'valor': valores,
+        'descricao': descricao,
+        'tipo': np.where(credito, 'crédito', 'débito').astype(object),
+        'cartao': cartao,
+        'parcelado': parcelado,
+        'parcelas_total': parcelas,
+        'parcelas_restantes': parcelas,
+        'data': datas_gastos,
+    })
+
+    # Compras à vista no crédito viram faturas, pagas se forem de meses anteriores
+    avista = credito & ~parcelado
+    tabelas['Faturas'] = pd.DataFrame({
+        'cartao': cartao[avista],
+        'valor': valores[avista],
+        'pago': datas_gastos[avista].astype('datetime64[M]') < mes_atual,
+    })
+
+    # Compras parceladas viram uma parcela por mês a partir do mês da compra
+    origem = np.repeat(np.flatnonzero(parcelado), parcelas[parcelado])
+    inicio_compra = np.repeat(np.cumsum(parcelas[parcelado]) - parcelas[parcelado], parcelas[parcelado])
+    numero = np.arange(len(origem)) - inicio_compra + 1
+    # Divisão exata em centavos, com o resto na última parcela (como em adicionar_gasto)
+    centavos = np.rint(valores[origem] * 100).astype(np.int64)
+    base = centavos // parcelas[origem]
+    tabelas['Parcelas'] = pd.DataFrame({
+        'cartao': cartao[origem],
+        'valor': np.where(numero == parcelas[origem], centavos - base * (parcelas[origem] - 1), base) / 100,
+        'descricao': descricao[origem],
+        'parcela_atual': numero,
+        'parcelas_total': parcelas[origem],
+        'pago': datas_gastos[origem].astype('datetime64[M]') + (numero - 1) < mes_atual,
+    })
+
+    tabelas['Cartoes'] = [{'nome': nome, 'limite': 1e9, 'dia_vencimento': int(gerador.integers(1, 29))}
+                          for nome in nomes_cartoes]
+    tabelas['Financiamentos'] = [{'valor_total': float(gerador.integers(10000, 200000)), 'parcelas': 48,
+                                  'parcelas_pagas': int(gerador.integers(0, 48)), 'descricao': f"Financiamento {i}"}
+                                 for i in range(financiamentos)]
+    tabelas['Categorias'] = nomes_categorias
+
+    # Saldo inicial suficiente para que nenhum pagamento do benchmark seja recusado
+    financas.carregar_em_lote(tabelas, saldo_inicial=para_reais(int(np.rint(valores * 100).sum()) * 2))
+    return financas
+
+
+def medir(operacao, memoria):
+    # (segundos, pico de memória em MB ou None) de uma chamada
+    if memoria:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    inicio = time.perf_counter()
+    resultado = operacao()
+    segundos = time.perf_counter() - inicio
+    pico = (tracemalloc.get_traced_memory()[1] - base) / 2 ** 20 if memoria else None
+    return segundos, pico, resultado
+
+
+def executar(entradas, formato, memoria=True):
+    # Mede cada operação sobre um ledger recém-gerado com `entradas` lançamentos
+    arquivo = f"ledger_{entradas}.{formato}"
+    resultados = []
+
+    def registrar(operacao, funcao):
+        segundos, pico, resultado = medir(funcao, memoria)
+        resultados.append({'entradas': entradas, 'formato': formato, 'operacao': operacao,
+                           'segundos': round(segundos, 6), 'pico_mb': None if pico is None else round(pico, 3)})
+        print(f"  {operacao}: {segundos:.4f}s" + ('' if pico is None else f", pico {pico:.1f} MB"), file=sys.stderr)
+        return resultado
+
+    hoje = date.today()
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        financas = registrar('gerar', lambda: gerar_ledger(arquivo, entradas))
+        registrar('salvar_dados', financas.salvar_dados)
+        financas.fechar()
+        del financas
+
+        registrar('carregar_completo', lambda: FinancasPessoais(arquivo, sob_demanda=False).fechar())
+        financas = registrar('carregar', lambda: FinancasPessoais(arquivo, diario=True))
+        registrar('adicionar_gasto', lambda: financas.adicionar_gasto(10, 'Categoria 0', 'Benchmark'))
+        registrar('adicionar_gasto_credito',
+                  lambda: financas.adicionar_gasto(10, 'Categoria 0', 'Benchmark', 'crédito', 'Cartão 0', True, 3))
+        registrar('pagar_fatura', lambda: financas.pagar_fatura('Cartão 0'))
+        registrar('estatisticas_mes', financas.estatisticas_mes)
+        registrar('relatorio_completo', financas.relatorio_completo)
+        registrar('relatorio_completo_repetido', financas.relatorio_completo)  # Sem alterações: vem do cache
+        registrar('relatorio_mensal', lambda: financas.relatorio_mensal(hoje.month, hoje.year))
+        registrar('relatorio_anual', lambda: financas.relatorio_anual(hoje.year))
+        registrar('relatorio_projecao', lambda: financas.relatorio_projecao(24))
+        registrar('fechar', financas.fechar)
+    return resultados
+
+
+def versao():
+    try:
+        saida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+        return saida.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Mede o desempenho com ledgers sintéticos.")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=list(TAMANHOS),
+                        help="lançamentos de cada ledger medido (padrão: 1000 10000 100000)")
+    parser.add_argument('--formatos', nargs='+', choices=FORMATOS, default=list(FORMATOS))
+    parser.add_argument('--max-xlsx', type=int, default=100000, help="maior ledger medido em Excel")
+    parser.add_argument('--sem-memoria', action='store_true', help="não mede o pico de memória (tempos mais precisos)")
+    parser.add_argument('--saida', default=f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    args = parser.parse_args(argumentos)
+
+    saida = os.path.abspath(args.saida)
+    memoria = not args.sem_memoria
+    if memoria:
+        tracemalloc.start()
+
+    resultados = []
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as diretorio:
+        # Arquivos de dados e relatórios ficam num diretório temporário
+        os.chdir(diretorio)
+        try:
+            for entradas in args.tamanhos:
+                for formato in args.formatos:
+                    if formato == 'xlsx' and entradas > args.max_xlsx:
+                        continue
+                    print(f"{entradas} lançamentos ({formato}):", file=sys.stderr)
+                    resultados.extend(executar(entradas, formato, memoria))
+        finally:
+            os.chdir(diretorio_original)
+
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            'versao': versao(),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'memoria': memoria,
+            'resultados': resultados,
+        }, arquivo, ensure_ascii=False, indent=2)
+    print(f"Resultados salvos em {saida}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
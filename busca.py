@@ -0,0 +1,106 @@
+import bisect
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+TERMO = re.compile(r'\w+')
+
+
+def termos(texto):
+    # Palavras em minúsculas e sem acentos: "Açaí Mercadão" -> ['acai', 'mercadao']
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return TERMO.findall(''.join(c for c in texto if not unicodedata.combining(c)))
+
+
+# Índice invertido de uma coluna categórica de texto: termo -> códigos dos
+# rótulos que o contêm. Os rótulos só são acrescentados, com códigos fixos, então
+# cada atualização indexa apenas os novos.
+class IndiceTexto:
+    def __init__(self, tabela, nome='descricao'):
+        self.tabela = tabela
+        self.nome = nome
+        self.codigos_por_termo = {}
+        self.vocabulario = []  # Termos em ordem alfabética, para a busca por prefixo
+        self.indexados = 0
+        self._trava = threading.Lock()  # Buscas simultâneas no servidor
+
+    def atualizar(self):
+        with self._trava:
+            for codigo, rotulo in enumerate(self.tabela.rotulos(self.nome, self.indexados), self.indexados):
+                for termo in set(termos(rotulo)):
+                    if termo not in self.codigos_por_termo:
+                        self.codigos_por_termo[termo] = []
+                        bisect.insort(self.vocabulario, termo)
+                    self.codigos_por_termo[termo].append(codigo)
+                self.indexados = codigo + 1
+
+    def codigos(self, texto):
+        # Códigos dos rótulos com todos os termos do texto (cada termo vale também
+        # como prefixo: "super" encontra "Supermercado")
+        self.atualizar()
+        encontrados = None
+        for termo in set(termos(texto)):
+            codigos = set()
+            for posicao in range(bisect.bisect_left(self.vocabulario, termo), len(self.vocabulario)):
+                if not self.vocabulario[posicao].startswith(termo):
+                    break
+                codigos.update(self.codigos_por_termo[self.vocabulario[posicao]])
+            encontrados = codigos if encontrados is None else encontrados & codigos
+            if not encontrados:
+                break
+        return np.array(sorted(encontrados or ()), dtype=np.int32)
+
+
+def buscar(tabela, indice_texto=None, texto=None, faixas=None, rotulos=None):
+    # Posições, em ordem de cadastro, das linhas que atendem a todos os filtros:
+    # `texto` na coluna de `indice_texto`, `faixas` {coluna: (mínimo, máximo)} nos
+    # valores brutos (centavos, datas) e `rotulos` {coluna: rótulo}. O filtro com
+    # menos candidatos nos índices ordenados define as linhas conferidas pelos demais.
+    faixas = {nome: faixa for nome, faixa in (faixas or {}).items() if faixa != (None, None)}
+    rotulos = {nome: rotulo for nome, rotulo in (rotulos or {}).items() if rotulo is not None}
+    for nome in list(faixas) + list(rotulos):
+        if nome not in tabela.tipos:
+            raise ValueError(f"filtro sem coluna correspondente: {nome}")
+
+    # Cada filtro vira um conjunto de valores aceitos (faixa) numa coluna indexada
+    condicoes = dict(faixas)
+    for nome, rotulo in rotulos.items():
+        codigo = tabela.codigo(nome, rotulo)
+        if codigo == -2:
+            return np.empty(0, dtype=np.int64)  # Rótulo nunca usado na tabela
+        condicoes[nome] = (codigo, codigo)
+    codigos_texto = None
+    if texto is not None and termos(texto):
+        codigos_texto = indice_texto.codigos(texto)
+        if len(codigos_texto) == 0:
+            return np.empty(0, dtype=np.int64)
+
+    if not condicoes and codigos_texto is None:
+        return np.arange(len(tabela))
+
+    # Candidatos do filtro mais seletivo, mais as linhas ainda fora do índice.
+    # As faixas são visões do índice; só os códigos do texto são copiados.
+    opcoes = []
+    for nome, condicao in condicoes.items():
+        indice = tabela.indice(nome)
+        faixa = indice.faixa(*condicao)
+        opcoes.append((len(faixa), indice, lambda faixa=faixa: faixa))
+    if codigos_texto is not None:
+        indice = tabela.indice(indice_texto.nome)
+        opcoes.append((indice.contar_em(codigos_texto), indice, lambda indice=indice: indice.em(codigos_texto)))
+    _, indice, gerar = min(opcoes, key=lambda opcao: opcao[0])
+    candidatos = np.concatenate([gerar(), np.arange(indice.tamanho, len(tabela))])
+
+    # Confere todos os filtros nos candidatos
+    manter = np.ones(len(candidatos), dtype=bool)
+    for nome, (minimo, maximo) in condicoes.items():
+        valores = tabela.coluna(nome)[candidatos]
+        if minimo is not None:
+            manter &= valores >= minimo
+        if maximo is not None:
+            manter &= valores <= maximo
+    if codigos_texto is not None:
+        manter &= np.isin(tabela.coluna(indice_texto.nome)[candidatos], codigos_texto)
+    return np.sort(candidatos[manter])
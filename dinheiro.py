@@ -0,0 +1,55 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+# Valores monetários são inteiros em centavos (int ou np.int64) nas tabelas, nos
+# agregados e em toda conta. Reais em float só aparecem na entrada da API
+# pública, nos registros pequenos (cartões, financiamentos, investimentos) e na
+# apresentação, sempre arredondados ao centavo na conversão.
+
+CENTAVO = Decimal('0.01')
+
+
+def para_centavos(valor):
+    # Reais (número ou texto) -> centavos, arredondando ao centavo mais próximo
+    if isinstance(valor, str):
+        return ler_centavos(valor)
+    if isinstance(valor, Decimal):
+        return int(valor.quantize(CENTAVO, ROUND_HALF_UP).scaleb(2))
+    return int(round(float(valor) * 100))
+
+
+def para_reais(centavos):
+    return centavos / 100
+
+
+def arredondar(valor):
+    # Reais arredondados ao centavo, para guardar nos registros em float
+    return para_reais(para_centavos(valor))
+
+
+def ler_centavos(texto):
+    # Texto digitado ou de extrato ("1234.56", "-1.234,56", "R$ 50,00") -> centavos,
+    # sem passar por float
+    texto = texto.replace('R$', '').replace(' ', '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(f"Valor inválido: {texto}") from None
+    if not valor.is_finite():
+        raise ValueError(f"Valor inválido: {texto}")
+    return para_centavos(valor)
+
+
+def dividir(centavos, partes):
+    # Parcelas inteiras que somam exatamente `centavos`; o resto da divisão fica
+    # na última
+    base = centavos // partes
+    return [base] * (partes - 1) + [centavos - base * (partes - 1)]
+
+
+def pago_ate(centavos, partes, pagas):
+    # Soma das `pagas` primeiras parcelas de dividir(centavos, partes)
+    if pagas >= partes:
+        return centavos
+    return centavos // partes * pagas
@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+from datetime import date
+
+from dinheiro import para_reais
+
+# Histórico dos valores que as operações alteram no lugar: saldo, limite de cada
+# cartão, valor de cada investimento e valor pago de cada financiamento. Cada
+# alteração é um evento imutável com a variação, em centavos, dos valores
+# afetados e a data a que se refere. O estado numa data é o do instantâneo mais
+# próximo antes dela mais os eventos entre os dois, sem reaplicar o histórico
+# inteiro. Antes do primeiro evento (o estado na criação do histórico) nada é
+# conhecido, então lançamentos com data anterior contam a partir dele.
+# Os valores são identificados por tuplas:
+#   ('saldo',), ('limite', cartão), ('investimento', produto, banco), ('financiamento', descrição)
+
+INSTANTANEO_A_CADA = 500  # Eventos reaplicados até gravar um novo instantâneo
+
+
+def caminho_historico(arquivo):
+    # Com a extensão: financas.xlsx e financas.db têm históricos separados
+    return arquivo + '.historico'
+
+
+def somar(estado, variacoes, sinal=1):
+    for chave, centavos in variacoes.items():
+        estado[chave] = estado.get(chave, 0) + sinal * centavos
+    return estado
+
+
+def diferenca(novo, antigo):
+    # Variações que levam de `antigo` a `novo`
+    return {chave: novo.get(chave, 0) - antigo.get(chave, 0) for chave in novo.keys() | antigo.keys()
+            if novo.get(chave, 0) != antigo.get(chave, 0)}
+
+
+def descrever(estado, data=None):
+    # Estado em centavos -> valores em reais agrupados por tipo
+    resultado = {'data': data, 'saldo': 0.0, 'cartoes': {}, 'investimentos': [], 'financiamentos': {}}
+    for chave, centavos in sorted(estado.items()):
+        if chave[0] == 'saldo':
+            resultado['saldo'] = para_reais(centavos)
+        elif chave[0] == 'limite':
+            resultado['cartoes'][chave[1]] = para_reais(centavos)
+        elif chave[0] == 'investimento':
+            resultado['investimentos'].append({'produto': chave[1], 'banco': chave[2], 'valor': para_reais(centavos)})
+        elif chave[0] == 'financiamento':
+            resultado['financiamentos'][chave[1]] = para_reais(centavos)
+    return resultado
+
+
+def _para_json(variacoes):
+    return json.dumps([[list(chave), centavos] for chave, centavos in variacoes.items()], ensure_ascii=False)
+
+
+def _de_json(texto):
+    return {tuple(chave): centavos for chave, centavos in json.loads(texto)}
+
+
+# Eventos e instantâneos num banco SQLite ao lado do arquivo de dados, igual
+# para os dois formatos. Os eventos só são inseridos; os instantâneos são
+# derivados deles e descartados quando um evento com data anterior os desatualiza.
+class Historico:
+    def __init__(self, caminho, instantaneo_a_cada=INSTANTANEO_A_CADA):
+        self.caminho = caminho
+        self.instantaneo_a_cada = instantaneo_a_cada
+        self._conexao = None
+        self._inicio = None  # Data do primeiro evento, em texto
+
+    def existe(self):
+        return os.path.exists(self.caminho)
+
+    def conexao(self):
+        if self._conexao is None:
+            # O servidor usa a conexão a partir de threads diferentes, uma de cada vez
+            self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+            # Sem fsync a cada evento: o que se perder numa queda de energia volta
+            # como ajuste na próxima conferência com o arquivo de dados
+            self._conexao.execute('PRAGMA journal_mode=WAL')
+            self._conexao.execute('PRAGMA synchronous=NORMAL')
+            self._criar_esquema()
+        return self._conexao
+
+    def _criar_esquema(self):
+        with self._conexao:
+            self._conexao.execute('CREATE TABLE IF NOT EXISTS "Eventos" ("seq" INTEGER PRIMARY KEY, '
+                                  '"data" TEXT NOT NULL, "tipo" TEXT NOT NULL, "descricao" TEXT, '
+                                  '"variacoes" TEXT NOT NULL)')
+            self._conexao.execute('CREATE INDEX IF NOT EXISTS idx_eventos_data ON "Eventos" ("data", "seq")')
+            for operacao in ('UPDATE', 'DELETE'):
+                self._conexao.execute(f'CREATE TRIGGER IF NOT EXISTS eventos_imutaveis_{operacao.lower()} '
+                                      f'BEFORE {operacao} ON "Eventos" '
+                                      "BEGIN SELECT RAISE(ABORT, 'eventos do histórico são imutáveis'); END")
+            self._conexao.execute('CREATE TABLE IF NOT EXISTS "Instantaneos" ("data" TEXT PRIMARY KEY, '
+                                  '"estado" TEXT NOT NULL)')
+
+    def inicio(self):
+        if self._inicio is None:
+            self._inicio = self.conexao().execute('SELECT MIN("data") FROM "Eventos"').fetchone()[0]
+        return self._inicio
+
+    def registrar(self, eventos):
+        # eventos: [(data, tipo, descrição, variações)], gravados numa única transação
+        linhas = [(data.isoformat(), tipo, descricao, _para_json(variacoes))
+                  for data, tipo, descricao, variacoes in eventos if variacoes]
+        if not linhas:
+            return
+        inicio = self.inicio() or linhas[0][0]
+        linhas = [(max(linha[0], inicio),) + linha[1:] for linha in linhas]
+        conexao = self.conexao()
+        with conexao:
+            conexao.executemany('INSERT INTO "Eventos" ("data", "tipo", "descricao", "variacoes") VALUES (?, ?, ?, ?)',
+                                linhas)
+            # Instantâneos a partir da data mais antiga deixam de incluir todos os eventos
+            conexao.execute('DELETE FROM "Instantaneos" WHERE "data" >= ?', (min(linha[0] for linha in linhas),))
+        self._inicio = inicio
+
+    def estado_em(self, data=None):
+        # Valores em centavos ao fim do dia `data` (sem data, após todos os
+        # eventos); None se não há eventos até essa data
+        conexao = self.conexao()
+        limite = data.isoformat() if data else '9999-12-31'
+        linha = conexao.execute('SELECT "data", "estado" FROM "Instantaneos" WHERE "data" <= ? '
+                                'ORDER BY "data" DESC LIMIT 1', (limite,)).fetchone()
+        base, estado = (linha[0], _de_json(linha[1])) if linha else ('', {})
+        eventos = conexao.execute('SELECT "data", "variacoes" FROM "Eventos" WHERE "data" > ? AND "data" <= ? '
+                                  'ORDER BY "data", "seq"', (base, limite))
+
+        # A cada `instantaneo_a_cada` eventos reaplicados, grava o estado ao fim do
+        # último dia completo. Dias a partir de hoje ainda devem receber eventos.
+        hoje = date.today().isoformat()
+        novos = []
+        aplicados = desde_instantaneo = 0
+        anterior = None
+        for data_evento, variacoes in eventos:
+            if desde_instantaneo >= self.instantaneo_a_cada and data_evento != anterior and anterior < hoje:
+                novos.append((anterior, _para_json(estado)))
+                desde_instantaneo = 0
+            somar(estado, _de_json(variacoes))
+            aplicados += 1
+            desde_instantaneo += 1
+            anterior = data_evento
+        if desde_instantaneo >= self.instantaneo_a_cada and limite < hoje:
+            novos.append((limite, _para_json(estado)))
+        if novos:
+            with conexao:
+                conexao.executemany('INSERT OR REPLACE INTO "Instantaneos" ("data", "estado") VALUES (?, ?)', novos)
+
+        if linha is None and not aplicados:
+            return None
+        return estado
+
+    def fechar(self):
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
@@ -0,0 +1,116 @@
+import csv
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from dinheiro import ler_centavos
+
+# Nomes aceitos no cabeçalho do CSV -> campo da linha importada
+CAMPOS_CSV = {
+    'data': 'data',
+    'valor': 'valor',
+    'descricao': 'descricao',
+    'descrição': 'descricao',
+    'historico': 'descricao',
+    'histórico': 'descricao',
+    'categoria': 'categoria',
+    'cartao': 'cartao',
+    'cartão': 'cartao',
+}
+
+FORMATOS_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%Y%m%d')
+
+# Marcações <TAG>valor do OFX (SGML ou XML, com ou sem quebra de linha)
+MARCACAO_OFX = re.compile(r'<(/?)(\w+)>([^<\r\n]*)')
+
+
+@lru_cache(maxsize=4096)
+def converter_data(texto):
+    # Extratos repetem as mesmas datas em muitas linhas; o cache evita reprocessá-las
+    texto = texto.strip()
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {texto}")
+
+
+def ler_csv(caminho):
+    # Gera uma linha por vez; o separador (',' ou ';') vem do cabeçalho
+    with open(caminho, newline='', encoding='utf-8-sig') as arquivo:
+        cabecalho = arquivo.readline()
+        separador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+        campos = [CAMPOS_CSV.get(nome.strip().lower(), nome.strip().lower())
+                  for nome in next(csv.reader([cabecalho], delimiter=separador))]
+        for linha in csv.reader(arquivo, delimiter=separador):
+            if not any(linha):
+                continue
+            registro = dict(zip(campos, linha))
+            try:
+                yield {
+                    'data': converter_data(registro['data']),
+                    'centavos': ler_centavos(registro['valor']),
+                    'descricao': registro.get('descricao', '').strip(),
+                    'categoria': registro.get('categoria', '').strip() or None,
+                    'cartao': registro.get('cartao', '').strip() or None,
+                }
+            except (KeyError, ValueError):
+                yield None  # Linha inválida, contada no resumo da importação
+
+
+def ler_ofx(caminho):
+    # Gera uma linha por transação (<STMTTRN>) lendo o arquivo linha a linha
+    transacao = None
+    with open(caminho, encoding='latin-1') as arquivo:
+        for linha in arquivo:
+            for fechamento, marcacao, valor in MARCACAO_OFX.findall(linha):
+                marcacao = marcacao.upper()
+                if marcacao == 'STMTTRN':
+                    if fechamento and transacao is not None:
+                        yield _transacao_ofx(transacao)
+                    transacao = None if fechamento else {}
+                elif transacao is not None and not fechamento:
+                    transacao[marcacao] = valor.strip()
+
+
+def _transacao_ofx(transacao):
+    try:
+        return {
+            'data': converter_data(transacao['DTPOSTED'][:8]),
+            'centavos': ler_centavos(transacao['TRNAMT']),
+            'descricao': transacao.get('MEMO') or transacao.get('NAME', ''),
+            'categoria': None,
+            'cartao': None,
+        }
+    except (KeyError, ValueError):
+        return None
+
+
+def ler_extrato(caminho):
+    # Escolhe o leitor pela extensão do arquivo
+    if os.path.splitext(caminho)[1].lower() == '.ofx':
+        return ler_ofx(caminho)
+    return ler_csv(caminho)
+
+
+def carregar_regras(caminho):
+    # Regras "padrao;categoria" (ou com vírgula), aplicadas na ordem do arquivo
+    regras = []
+    with open(caminho, newline='', encoding='utf-8-sig') as arquivo:
+        for linha in arquivo:
+            separador = ';' if ';' in linha else ','
+            padrao, _, categoria = linha.strip().partition(separador)
+            if padrao and categoria and padrao.lower() != 'padrao':
+                regras.append((padrao.strip().lower(), categoria.strip()))
+    return regras
+
+
+def categorizar(descricao, regras, categoria=None):
+    # Primeira regra cujo padrão aparece na descrição; senão a categoria da linha
+    descricao = descricao.lower()
+    for padrao, categoria_regra in regras:
+        if padrao in descricao:
+            return categoria_regra
+    return categoria or 'Outros'
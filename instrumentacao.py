@@ -0,0 +1,120 @@
+import cProfile
+import functools
+import inspect
+import io
+import json
+import pstats
+import time
+
+# Métodos do armazenamento e do diário medidos, com a contagem de linhas de cada
+# chamada a partir dos argumentos e do resultado
+CHAMADAS_ARMAZENAMENTO = {
+    'carregar': lambda args, resultado: sum(len(df) for df in resultado[0].values()),
+    'carregar_meta': lambda args, resultado: len(resultado),
+    'salvar': lambda args, resultado: sum(len(df) for df in args[0].values()),
+    'gravar': lambda args, resultado: len(args[0]),
+}
+CHAMADAS_DIARIO = {
+    'registrar': lambda args, resultado: len(args[0]),
+    'truncar': lambda args, resultado: 0,
+}
+
+
+# Tempo, número de chamadas e linhas de cada operação medida
+class Estatisticas:
+    def __init__(self):
+        self.operacoes = {}
+        self.linhas_marcadas = 0  # Linhas alteradas (marcadas para gravação) até agora
+
+    def registrar(self, nome, segundos, linhas=0):
+        operacao = self.operacoes.get(nome)
+        if operacao is None:
+            operacao = self.operacoes[nome] = {'chamadas': 0, 'segundos': 0.0, 'maximo': 0.0, 'linhas': 0}
+        operacao['chamadas'] += 1
+        operacao['segundos'] += segundos
+        operacao['maximo'] = max(operacao['maximo'], segundos)
+        operacao['linhas'] += linhas
+
+    def limpar(self):
+        self.operacoes.clear()
+
+    def para_dict(self):
+        return {nome: dict(operacao) for nome, operacao in self.operacoes.items()}
+
+    def resumo(self):
+        # Tabela em texto, da operação mais demorada para a mais rápida
+        linhas = [f"{'Operação':<32} {'Chamadas':>9} {'Total (s)':>10} {'Média (ms)':>11} {'Máx. (ms)':>10} {'Linhas':>9}"]
+        for nome, operacao in sorted(self.operacoes.items(), key=lambda item: -item[1]['segundos']):
+            media = operacao['segundos'] / operacao['chamadas'] * 1000
+            linhas.append(f"{nome:<32} {operacao['chamadas']:>9} {operacao['segundos']:>10.4f} {media:>11.3f} "
+                          f"{operacao['maximo'] * 1000:>10.3f} {operacao['linhas']:>9}")
+        return '\n'.join(linhas)
+
+    def despejar(self, arquivo):
+        # Grava as estatísticas em JSON
+        with open(arquivo, 'w', encoding='utf-8') as saida:
+            json.dump(self.para_dict(), saida, ensure_ascii=False, indent=2)
+
+
+def _medido(estatisticas, nome, funcao, contar_linhas=None):
+    # Sem contar_linhas, conta as linhas marcadas como alteradas durante a chamada
+    @functools.wraps(funcao)
+    def medido(*args, **kwargs):
+        marcadas = estatisticas.linhas_marcadas
+        inicio = time.perf_counter()
+        resultado = None
+        try:
+            resultado = funcao(*args, **kwargs)
+            return resultado
+        finally:
+            segundos = time.perf_counter() - inicio
+            if contar_linhas is None:
+                linhas = estatisticas.linhas_marcadas - marcadas
+            else:
+                try:
+                    linhas = contar_linhas(args, resultado)
+                except (TypeError, AttributeError, IndexError):
+                    linhas = 0  # Chamada que falhou antes de produzir o resultado
+            estatisticas.registrar(nome, segundos, linhas)
+    return medido
+
+
+def _instrumentar_objeto(objeto, prefixo, chamadas, estatisticas):
+    for nome, contar_linhas in chamadas.items():
+        if hasattr(objeto, nome):
+            setattr(objeto, nome, _medido(estatisticas, f'{prefixo}.{nome}', getattr(objeto, nome), contar_linhas))
+
+
+def instrumentar(financas):
+    # Substitui, apenas nesta instância, os métodos públicos e as chamadas ao
+    # armazenamento por versões medidas. Sem instrumentação nada é envolvido,
+    # então o custo quando desativada é nulo.
+    estatisticas = Estatisticas()
+    for nome, funcao in inspect.getmembers(type(financas), inspect.isfunction):
+        if not nome.startswith('_'):
+            setattr(financas, nome, _medido(estatisticas, nome, getattr(financas, nome)))
+
+    marcar = financas._marcar
+
+    def marcar_contando(entidade, chave):
+        estatisticas.linhas_marcadas += 1
+        marcar(entidade, chave)
+    financas._marcar = marcar_contando
+
+    _instrumentar_objeto(financas.armazenamento, 'armazenamento', CHAMADAS_ARMAZENAMENTO, estatisticas)
+    if financas.diario:
+        _instrumentar_objeto(financas.diario, 'diario', CHAMADAS_DIARIO, estatisticas)
+    return estatisticas
+
+
+def perfilar(funcao, *args, arquivo=None, linhas=25, **kwargs):
+    # Executa uma única operação sob o cProfile. Retorna o resultado e o relatório
+    # das funções com maior tempo acumulado; com `arquivo`, grava também o perfil
+    # completo (para abrir com pstats ou snakeviz).
+    perfil = cProfile.Profile()
+    resultado = perfil.runcall(funcao, *args, **kwargs)
+    if arquivo:
+        perfil.dump_stats(arquivo)
+    saida = io.StringIO()
+    pstats.Stats(perfil, stream=saida).sort_stats('cumulative').print_stats(linhas)
+    return resultado, saida.getvalue()
@@ -0,0 +1,112 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from armazenamento import abrir_armazenamento
+from main import FinancasPessoais, eventos_anual, eventos_mensal, ler_agregados
+from relatorios import FORMATOS, escrever_relatorio
+
+# Relatórios mensais e anuais de vários ledgers de uma vez. Esses relatórios
+# só usam os totais por mês dos agregados, então cada ledger é lido uma única
+# vez (só o Meta e o diário, sem as abas de registros) e todos os seus relatórios
+# saem dessa mesma leitura. Os ledgers são distribuídos entre os processos.
+
+
+def anos_com_movimento(agregados):
+    meses = set(agregados.recebimentos_por_mes) | set(agregados.gastos_por_mes)
+    return sorted({int(mes[:4]) for mes in meses})
+
+
+def _carregar_agregados(arquivo):
+    agregados = ler_agregados(arquivo)
+    if agregados is None:
+        # Arquivo de versão anterior, sem os totais gravados: carrega os registros
+        # uma vez, sem gravar nada
+        financas = FinancasPessoais(arquivo, autosave=False, historico=False)
+        agregados = financas.agregados
+        financas.fechar(compactar=False)
+    return agregados
+
+
+def _relatorios_do_ledger(arquivo, anos, formato, mensais, anuais, pasta):
+    # Executado em um processo do lote; devolve os caminhos gravados
+    try:
+        agregados = _carregar_agregados(arquivo)
+    except Exception as e:
+        print(f"Erro ao ler {arquivo}: {e}")
+        return []
+    destino = os.path.join(pasta, os.path.splitext(os.path.basename(arquivo))[0])
+    os.makedirs(destino, exist_ok=True)
+
+    # Nomes sem data e hora: gerar de novo substitui os mesmos arquivos
+    gravados = []
+    for ano in anos if anos is not None else anos_com_movimento(agregados):
+        if anuais:
+            caminho = os.path.join(destino, f"relatorio_anual_{ano}.{formato}")
+            escrever_relatorio(eventos_anual(agregados, ano), caminho, formato)
+            gravados.append(caminho)
+        if mensais:
+            for mes in range(1, 13):
+                caminho = os.path.join(destino, f"relatorio_mensal_{mes}_{ano}.{formato}")
+                escrever_relatorio(eventos_mensal(agregados, mes, ano), caminho, formato)
+                gravados.append(caminho)
+    return gravados
+
+
+def gerar_lote(arquivos, anos=None, formato='txt', mensais=True, anuais=True, processos=None, pasta='relatorios'):
+    # Gera os relatórios de cada arquivo em pasta/<nome do arquivo>/. Sem `anos`,
+    # usa os anos com recebimentos ou gastos em cada ledger. Devolve
+    # {arquivo: [caminhos gravados]}.
+    if formato not in FORMATOS:
+        raise ValueError(f"formato de relatório desconhecido: {formato}")
+    encontrados = []
+    for arquivo in dict.fromkeys(arquivos):
+        if abrir_armazenamento(arquivo).existe():
+            encontrados.append(arquivo)
+        else:
+            print(f"Arquivo não encontrado: {arquivo}")
+
+    nomes = [os.path.splitext(os.path.basename(arquivo))[0] for arquivo in encontrados]
+    repetidos = sorted({nome for nome in nomes if nomes.count(nome) > 1})
+    if repetidos:
+        # Cada ledger grava numa pasta com o próprio nome
+        raise ValueError(f"arquivos com o mesmo nome gravariam na mesma pasta: {', '.join(repetidos)}")
+
+    argumentos = [(arquivo, anos, formato, mensais, anuais, pasta) for arquivo in encontrados]
+    processos = min(processos or os.cpu_count() or 1, len(encontrados))
+    if processos <= 1:
+        resultados = [_relatorios_do_ledger(*item) for item in argumentos]
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            resultados = list(executor.map(_relatorios_do_ledger, *zip(*argumentos)))
+    return dict(zip(encontrados, resultados))
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Relatórios mensais e anuais de vários ledgers em paralelo.")
+    parser.add_argument('arquivos', nargs='+', help="arquivos dos ledgers (.xlsx ou .db)")
+    parser.add_argument('--de', type=int, help="primeiro ano (padrão: o primeiro com movimento)")
+    parser.add_argument('--ate', type=int, help="último ano (padrão: o último com movimento)")
+    parser.add_argument('--formato', choices=FORMATOS, default='txt')
+    parser.add_argument('--so-anuais', action='store_true', help="não gera os relatórios mensais")
+    parser.add_argument('--so-mensais', action='store_true', help="não gera os relatórios anuais")
+    parser.add_argument('--processos', type=int, help="processos em paralelo (padrão: um por núcleo)")
+    parser.add_argument('--pasta', default='relatorios')
+    args = parser.parse_args(argumentos)
+
+    anos = None
+    if args.de is not None or args.ate is not None:
+        if args.de is None or args.ate is None:
+            parser.error("informe --de e --ate juntos")
+        anos = list(range(args.de, args.ate + 1))
+    try:
+        resultado = gerar_lote(args.arquivos, anos, args.formato, mensais=not args.so_anuais,
+                               anuais=not args.so_mensais, processos=args.processos, pasta=args.pasta)
+    except ValueError as e:
+        parser.error(str(e))
+    for arquivo, caminhos in resultado.items():
+        print(f"{arquivo}: {len(caminhos)} relatório(s)")
+
+
+if __name__ == '__main__':
+    main()
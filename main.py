@@ -1,24 +1,175 @@
-import pandas as pd
-from datetime import datetime, timedelta
-from collections import defaultdict
+import numpy as np
+from datetime import date, datetime, timedelta
+import argparse
+import calendar
+import csv
 import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext, redirect_stdout
+
+from agregados import Agregados
+from armazenamento import (ESQUEMA, ArmazenamentoExcel, DiarioTransacoes, GravadorSegundoPlano, abrir_armazenamento,
+                            caminho_diario)
+import busca
+from dinheiro import arredondar, dividir, ler_centavos, para_centavos, para_reais
+from historico import Historico, caminho_historico, descrever, diferenca, somar
+from importacao import carregar_regras, categorizar, ler_extrato
+import instrumentacao
+from projecao import media_mensal, projetar
+from relatorios import FORMATOS, TAMANHO_BUFFER, CacheRelatorios, escrever_relatorio, evento_linha
+from simulacao import projetar_investimentos, simular_investimentos
+from tabelas import TabelaColunar
+
+# Nome da aba/tabela -> atributo com os registros
+ENTIDADES = {
+    'Recebimentos': 'recebimentos',
+    'Gastos': 'gastos',
+    'Financiamentos': 'financiamentos',
+    'Cartoes': 'cartoes',
+    'Faturas': 'faturas',
+    'Parcelas': 'parcelas',
+    'Investimentos': 'investimentos',
+}
+
+# Entidades de alto volume, guardadas em memória como tabelas colunares
+# tipadas (valores em centavos, textos repetidos como categorias)
+COLUNAS = {
+    'Recebimentos': {'valor': 'centavos', 'dia': 'int', 'descricao': 'categoria', 'data': 'data'},
+    'Gastos': {'categoria': 'categoria', 'valor': 'centavos', 'descricao': 'categoria', 'tipo': 'categoria',
+               'cartao': 'categoria', 'parcelado': 'bool', 'parcelas_total': 'int', 'parcelas_restantes': 'int',
+               'data': 'data'},
+    'Faturas': {'cartao': 'categoria', 'valor': 'centavos', 'pago': 'bool'},
+    'Parcelas': {'cartao': 'categoria', 'valor': 'centavos', 'descricao': 'categoria', 'parcela_atual': 'int',
+                 'parcelas_total': 'int', 'pago': 'bool'},
+}
+
+# Coluna da aba Gastos -> campo do registro em memória
+COLUNAS_GASTO = {
+    'Categoria': 'categoria',
+    'Valor': 'valor',
+    'Descricao': 'descricao',
+    'Tipo': 'tipo',
+    'Cartao': 'cartao',
+    'Parcelado': 'parcelado',
+    'ParcelasTotal': 'parcelas_total',
+    'ParcelasRestantes': 'parcelas_restantes',
+    'Data': 'data',
+}
+
+# Abas que podem ser lidas só no primeiro acesso, pois o saldo e os totais vêm
+# do Meta. Quais são adiadas depende do armazenamento (abas_adiaveis).
+ABAS_SOB_DEMANDA = ('Recebimentos', 'Gastos', 'Faturas', 'Parcelas', 'Investimentos')
+
+# Entidades aceitas por buscar()
+ENTIDADES_BUSCA = ('gastos', 'recebimentos', 'parcelas')
+
+
+class _SobDemanda:
+    # Lista de registros lida do armazenamento apenas no primeiro acesso
+    def __set_name__(self, dono, nome):
+        self.atributo = '_' + nome
+
+    def __get__(self, financas, dono=None):
+        if financas is None:
+            return self
+        if financas.__dict__.get(self.atributo) is None:
+            financas._carregar_sob_demanda(self.atributo[1:])
+        return financas.__dict__[self.atributo]
+
+    def __set__(self, financas, valor):
+        financas.__dict__[self.atributo] = valor
+
+
+# Relatórios mensal e anual: dependem só dos totais por mês dos agregados, sem
+# percorrer os registros, e por isso também são gerados sem carregar o arquivo
+def _eventos_mes(agregados, mes, ano):
+    recebimentos, gastos = agregados.totais_mes(ano, mes)
+    for item, centavos in (("Total de Recebimentos", recebimentos), ("Total de Gastos", gastos),
+                           ("Saldo do Mês", recebimentos - gastos)):
+        yield evento_linha(f"{item}: R$ {centavos / 100:.2f}", item, centavos / 100)
+
+
+def eventos_mensal(agregados, mes, ano):
+    yield ('titulo', f"Relatório Mensal: {mes}/{ano}")
+    yield from _eventos_mes(agregados, mes, ano)
+
+
+def eventos_anual(agregados, ano):
+    yield ('titulo', f"Relatório Anual: {ano}")
+    for mes in range(1, 13):
+        yield ('titulo', f"Mês {mes}")
+        yield from _eventos_mes(agregados, mes, ano)
+
 
 class FinancasPessoais:
-    def __init__(self, arquivo_excel='financas.xlsx'):
+    recebimentos = _SobDemanda()
+    gastos = _SobDemanda()
+    faturas = _SobDemanda()  # Faturas dos cartões
+    parcelas = _SobDemanda()  # Parcelas de gastos no crédito
+    investimentos = _SobDemanda()  # Lista de investimentos
+
+    def __init__(self, arquivo_excel='financas.xlsx', diario=False, compactar_a_cada=1000, armazenamento=None,
+                 sob_demanda=True, autosave=True, saldo_inicial=None, instrumentar=False,
+                 segundo_plano=False, historico=True):
         self.arquivo_excel = arquivo_excel
-        self.saldo = 0.0
-        self.recebimentos = []
-        self.gastos = defaultdict(list)
-        self.financiamentos = []
-        self.cartoes = []  # Lista de cartões de crédito
-        self.faturas = []  # Faturas dos cartões
-        self.parcelas = []  # Parcelas de gastos no crédito
-        self.categorias = set()
-        self.investimentos = []  # Lista de investimentos
-
-        # Verifica se o arquivo Excel já existe
-        if os.path.exists(self.arquivo_excel):
-            self.carregar_dados()
+        # Formato de persistência (Excel ou SQLite, pela extensão do arquivo)
+        self.armazenamento = armazenamento or abrir_armazenamento(arquivo_excel)
+        if segundo_plano and not diario and not self.armazenamento.incremental:
+            # Sem o diário, cada operação regravaria o Excel e copiaria antes as
+            # tabelas alteradas inteiras, com custo proporcional ao arquivo
+            raise ValueError("segundo_plano=True exige diario=True no formato Excel")
+        self._limpar_dados()
+
+        # Alterações ainda não persistidas: (entidade, chave) -> None
+        self._pendentes = {}
+        self._seq_salvo = 0
+
+        # Sem autosave, as alterações só são gravadas por persistir(), ao fim
+        # de uma transação ou ao fechar
+        self.autosave = autosave
+        self._alterado = False
+        self._transacoes_abertas = 0
+        self.versao = 0  # Incrementada a cada operação que altera os dados
+        self.cache_relatorios = CacheRelatorios()
+        # No servidor, várias leituras podem pedir ao mesmo tempo um índice ainda
+        # não criado: cada um é montado à parte e publicado de uma vez
+        self._trava_indices = threading.Lock()
+
+        # Eventos do histórico ainda não gravados: (data, tipo, descrição, variações).
+        # O histórico só é aberto depois da leitura inicial dos dados.
+        self.historico = None
+        self._historico_pendente = []
+
+        # No modo diário, cada alteração é anexada ao diário e o Excel só é
+        # regravado na compactação (periódica ou ao fechar). O SQLite já grava
+        # por linha e dispensa o diário.
+        self.diario = None
+        self.compactar_a_cada = compactar_a_cada
+        if diario and not self.armazenamento.incremental:
+            self.diario = DiarioTransacoes(caminho_diario(self.arquivo_excel))
+
+        # Em segundo plano, as regravações completas do Excel na compactação do
+        # diário ficam com uma thread; a operação que dispara a compactação só
+        # paga a cópia das tabelas alteradas
+        self.gravador = None
+        if segundo_plano and not self.armazenamento.incremental:
+            self.gravador = GravadorSegundoPlano(self._gravar_instantaneo, self._combinar_instantaneos)
+
+        # Com instrumentar, os métodos públicos e as chamadas ao armazenamento
+        # registram tempo, chamadas e linhas em self.estatisticas
+        self.estatisticas = instrumentacao.instrumentar(self) if instrumentar else None
+
+        # Verifica se o arquivo de dados já existe
+        if self.armazenamento.existe():
+            self.carregar_dados(sob_demanda=sob_demanda)
+            if self.diario:
+                self.reaplicar_diario()
+        elif saldo_inicial is not None:
+            # Criação sem perguntas, para uso em scripts e na linha de comando
+            self.agregados.definir_saldo_inicial(para_centavos(saldo_inicial))
+            self.salvar_dados()
         else:
             self.criar_arquivo_inicial()
 
@@ -26,12 +177,50 @@ class FinancasPessoais:
         if not os.path.exists("relatorios"):
             os.makedirs("relatorios")
 
+        # Histórico do saldo, dos limites, dos investimentos e dos financiamentos.
+        # Cada operação anota a variação desde o estado anterior; o estado da
+        # abertura é conferido com o histórico na primeira gravação ou consulta.
+        if historico:
+            self.historico = Historico(caminho_historico(arquivo_excel))
+            self._estado_base = self._estado_anotado = self._estado_historico()
+            self._historico_conferido = False
+            if not self.historico.existe():
+                self._gravar_historico(conferir=True)
+
+    def _limpar_dados(self):
+        self.agregados = Agregados()
+        self.recebimentos = TabelaColunar(COLUNAS['Recebimentos'])
+        self.gastos = TabelaColunar(COLUNAS['Gastos'])
+        self.financiamentos = []
+        self.cartoes = []  # Lista de cartões de crédito
+        self.faturas = TabelaColunar(COLUNAS['Faturas'])  # Faturas dos cartões
+        self.parcelas = TabelaColunar(COLUNAS['Parcelas'])  # Parcelas de gastos no crédito
+        self.categorias = set()
+        self.investimentos = []  # Lista de investimentos
+        self._invalidar_indices()
+        # Entidade -> índice invertido das descrições. Os rótulos nunca são
+        # removidos, então só é refeito quando a tabela é substituída.
+        self._indices_texto = {}
+
+        # Abas alteradas desde a última gravação; só elas são convertidas de novo
+        # ao salvar. Sem dados carregados do arquivo, todas precisam ser gravadas.
+        self._abas_alteradas = set(ESQUEMA)
+        self._regravar_tudo = False  # Após uma falha na gravação em segundo plano
+
+    def _invalidar_indices(self):
+        # Índices secundários, reconstruídos no próximo uso
+        self._indice_cartoes = None  # nome -> posição em self.cartoes
+        self._indice_faturas = None  # cartão -> faturas não pagas e total em centavos
+        self._indice_parcelas = None  # cartão -> parcelas não pagas
+        self._indice_transacoes = None  # (data, centavos com sinal, descrição) -> ocorrências
+
     def criar_arquivo_inicial(self):
         print("\n--- Bem-vindo ao Sistema de Finanças Pessoais ---")
-        print("Arquivo Excel não encontrado. Criando novo arquivo...")
+        print(f"Arquivo {self.arquivo_excel} não encontrado. Criando novo arquivo...")
 
         # Solicitar saldo inicial
-        self.saldo = self.solicitar_valor("Digite seu saldo inicial: R$ ")
+        saldo_inicial = self.solicitar_valor("Digite seu saldo inicial: R$ ")
+        self.agregados.definir_saldo_inicial(para_centavos(saldo_inicial))
 
         # Solicitar cadastro de cartões de crédito
         print("\nVamos cadastrar seus cartões de crédito.")
@@ -45,7 +234,7 @@ class FinancasPessoais:
             # Cadastrar fatura atual do cartão
             print(f"\nCadastrar fatura atual do cartão '{nome_cartao}':")
             fatura_atual = self.solicitar_valor(f"Valor da fatura atual do cartão '{nome_cartao}': R$ ")
-            self.faturas.append({'cartao': nome_cartao, 'valor': fatura_atual, 'pago': False})
+            self._nova_fatura({'cartao': nome_cartao, 'valor': fatura_atual, 'pago': False})
 
             # Cadastrar parcelas futuras do cartão
             print(f"\nCadastrar parcelas futuras do cartão '{nome_cartao}':")
@@ -56,7 +245,7 @@ class FinancasPessoais:
                 valor_parcela = self.solicitar_valor(f"Valor da parcela '{descricao_parcela}': R$ ")
                 parcelas_total = int(input(f"Número total de parcelas: "))
                 parcelas_restantes = int(input(f"Número de parcelas restantes: "))
-                self.parcelas.append({
+                self._nova_parcela({
                     'cartao': nome_cartao,
                     'valor': valor_parcela,
                     'descricao': descricao_parcela,
@@ -72,382 +261,1092 @@ class FinancasPessoais:
         print(f"Arquivo {self.arquivo_excel} criado com sucesso!")
 
     def solicitar_valor(self, mensagem):
+        # Valor em reais, convertido ao centavo exato a partir do texto digitado
         while True:
             try:
-                valor = input(mensagem).replace(',', '.')  # Substitui vírgula por ponto
-                return float(valor)
+                return para_reais(ler_centavos(input(mensagem)))
             except ValueError:
                 print("Valor inválido. Use números com ponto (.) ou vírgula (,) como separador decimal.")
 
-    def carregar_dados(self):
-        try:
-            # Carregar recebimentos
-            df_recebimentos = pd.read_excel(self.arquivo_excel, sheet_name='Recebimentos')
-            self.recebimentos = df_recebimentos.to_dict('records')
-
-            # Carregar gastos
-            df_gastos = pd.read_excel(self.arquivo_excel, sheet_name='Gastos')
-            for _, row in df_gastos.iterrows():
-                self.gastos[row['Categoria']].append({
-                    'valor': row['Valor'],
-                    'descricao': row['Descricao'],
-                    'tipo': row['Tipo'],
-                    'cartao': row['Cartao'],
-                    'parcelado': row['Parcelado'],
-                    'parcelas_total': row['ParcelasTotal'],
-                    'parcelas_restantes': row['ParcelasRestantes']
-                })
-                self.categorias.add(row['Categoria'])
+    def solicitar_taxa(self, mensagem):
+        # Percentual, sem arredondamento ao centavo
+        while True:
+            try:
+                taxa = float(input(mensagem).replace(',', '.'))  # Substitui vírgula por ponto
+                if taxa == taxa and abs(taxa) != float('inf'):
+                    return taxa
+            except ValueError:
+                pass
+            print("Valor inválido. Use números com ponto (.) ou vírgula (,) como separador decimal.")
 
-            # Carregar financiamentos
-            df_financiamentos = pd.read_excel(self.arquivo_excel, sheet_name='Financiamentos')
-            self.financiamentos = df_financiamentos.to_dict('records')
+    def solicitar_data(self, mensagem):
+        while True:
+            texto = input(mensagem).strip()
+            if not texto:
+                return date.today()
+            try:
+                return datetime.strptime(texto, '%d/%m/%Y').date()
+            except ValueError:
+                print("Data inválida. Use o formato dd/mm/aaaa.")
 
-            # Carregar cartões de crédito
-            df_cartoes = pd.read_excel(self.arquivo_excel, sheet_name='Cartoes')
-            self.cartoes = df_cartoes.to_dict('records')
+    def carregar_dados(self, armazenamento=None, sob_demanda=False):
+        armazenamento = armazenamento or self.armazenamento
+        adiadas = armazenamento.abas_adiaveis if sob_demanda else ()
+        try:
+            tabelas, meta = armazenamento.carregar([aba for aba in ESQUEMA if aba not in adiadas])
 
-            # Carregar faturas
-            df_faturas = pd.read_excel(self.arquivo_excel, sheet_name='Faturas')
-            self.faturas = df_faturas.to_dict('records')
+            # Carregar recebimentos, gastos, financiamentos, cartões, faturas, parcelas e investimentos
+            for aba, atributo in ENTIDADES.items():
+                if aba in adiadas:
+                    setattr(self, '_' + atributo, None)
+                else:
+                    setattr(self, atributo, self._entidade(aba, tabelas[aba]))
+            if 'Gastos' in adiadas:
+                self.categorias.update(armazenamento.categorias_dos_gastos())
+            else:
+                self.categorias.update(self.gastos.rotulos('categoria'))
 
-            # Carregar parcelas
-            df_parcelas = pd.read_excel(self.arquivo_excel, sheet_name='Parcelas')
-            self.parcelas = df_parcelas.to_dict('records')
+            # Carregar categorias sem gastos (ausentes em arquivos antigos)
+            if 'nome' in tabelas['Categorias']:
+                self.categorias.update(tabelas['Categorias']['nome'])
 
-            # Carregar investimentos
-            df_investimentos = pd.read_excel(self.arquivo_excel, sheet_name='Investimentos')
-            self.investimentos = df_investimentos.to_dict('records')
+            # Último registro do diário já incorporado ao arquivo
+            self._seq_salvo = int(meta.get('seq_diario', 0))
 
-            # Atualizar saldo
-            self.saldo = sum(recebimento['valor'] for recebimento in self.recebimentos)
-            self.saldo -= sum(sum(gasto['valor'] for gasto in gastos) for gastos in self.gastos.values())
-            self.saldo -= sum((fin['valor_total'] / fin['parcelas']) * fin['parcelas_pagas'] for fin in self.financiamentos)
+            # Saldo e totais gravados; arquivos antigos são recalculados
+            self._invalidar_indices()
+            self.agregados = Agregados.de_meta(meta) or Agregados.recalcular(self)
+            if armazenamento is self.armazenamento:
+                self._abas_alteradas = set()
+            self.versao += 1
 
         except Exception as e:
-            print(f"Erro ao carregar dados do Excel: {e}")
+            print(f"Erro ao carregar dados de {armazenamento.arquivo}: {e}")
 
-    def salvar_dados(self):
+    def _carregar_sob_demanda(self, atributo):
+        # Só a aba pedida é lida: as demais adiadas continuam para o seu primeiro uso
+        import pandas as pd
+        abas = [aba for aba, nome in ENTIDADES.items() if nome == atributo]
         try:
-            # Salvar recebimentos
-            df_recebimentos = pd.DataFrame(self.recebimentos)
-
-            # Salvar gastos
-            df_gastos = pd.DataFrame([{
-                'Categoria': cat,
-                'Valor': gasto['valor'],
-                'Descricao': gasto['descricao'],
-                'Tipo': gasto['tipo'],
-                'Cartao': gasto['cartao'],
-                'Parcelado': gasto.get('parcelado', False),
-                'ParcelasTotal': gasto.get('parcelas_total', 1),
-                'ParcelasRestantes': gasto.get('parcelas_restantes', 1)
-            } for cat, gastos in self.gastos.items() for gasto in gastos])
-
-            # Salvar financiamentos
-            df_financiamentos = pd.DataFrame(self.financiamentos)
-
-            # Salvar cartões de crédito
-            df_cartoes = pd.DataFrame(self.cartoes)
-
-            # Salvar faturas
-            df_faturas = pd.DataFrame(self.faturas)
-
-            # Salvar parcelas
-            df_parcelas = pd.DataFrame(self.parcelas)
-
-            # Salvar investimentos
-            df_investimentos = pd.DataFrame(self.investimentos)
-
-            with pd.ExcelWriter(self.arquivo_excel) as writer:
-                df_recebimentos.to_excel(writer, sheet_name='Recebimentos', index=False)
-                df_gastos.to_excel(writer, sheet_name='Gastos', index=False)
-                df_financiamentos.to_excel(writer, sheet_name='Financiamentos', index=False)
-                df_cartoes.to_excel(writer, sheet_name='Cartoes', index=False)
-                df_faturas.to_excel(writer, sheet_name='Faturas', index=False)
-                df_parcelas.to_excel(writer, sheet_name='Parcelas', index=False)
-                df_investimentos.to_excel(writer, sheet_name='Investimentos', index=False)
-
-            print(f"\nDados salvos em {self.arquivo_excel}")
+            tabelas, _ = self.armazenamento.carregar(abas)
         except Exception as e:
-            print(f"Erro ao salvar dados no Excel: {e}")
+            print(f"Erro ao carregar dados de {self.armazenamento.arquivo}: {e}")
+            tabelas = {aba: pd.DataFrame() for aba in abas}
+        for aba in abas:
+            setattr(self, ENTIDADES[aba], self._entidade(aba, tabelas[aba]))
+        self._invalidar_indices()
+        if self.historico is not None and 'Investimentos' in abas:
+            # Investimentos lidos agora estão como na abertura
+            investimentos = self._estado_investimentos()
+            self._estado_base = {**self._estado_base, **investimentos}
+            self._estado_anotado = {**self._estado_anotado, **investimentos}
+
+    def _entidade(self, aba, df):
+        # Estrutura em memória da entidade a partir da aba/tabela lida
+        if aba not in COLUNAS:
+            return df.to_dict('records')
+        if aba == 'Gastos':
+            df = df.rename(columns=COLUNAS_GASTO)
+        tabela = TabelaColunar(COLUNAS[aba])
+        tabela.estender(df)
+        return tabela
+
+    @property
+    def saldo(self):
+        return self.agregados.saldo / 100
+
+    def verificar_agregados(self, corrigir=False):
+        # Recalcula todos os totais a partir dos lançamentos e aponta divergências
+        recalculados = Agregados.recalcular(self, base=self.agregados)
+        divergencias = self.agregados.divergencias(recalculados)
+        if not divergencias:
+            print("Todos os totais conferem com os lançamentos.")
+            return divergencias
+
+        print("\n--- Divergências nos Totais ---")
+        for chave, armazenado, recalculado in divergencias:
+            print(f"{chave}: armazenado R$ {armazenado / 100:.2f}, recalculado R$ {recalculado / 100:.2f}")
+        if corrigir:
+            self.agregados = recalculados
+            self._concluir('correcao')
+            print("Totais corrigidos a partir dos lançamentos.")
+        return divergencias
+
+    def reaplicar_diario(self):
+        # Reaplica as alterações do diário ainda não compactadas no Excel
+        self.diario.seq = self._seq_salvo
+        registros = [r for r in self.diario.ler() if r['seq'] > self._seq_salvo]
+        for registro in registros:
+            for entidade, chave, dados in registro['alteracoes']:
+                self._aplicar_alteracao(entidade, chave, dados)
+                self._abas_alteradas.add(entidade)
+        if registros:
+            self._invalidar_indices()
+            self.versao += 1
+            # Cada registro traz os totais após a operação
+            self.agregados = Agregados.de_meta(registros[-1].get('meta', {})) or Agregados.recalcular(self, base=self.agregados)
+            print(f"{len(registros)} alterações recuperadas do diário.")
+
+    def _aplicar_alteracao(self, entidade, chave, dados):
+        if entidade == 'Categorias':
+            self.categorias.add(chave)
+            return
+        if entidade == 'Gastos':
+            self.categorias.add(dados['categoria'])
+        registros = getattr(self, ENTIDADES[entidade])
+        if chave < len(registros):
+            registros[chave] = dados
+        elif isinstance(registros, TabelaColunar):
+            registros.adicionar(dados)
+        else:
+            registros.append(dados)
+
+    def _registro(self, entidade, chave):
+        if entidade == 'Categorias':
+            return None
+        return getattr(self, ENTIDADES[entidade])[chave]
+
+    def _marcar(self, entidade, chave):
+        self._pendentes[(entidade, chave)] = None
+        self._abas_alteradas.add(entidade)
+
+    def _marcar_novo(self, entidade):
+        # Marca o último registro adicionado à entidade
+        self._marcar(entidade, len(getattr(self, ENTIDADES[entidade])) - 1)
+
+    def _concluir(self, tipo='alteracao', descricao=None, data=None, por_data=None):
+        # Chamado ao fim de cada operação que altera os dados. `tipo`, `descricao`
+        # e `data` (padrão: hoje) identificam o evento no histórico.
+        self.versao += 1
+        self._alterado = True
+        self._anotar_historico(tipo, descricao, data, por_data)
+        if self.autosave and not self._transacoes_abertas:
+            self.persistir()
+
+    @contextmanager
+    def transacao(self):
+        # Agrupa operações: tudo é gravado uma única vez na saída do bloco e, se
+        # ocorrer uma exceção, o estado em memória volta ao do início. Blocos
+        # aninhados fazem parte da transação mais externa.
+        if self._transacoes_abertas:
+            self._transacoes_abertas += 1
+            try:
+                yield self
+            finally:
+                self._transacoes_abertas -= 1
+            return
 
-    def adicionar_recebimento(self, valor, dia, descricao):
-        self.saldo += valor
-        self.recebimentos.append({'valor': valor, 'dia': dia, 'descricao': descricao})
-        self.salvar_dados()
+        estado = self._instantaneo()
+        self._transacoes_abertas = 1
+        try:
+            yield self
+        except BaseException:
+            self._restaurar(estado)
+            raise
+        finally:
+            self._transacoes_abertas = 0
+        for registros in estado['entidades'].values():
+            if isinstance(registros, TabelaColunar):
+                registros.confirmar()
+        if self._alterado:
+            self.persistir()
+
+    def _instantaneo(self):
+        # Estado em memória no início de uma transação. As tabelas colunares
+        # guardam só os valores que forem alterados; as demais entidades são pequenas
+        # e são copiadas. Abas ainda não lidas ficam como None.
+        estado = {
+            'agregados': Agregados.de_meta(self.agregados.para_meta()),
+            'categorias': set(self.categorias),
+            'pendentes': dict(self._pendentes),
+            'alterado': self._alterado,
+            'historico': (len(self._historico_pendente), self.__dict__.get('_estado_anotado')),
+            'entidades': {},
+        }
+        for aba, atributo in ENTIDADES.items():
+            chave = '_' + atributo if aba in ABAS_SOB_DEMANDA else atributo
+            registros = self.__dict__.get(chave)
+            if isinstance(registros, TabelaColunar):
+                registros.iniciar_transacao()
+            elif registros is not None:
+                registros = [dict(registro) for registro in registros]
+            estado['entidades'][chave] = registros
+        return estado
+
+    def _restaurar(self, estado):
+        for chave, registros in estado['entidades'].items():
+            if isinstance(registros, TabelaColunar):
+                registros.desfazer()
+            self.__dict__[chave] = registros
+        self.agregados = estado['agregados']
+        self.categorias = estado['categorias']
+        self._pendentes = estado['pendentes']
+        self._alterado = estado['alterado']
+        pendentes, self._estado_anotado = estado['historico']
+        del self._historico_pendente[pendentes:]
+        self._invalidar_indices()
+        self.versao += 1
+
+    def persistir(self):
+        self._gravar_historico()
+        if self.armazenamento.incremental:
+            # Grava somente as linhas alteradas
+            alteracoes = [(entidade, chave, self._linha(entidade, chave)) for entidade, chave in self._pendentes]
+            try:
+                self.armazenamento.gravar(alteracoes, self._meta())
+                self._pendentes.clear()
+                self._abas_alteradas = set()
+                self._alterado = False
+            except Exception as e:
+                print(f"Erro ao salvar dados em {self.armazenamento.arquivo}: {e}")
+            return
+
+        if self.diario is None:
+            self.salvar_dados()
+            return
+
+        self._descartar_diario_gravado()
+        alteracoes = [[entidade, chave, self._registro(entidade, chave)] for entidade, chave in self._pendentes]
+        self._pendentes.clear()
+        self.diario.registrar(alteracoes, self._meta())
+        self._alterado = False
+        if self.diario.registros >= self.compactar_a_cada and not (self.gravador and self.gravador.ocupado):
+            self.compactar()
+
+    def compactar(self):
+        # Regrava o Excel completo e descarta o diário já incorporado. Em segundo
+        # plano, o diário é reduzido depois, por _descartar_diario_gravado.
+        if self.gravador:
+            self._gravar_em_segundo_plano()
+        elif self.salvar_dados() and self.diario:
+            self.diario.truncar()
+
+    def _gravar_em_segundo_plano(self):
+        # As tabelas copiadas aqui são independentes dos dados em memória, que
+        # podem continuar mudando enquanto a thread grava. Só acontece na
+        # compactação do diário: as demais operações apenas anexam ao diário.
+        tabelas = self._tabelas(self._abas_a_gravar(self.armazenamento))
+        self._abas_alteradas = set()
+        self._regravar_tudo = False
+        self.gravador.notificar((tabelas, self._meta()))
+        self._pendentes.clear()
+        self._alterado = False
+
+    def _combinar_instantaneos(self, anterior, novo):
+        # Abas do instantâneo anterior ausentes do novo não mudaram desde então
+        return {**anterior[0], **novo[0]}, novo[1]
+
+    def _gravar_instantaneo(self, instantaneo):
+        # Executado na thread do gravador. Após uma falha, a próxima gravação
+        # converte todas as abas, pois as marcações de alteração já foram limpas.
+        tabelas, meta = instantaneo
+        try:
+            self.armazenamento.salvar(tabelas, meta)
+        except Exception as e:
+            print(f"Erro ao salvar dados em {self.armazenamento.arquivo}: {e}")
+            self._regravar_tudo = True
+            return False
+        self._seq_salvo = meta['seq_diario']
+        return True
+
+    def _descartar_diario_gravado(self):
+        # Só a thread principal escreve no diário, então é ela que descarta os
+        # registros já incorporados ao Excel por uma gravação em segundo plano
+        if self.diario.registros and self._seq_salvo > self.diario.seq - self.diario.registros:
+            self.diario.truncar(ate=self._seq_salvo)
+
+    def fechar(self, compactar=True):
+        # Sem compactar, o diário fica para a próxima abertura ou compactação
+        if self.gravador:
+            # Conclui as gravações pendentes; o restante do fechamento é síncrono
+            self.gravador.encerrar()
+            self.gravador = None
+        if self._alterado:
+            self.persistir()
+        if self.diario:
+            self._descartar_diario_gravado()
+            if compactar and self.diario.registros:
+                self.compactar()
+            self.diario.fechar()
+        self.armazenamento.fechar()
+        if self.historico is not None:
+            self._gravar_historico()
+            self.historico.fechar()
+
+    def _estado_investimentos(self):
+        return {('investimento', investimento['produto'], investimento['banco']): para_centavos(investimento['valor'])
+                for investimento in self.investimentos}
+
+    def _estado_historico(self):
+        # Valores acompanhados pelo histórico, em centavos. Os investimentos só
+        # entram se já foram lidos: antes disso, nenhuma operação os alterou.
+        estado = {('saldo',): self.agregados.saldo}
+        for cartao in self.cartoes:
+            estado[('limite', cartao['nome'])] = para_centavos(cartao['limite'])
+        for descricao, centavos in self.agregados.por_financiamento.items():
+            estado[('financiamento', descricao)] = centavos
+        if self.__dict__.get('_investimentos') is not None:
+            estado.update(self._estado_investimentos())
+        return estado
+
+    def _anotar_historico(self, tipo, descricao=None, data=None, por_data=None):
+        # Transforma em eventos a variação dos valores desde a última anotação.
+        # `por_data` {data: variações} reparte parte dela pelas datas dos
+        # lançamentos (importação); o restante fica em `data`.
+        if self.historico is None:
+            return
+        estado = self._estado_historico()
+        restante = diferenca(estado, self._estado_anotado)
+        for data_lancamento, variacoes in sorted((por_data or {}).items()):
+            self._historico_pendente.append((data_lancamento, tipo, descricao, variacoes))
+            somar(restante, variacoes, -1)
+        restante = {chave: centavos for chave, centavos in restante.items() if centavos}
+        if restante:
+            self._historico_pendente.append((data or date.today(), tipo, descricao, restante))
+        self._estado_anotado = estado
+
+    def _gravar_historico(self, conferir=False):
+        # Grava os eventos anotados, exceto no meio de uma transação, que ainda
+        # pode ser desfeita
+        if self.historico is None or self._transacoes_abertas or not (self._historico_pendente or conferir):
+            return
+        try:
+            self._conferir_historico()
+            self.historico.registrar(self._historico_pendente)
+            self._historico_pendente = []
+        except Exception as e:
+            print(f"Erro ao gravar o histórico em {self.historico.caminho}: {e}")
 
-    def adicionar_gasto(self, valor, categoria, descricao, tipo='débito', cartao=None, parcelado=False, parcelas=1):
+    def _conferir_historico(self):
+        # Uma vez por sessão: o que mudou no arquivo sem passar pelo histórico
+        # (versões anteriores, gravação interrompida) vira um evento de ajuste, e
+        # num histórico novo o estado da abertura vira o evento inicial
+        if self._historico_conferido:
+            return
+        registrado = self.historico.estado_em()
+        if registrado is None and self.__dict__.get('_investimentos') is None:
+            # O evento inicial inclui os investimentos
+            self._carregar_sob_demanda('investimentos')
+        tipo = 'ajuste' if registrado is not None else 'inicio'
+        registrado = {chave: centavos for chave, centavos in (registrado or {}).items()
+                      if chave[0] != 'investimento' or self.__dict__.get('_investimentos') is not None}
+        self.historico.registrar([(date.today(), tipo, None, diferenca(self._estado_base, registrado))])
+        self._historico_conferido = True
+
+    def estado_em(self, data):
+        # Saldo, limites dos cartões, valor dos investimentos e valor pago dos
+        # financiamentos ao fim do dia `data`, pelo histórico; None se o
+        # histórico começa depois dessa data
+        if self.historico is None:
+            return None
+        self._gravar_historico(conferir=True)
+        estado = self.historico.estado_em(data)
+        return None if estado is None else descrever(estado, data)
+
+    def _linha(self, entidade, chave):
+        # Registro no formato das abas/tabelas do armazenamento
+        if entidade == 'Categorias':
+            return {'nome': chave}
+        registro = getattr(self, ENTIDADES[entidade])[chave]
+        if entidade == 'Gastos':
+            return {coluna: registro[campo] for coluna, campo in COLUNAS_GASTO.items()}
+        return registro
+
+    def _abas_a_gravar(self, armazenamento):
+        # Abas alteradas desde a última gravação, mais as que o armazenamento não
+        # tem como reaproveitar. Categorias, pequena e alterada também pelos
+        # gastos, é sempre regravada.
+        if armazenamento is not self.armazenamento or self._regravar_tudo:
+            return list(ESQUEMA)
+        reaproveitaveis = armazenamento.abas_reaproveitaveis()
+        return [aba for aba in ESQUEMA
+                if aba in self._abas_alteradas or aba == 'Categorias' or aba not in reaproveitaveis]
+
+    def _tabelas(self, abas=ESQUEMA):
+        import pandas as pd
+        tabelas = {}
+        for aba in abas:
+            if aba == 'Categorias':
+                tabelas[aba] = pd.DataFrame({'nome': sorted(self.categorias)})
+            elif aba == 'Gastos':
+                tabelas[aba] = self.gastos.para_dataframe().rename(
+                    columns={campo: coluna for coluna, campo in COLUNAS_GASTO.items()})
+            elif aba in COLUNAS:
+                tabelas[aba] = getattr(self, ENTIDADES[aba]).para_dataframe()
+            else:
+                tabelas[aba] = pd.DataFrame(getattr(self, ENTIDADES[aba]))
+        return tabelas
+
+    def _meta(self):
+        # Último registro do diário incorporado ao arquivo e totais mantidos
+        meta = {'seq_diario': self.diario.seq if self.diario else 0}
+        meta.update(self.agregados.para_meta())
+        return meta
+
+    def salvar_dados(self, armazenamento=None):
+        armazenamento = armazenamento or self.armazenamento
+        if self.gravador and armazenamento is self.armazenamento:
+            # Conclui antes a gravação pendente na thread, que usa o mesmo arquivo
+            self.gravador.aguardar()
+        try:
+            meta = self._meta()
+            armazenamento.salvar(self._tabelas(self._abas_a_gravar(armazenamento)), meta)
+
+            if armazenamento is self.armazenamento:
+                self._gravar_historico()
+                self._seq_salvo = meta['seq_diario']
+                self._pendentes.clear()
+                self._abas_alteradas = set()
+                self._regravar_tudo = False
+                self._alterado = False
+            print(f"\nDados salvos em {armazenamento.arquivo}")
+            return True
+        except Exception as e:
+            print(f"Erro ao salvar dados em {armazenamento.arquivo}: {e}")
+            return False
+
+    def exportar_excel(self, arquivo):
+        # Exporta o estado atual para uma planilha, sem mudar o armazenamento em uso
+        return self.salvar_dados(ArmazenamentoExcel(arquivo))
+
+    def importar_excel(self, arquivo):
+        # Substitui os dados atuais pelos da planilha e os grava no armazenamento em uso
+        self._limpar_dados()
+        self.carregar_dados(ArmazenamentoExcel(arquivo))
+        self._anotar_historico('importacao_excel', arquivo)
+        return self.salvar_dados()
+
+    def carregar_em_lote(self, tabelas, saldo_inicial=None):
+        # Acrescenta de uma vez registros já prontos, sem passar pelas operações:
+        # {aba: DataFrame} nas tabelas colunares (campos como em memória), listas
+        # de dicionários nas demais e de nomes em 'Categorias'. Os totais são
+        # recalculados e as abas ficam marcadas para a próxima gravação.
+        for aba, dados in tabelas.items():
+            if aba == 'Categorias':
+                self.categorias.update(dados)
+                continue
+            registros = getattr(self, ENTIDADES[aba])
+            if isinstance(registros, TabelaColunar):
+                registros.estender(dados)
+            else:
+                registros.extend(dados)
+        self.categorias.update(self.gastos.rotulos('categoria'))
+        if saldo_inicial is not None:
+            self.agregados.definir_saldo_inicial(para_centavos(saldo_inicial))
+        self.agregados = Agregados.recalcular(self, base=self.agregados)
+        self._invalidar_indices()
+        self._abas_alteradas.update(tabelas)
+        self._abas_alteradas.add('Categorias')
+        self.versao += 1
+        self._alterado = True
+        self._anotar_historico('carga_em_lote')
+
+    def adicionar_recebimento(self, valor, dia, descricao, data=None):
+        if data is None:
+            # Sem data completa, o recebimento é do dia informado no mês atual
+            hoje = date.today()
+            data = hoje.replace(day=min(dia, calendar.monthrange(hoje.year, hoje.month)[1]))
+        centavos = para_centavos(valor)
+        self.agregados.recebimento(centavos, data.strftime('%Y-%m'))
+        self.recebimentos.adicionar({'valor': para_reais(centavos), 'dia': data.day, 'descricao': descricao, 'data': data})
+        self._indexar_transacao(data, centavos, descricao)
+        self._marcar_novo('Recebimentos')
+        self._concluir('recebimento', descricao, data)
+
+    def adicionar_gasto(self, valor, categoria, descricao, tipo='débito', cartao=None, parcelado=False, parcelas=1,
+                        data=None):
         if tipo == 'crédito' and cartao is None:
             print("Para gastos no crédito, é necessário informar o cartão.")
             return
 
+        centavos = para_centavos(valor)
         if tipo == 'crédito':
-            cartao_encontrado = next((c for c in self.cartoes if c['nome'] == cartao), None)
-            if not cartao_encontrado:
+            indice_cartao = self._cartao(cartao)
+            if indice_cartao is None:
                 print(f"Cartão '{cartao}' não encontrado.")
                 return
-            if cartao_encontrado['limite'] < valor:
+            cartao_encontrado = self.cartoes[indice_cartao]
+            limite = para_centavos(cartao_encontrado['limite'])
+            if limite < centavos:
                 print(f"Limite insuficiente no cartão '{cartao}'.")
                 return
-            cartao_encontrado['limite'] -= valor
+            cartao_encontrado['limite'] = para_reais(limite - centavos)
+            self._marcar('Cartoes', indice_cartao)
 
             if parcelado:
-                valor_parcela = valor / parcelas
-                for i in range(parcelas):
-                    self.parcelas.append({
+                # Parcelas exatas: o resto da divisão em centavos fica na última
+                for i, valor_parcela in enumerate(dividir(centavos, parcelas)):
+                    self._nova_parcela({
                         'cartao': cartao,
-                        'valor': valor_parcela,
+                        'valor': para_reais(valor_parcela),
                         'descricao': descricao,
                         'parcela_atual': i + 1,
                         'parcelas_total': parcelas,
                         'pago': False
                     })
             else:
-                self.faturas.append({'cartao': cartao, 'valor': valor, 'pago': False})
+                self._nova_fatura({'cartao': cartao, 'valor': para_reais(centavos), 'pago': False})
 
-        elif valor > self.saldo:
+        elif centavos > self.agregados.saldo:
             print("Saldo insuficiente!")
             return
 
-        self.saldo -= valor if tipo == 'débito' else 0
-        self.gastos[categoria].append({
-            'valor': valor,
+        data = data or date.today()
+        self.agregados.gasto(centavos, categoria, tipo, cartao, data.strftime('%Y-%m'))
+        self.gastos.adicionar({
+            'categoria': categoria,
+            'valor': para_reais(centavos),
             'descricao': descricao,
             'tipo': tipo,
             'cartao': cartao,
             'parcelado': parcelado,
             'parcelas_total': parcelas,
-            'parcelas_restantes': parcelas
+            'parcelas_restantes': parcelas,
+            'data': data
         })
+        self._indexar_transacao(data, -centavos, descricao)
         self.categorias.add(categoria)
-        self.salvar_dados()
+        self._marcar_novo('Gastos')
+        self._concluir('gasto', descricao, data)
+
+    def importar_extrato(self, caminho, cartao=None, regras=(), categoria_padrao='Outros'):
+        # Importa um extrato CSV/OFX em lote: valores positivos viram recebimentos
+        # e negativos viram gastos (no crédito, se houver cartão). O lote inteiro
+        # é gravado com uma única persistência ao final.
+        if cartao is not None and self._cartao(cartao) is None:
+            print(f"Cartão '{cartao}' não encontrado.")
+            return None
+
+        resumo = {'recebimentos': 0, 'gastos': 0, 'duplicados': 0, 'invalidos': 0, 'ignorados': 0,
+                  'sem_limite': 0, 'sem_saldo': 0}
+        existentes = self._transacoes()
+        repetidos = Counter()  # Ocorrências já casadas com lançamentos existentes
+        saldo = self.agregados.saldo
+        limites = {}  # cartão -> limite disponível em centavos
+        no_credito = Counter()  # cartão -> total importado em centavos
+        recebimentos, gastos = [], []
+
+        try:
+            for linha in ler_extrato(caminho):
+                if linha is None:
+                    resumo['invalidos'] += 1
+                    continue
+                centavos = linha['centavos']
+                chave = (linha['data'], centavos, linha['descricao'])
+                if repetidos[chave] < existentes[chave]:
+                    repetidos[chave] += 1
+                    resumo['duplicados'] += 1
+                    continue
+
+                cartao_linha = linha['cartao'] or cartao
+                if centavos > 0:
+                    if cartao_linha is not None:
+                        # Pagamentos e estornos no extrato do cartão
+                        resumo['ignorados'] += 1
+                        continue
+                    saldo += centavos
+                    recebimentos.append({'valor': para_reais(centavos), 'dia': linha['data'].day,
+                                         'descricao': linha['descricao'], 'data': linha['data']})
+                    continue
+
+                centavos = -centavos
+                if cartao_linha is not None:
+                    if cartao_linha not in limites:
+                        indice_cartao = self._cartao(cartao_linha)
+                        if indice_cartao is None:
+                            resumo['invalidos'] += 1
+                            continue
+                        limites[cartao_linha] = para_centavos(self.cartoes[indice_cartao]['limite'])
+                    if no_credito[cartao_linha] + centavos > limites[cartao_linha]:
+                        resumo['sem_limite'] += 1
+                        continue
+                    no_credito[cartao_linha] += centavos
+                elif centavos > saldo:
+                    resumo['sem_saldo'] += 1
+                    continue
+                else:
+                    saldo -= centavos
+
+                gastos.append({
+                    'categoria': categorizar(linha['descricao'], regras, linha['categoria'] or categoria_padrao),
+                    'valor': para_reais(centavos),
+                    'descricao': linha['descricao'],
+                    'tipo': 'crédito' if cartao_linha is not None else 'débito',
+                    'cartao': cartao_linha,
+                    'parcelado': False,
+                    'parcelas_total': 1,
+                    'parcelas_restantes': 1,
+                    'data': linha['data']
+                })
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Erro ao ler o extrato {caminho}: {e}")
+            return None
+
+        # Aplica o lote: tabelas estendidas de uma vez, totais e índices atualizados.
+        # No histórico, o saldo e o limite mudam na data de cada lançamento.
+        import pandas as pd
+        por_data = {}
+        for entidade, tabela, novos, sinal in (('Recebimentos', self.recebimentos, recebimentos, 1),
+                                               ('Gastos', self.gastos, gastos, -1)):
+            inicio = len(tabela)
+            tabela.estender(pd.DataFrame(novos))
+            for indice, registro in enumerate(novos, inicio):
+                centavos = para_centavos(registro['valor'])
+                mes = registro['data'].strftime('%Y-%m')
+                variacoes = por_data.setdefault(registro['data'], {})
+                if sinal > 0:
+                    self.agregados.recebimento(centavos, mes)
+                    somar(variacoes, {('saldo',): centavos})
+                else:
+                    self.agregados.gasto(centavos, registro['categoria'], registro['tipo'], registro['cartao'], mes)
+                    self.categorias.add(registro['categoria'])
+                    chave = ('limite', registro['cartao']) if registro['tipo'] == 'crédito' else ('saldo',)
+                    somar(variacoes, {chave: -centavos})
+                self._indexar_transacao(registro['data'], sinal * centavos, registro['descricao'])
+                self._marcar(entidade, indice)
+        for cartao_lote, total in no_credito.items():
+            indice_cartao = self._cartao(cartao_lote)
+            self.cartoes[indice_cartao]['limite'] = para_reais(para_centavos(self.cartoes[indice_cartao]['limite']) - total)
+            self._marcar('Cartoes', indice_cartao)
+            self._nova_fatura({'cartao': cartao_lote, 'valor': para_reais(total), 'pago': False})
+
+        resumo['recebimentos'], resumo['gastos'] = len(recebimentos), len(gastos)
+        if recebimentos or gastos:
+            self._concluir('importacao', os.path.basename(caminho), por_data=por_data)
+        print(f"Importados {len(recebimentos)} recebimentos e {len(gastos)} gastos de {caminho}.")
+        for motivo, descricao in (('duplicados', 'já importadas'), ('sem_limite', 'sem limite no cartão'),
+                                  ('sem_saldo', 'sem saldo'), ('ignorados', 'de pagamento/estorno do cartão'),
+                                  ('invalidos', 'inválidas')):
+            if resumo[motivo]:
+                print(f"{resumo[motivo]} linhas {descricao} foram ignoradas.")
+        return resumo
 
     def adicionar_financiamento(self, valor_total, parcelas, descricao):
         if any(fin['descricao'] == descricao for fin in self.financiamentos):
             print(f"Já existe um financiamento cadastrado com a descrição '{descricao}'.")
             return
         self.financiamentos.append({
-            'valor_total': valor_total,
+            'valor_total': arredondar(valor_total),
             'parcelas': parcelas,
             'parcelas_pagas': 0,
             'descricao': descricao
         })
-        self.salvar_dados()
+        self._marcar_novo('Financiamentos')
+        self._concluir('financiamento', descricao)
 
     def pagar_parcela_financiamento(self, descricao):
-        for financiamento in self.financiamentos:
+        for indice, financiamento in enumerate(self.financiamentos):
             if financiamento['descricao'] == descricao:
                 if financiamento['parcelas_pagas'] < financiamento['parcelas']:
                     print(f"\n--- Pagar Parcelas do Financiamento: {financiamento['descricao']} ---")
                     parcelas_pendentes = financiamento['parcelas'] - financiamento['parcelas_pagas']
-                    valor_parcela = financiamento['valor_total'] / financiamento['parcelas']
-                    print(f"Valor da parcela: R$ {valor_parcela:.2f}")
+                    valores_parcelas = dividir(para_centavos(financiamento['valor_total']), financiamento['parcelas'])
+                    print(f"Valor da parcela: R$ {para_reais(valores_parcelas[0]):.2f}")
+                    if valores_parcelas[-1] != valores_parcelas[0]:
+                        print(f"Valor da última parcela: R$ {para_reais(valores_parcelas[-1]):.2f}")
                     print(f"Parcelas pendentes: {parcelas_pendentes}")
 
                     # Selecionar parcelas a pagar
                     parcelas_a_pagar = input("Digite os números das parcelas a pagar (separados por vírgula): ")
-                    parcelas_a_pagar = [int(p.strip()) for p in parcelas_a_pagar.split(',') if p.strip().isdigit()]
+                    parcelas_a_pagar = list(dict.fromkeys(int(p.strip()) for p in parcelas_a_pagar.split(',')
+                                                          if p.strip().isdigit()))
 
                     if not parcelas_a_pagar:
                         print("Nenhuma parcela selecionada.")
                         return
 
-                    # Verificar se as parcelas selecionadas são válidas
+                    # Verificar se as parcelas selecionadas são válidas: só as ainda não pagas
+                    pagas = financiamento['parcelas_pagas']
                     for parcela_num in parcelas_a_pagar:
-                        if parcela_num < 1 or parcela_num > financiamento['parcelas']:
+                        if parcela_num <= pagas or parcela_num > financiamento['parcelas']:
                             print(f"Parcela {parcela_num} inválida.")
                             return
+                    if len(parcelas_a_pagar) > parcelas_pendentes:
+                        print(f"Há apenas {parcelas_pendentes} parcelas pendentes.")
+                        return
 
-                    # Calcular valor total das parcelas selecionadas
-                    valor_total = valor_parcela * len(parcelas_a_pagar)
-                    print(f"Valor total das parcelas selecionadas: R$ {valor_total:.2f}")
+                    # Calcular valor total das parcelas selecionadas (as próximas a vencer)
+                    nominal = sum(valores_parcelas[pagas:pagas + len(parcelas_a_pagar)])
+                    print(f"Valor total das parcelas selecionadas: R$ {para_reais(nominal):.2f}")
 
                     # Verificar desconto
+                    valor_total = nominal
                     desconto = input("Há desconto para pagamento antecipado? (s/n): ").lower()
                     if desconto == 's':
-                        valor_total = self.solicitar_valor("Digite o valor total com desconto: R$ ")
+                        valor_total = para_centavos(self.solicitar_valor("Digite o valor total com desconto: R$ "))
 
-                    if valor_total > self.saldo:
+                    if valor_total > self.agregados.saldo:
                         print("Saldo insuficiente para pagar as parcelas selecionadas.")
                         return
 
                     # Pagar as parcelas selecionadas
-                    self.saldo -= valor_total
                     financiamento['parcelas_pagas'] += len(parcelas_a_pagar)
+                    self.agregados.pagar_financiamento(descricao, nominal, valor_total)
                     print(f"Parcelas {', '.join(map(str, parcelas_a_pagar))} pagas com sucesso!")
-                    self.salvar_dados()
+                    self._marcar('Financiamentos', indice)
+                    self._concluir('pagamento_financiamento', descricao)
                 else:
                     print("Todas as parcelas já foram pagas!")
                 return
         print("Financiamento não encontrado!")
 
     def cadastrar_cartao(self, nome, limite, dia_vencimento):
-        if any(c['nome'] == nome for c in self.cartoes):
+        if self._cartao(nome) is not None:
             print(f"Já existe um cartão cadastrado com o nome '{nome}'.")
             return
-        self.cartoes.append({'nome': nome, 'limite': limite, 'dia_vencimento': dia_vencimento})
-        self.salvar_dados()
+        self.cartoes.append({'nome': nome, 'limite': arredondar(limite), 'dia_vencimento': dia_vencimento})
+        self._indice_cartoes[nome] = len(self.cartoes) - 1
+        self._marcar_novo('Cartoes')
+        self._concluir('cartao', nome)
+
+    def _cartao(self, nome):
+        # Posição do cartão em self.cartoes, ou None se não cadastrado
+        if self._indice_cartoes is None:
+            self._indice_cartoes = {c['nome']: i for i, c in enumerate(self.cartoes)}
+        return self._indice_cartoes.get(nome)
+
+    def _abertas_por_cartao(self, tabela):
+        # Posições das linhas não pagas agrupadas pelo código do cartão, sem
+        # decodificar linha a linha: [(cartão, posições, valores em centavos)]
+        abertas = np.flatnonzero(~tabela.coluna('pago'))
+        codigos = tabela.coluna('cartao')[abertas]
+        valores = tabela.coluna('valor')[abertas]
+        rotulos = tabela.rotulos('cartao')
+        grupos = []
+        for codigo in np.unique(codigos).tolist():
+            mascara = codigos == codigo
+            grupos.append((rotulos[codigo] if codigo >= 0 else None, abertas[mascara], valores[mascara]))
+        return grupos
+
+    def _faturas_abertas(self):
+        if self._indice_faturas is None:
+            with self._trava_indices:
+                if self._indice_faturas is None:
+                    self._indice_faturas = {cartao: {'indices': indices.tolist(), 'total': int(valores.sum())}
+                                            for cartao, indices, valores in self._abertas_por_cartao(self.faturas)}
+        return self._indice_faturas
+
+    def _indexar_fatura(self, indice):
+        cartao = self.faturas[indice]['cartao']
+        abertas = self._indice_faturas.setdefault(cartao, {'indices': [], 'total': 0})
+        abertas['indices'].append(indice)
+        abertas['total'] += int(self.faturas.coluna('valor')[indice])
+
+    def _nova_fatura(self, fatura):
+        indice = self.faturas.adicionar(fatura)
+        if self._indice_faturas is not None and not fatura['pago']:
+            self._indexar_fatura(indice)
+        self._marcar('Faturas', indice)
+
+    def _parcelas_abertas(self):
+        # Cada cartão aponta para um dicionário usado como conjunto ordenado de posições
+        if self._indice_parcelas is None:
+            with self._trava_indices:
+                if self._indice_parcelas is None:
+                    self._indice_parcelas = {cartao: dict.fromkeys(indices.tolist())
+                                             for cartao, indices, _ in self._abertas_por_cartao(self.parcelas)}
+        return self._indice_parcelas
+
+    def _indexar_parcela(self, indice):
+        cartao = self.parcelas[indice]['cartao']
+        self._indice_parcelas.setdefault(cartao, {})[indice] = None
+
+    def _nova_parcela(self, parcela):
+        indice = self.parcelas.adicionar(parcela)
+        if self._indice_parcelas is not None and not parcela['pago']:
+            self._indexar_parcela(indice)
+        self._marcar('Parcelas', indice)
+
+    def _transacoes(self):
+        # Índice de hash usado para não importar duas vezes o mesmo lançamento
+        if self._indice_transacoes is None:
+            # Montado à parte: ler uma tabela adiada invalida os índices
+            indice = Counter()
+            for sinal, tabela in ((1, self.recebimentos), (-1, self.gastos)):
+                chaves = zip(tabela.coluna('data').astype(object).tolist(), (sinal * tabela.coluna('valor')).tolist(),
+                             (registro['descricao'] for registro in tabela.registros()))
+                indice.update(chaves)
+            self._indice_transacoes = indice
+        return self._indice_transacoes
+
+    def _indexar_transacao(self, data, centavos, descricao):
+        if self._indice_transacoes is not None:
+            self._indice_transacoes[(data, centavos, descricao)] += 1
+
+    def parcelas_pendentes(self):
+        # Posições das parcelas não pagas, em ordem de cadastro
+        indices = [i for abertas in self._parcelas_abertas().values() for i in abertas]
+        return np.array(sorted(indices), dtype=np.int64)
 
     def pagar_fatura(self, cartao):
-        fatura = sum(f['valor'] for f in self.faturas if f['cartao'] == cartao and not f['pago'])
+        abertas = self._faturas_abertas().get(cartao)
+        fatura = abertas['total'] if abertas else 0
         if fatura == 0:
             print(f"Não há fatura pendente para o cartão '{cartao}'.")
             return
 
-        if fatura > self.saldo:
+        if fatura > self.agregados.saldo:
             print("Saldo insuficiente para pagar a fatura!")
             return
 
-        self.saldo -= fatura
-        for f in self.faturas:
-            if f['cartao'] == cartao and not f['pago']:
-                f['pago'] = True
+        self.agregados.pagar_fatura(fatura)
+        for i in abertas['indices']:
+            self.faturas.definir(i, 'pago', True)
+            self._marcar('Faturas', i)
+        del self._indice_faturas[cartao]
         print(f"Fatura do cartão '{cartao}' paga com sucesso!")
-        self.salvar_dados()
+        self._concluir('pagamento_fatura', cartao)
 
     def pagar_parcela_antecipada(self):
         print("\n--- Pagar Parcelas Antecipadas ---")
-        for i, parcela in enumerate(self.parcelas):
-            if not parcela['pago']:
-                print(f"{i + 1}. {parcela['descricao']} (Parcela {parcela['parcela_atual']}/{parcela['parcelas_total']}): R$ {parcela['valor']:.2f}")
+        pendentes = self.parcelas_pendentes()
+        for i, parcela in zip(pendentes.tolist(), self.parcelas.registros(pendentes)):
+            print(f"{i + 1}. {parcela['descricao']} (Parcela {parcela['parcela_atual']}/{parcela['parcelas_total']}): R$ {parcela['valor']:.2f}")
 
         try:
             escolha = input("Digite os números das parcelas a pagar (separados por vírgula): ")
-            escolha = [int(p.strip()) for p in escolha.split(',') if p.strip().isdigit()]
+            # Sem repetições: "1,1" paga a parcela uma vez só
+            escolha = list(dict.fromkeys(int(p.strip()) for p in escolha.split(',') if p.strip().isdigit()))
 
             if not escolha:
                 print("Nenhuma parcela selecionada.")
                 return
 
             # Verificar se as parcelas selecionadas são válidas
+            abertas = set(pendentes.tolist())
             for parcela_num in escolha:
-                if parcela_num < 1 or parcela_num > len(self.parcelas):
+                if parcela_num - 1 not in abertas:
                     print(f"Parcela {parcela_num} inválida.")
                     return
 
             # Calcular valor total das parcelas selecionadas
-            valor_total = sum(self.parcelas[p - 1]['valor'] for p in escolha)
-            print(f"Valor total das parcelas selecionadas: R$ {valor_total:.2f}")
+            nominal = int(self.parcelas.coluna('valor')[[p - 1 for p in escolha]].sum())
+            print(f"Valor total das parcelas selecionadas: R$ {para_reais(nominal):.2f}")
 
             # Verificar desconto
+            valor_total = nominal
             desconto = input("Há desconto para pagamento antecipado? (s/n): ").lower()
             if desconto == 's':
-                valor_total = self.solicitar_valor("Digite o valor total com desconto: R$ ")
+                valor_total = para_centavos(self.solicitar_valor("Digite o valor total com desconto: R$ "))
 
-            if valor_total > self.saldo:
+            if valor_total > self.agregados.saldo:
                 print("Saldo insuficiente para pagar as parcelas selecionadas.")
                 return
 
             # Pagar as parcelas selecionadas
-            self.saldo -= valor_total
+            self.agregados.pagar_parcelas(nominal, valor_total)
             for p in escolha:
-                self.parcelas[p - 1]['pago'] = True
+                cartao = self.parcelas[p - 1]['cartao']
+                self.parcelas.definir(p - 1, 'pago', True)
+                self._parcelas_abertas()[cartao].pop(p - 1, None)
+                self._marcar('Parcelas', p - 1)
             print(f"Parcelas {', '.join(map(str, escolha))} pagas com sucesso!")
-            self.salvar_dados()
+            self._concluir('pagamento_parcelas')
         except (ValueError, IndexError):
             print("Opção inválida.")
 
-    def gerar_relatorio_txt(self, relatorio, nome_arquivo):
-        with open(nome_arquivo, 'w', encoding='utf-8') as arquivo:
-            arquivo.write(relatorio)
+    def buscar(self, entidade='gastos', texto=None, categoria=None, cartao=None, tipo=None, valor_minimo=None,
+               valor_maximo=None, data_inicial=None, data_final=None, limite=None):
+        # Registros de gastos, recebimentos ou parcelas que atendem a todos os
+        # filtros informados, em ordem de cadastro. O texto é procurado palavra
+        # por palavra na descrição; valores em reais e datas são inclusivos.
+        if entidade not in ENTIDADES_BUSCA:
+            raise ValueError(f"busca disponível apenas em {', '.join(ENTIDADES_BUSCA)}")
+        tabela = getattr(self, entidade)
+        indice_texto = self._indices_texto.get(entidade)
+        if indice_texto is None or indice_texto.tabela is not tabela:
+            indice_texto = self._indices_texto[entidade] = busca.IndiceTexto(tabela)
+        faixas = {
+            'valor': (None if valor_minimo is None else para_centavos(valor_minimo),
+                      None if valor_maximo is None else para_centavos(valor_maximo)),
+            'data': (None if data_inicial is None else np.datetime64(data_inicial, 'D'),
+                     None if data_final is None else np.datetime64(data_final, 'D')),
+        }
+        posicoes = busca.buscar(tabela, indice_texto, texto, faixas,
+                                {'categoria': categoria, 'cartao': cartao, 'tipo': tipo})
+        return list(tabela.registros(posicoes[:limite]))
+
+    def faturas_pendentes(self):
+        # Total não pago por cartão, lido do índice de faturas abertas. No SQLite,
+        # enquanto as faturas não foram lidas (nem alteradas), a soma é feita no banco.
+        if self.__dict__.get('_faturas') is None and self.armazenamento.incremental:
+            return {cartao: centavos / 100 for cartao, centavos
+                    in self.armazenamento.pendentes_por_cartao('Faturas').items()}
+        return {cartao: abertas['total'] / 100 for cartao, abertas in self._faturas_abertas().items()}
+
+    def texto_relatorio(self, chave, eventos, formato='txt'):
+        # Texto do relatório identificado por `chave` (tipo e parâmetros), do
+        # cache enquanto os dados não mudarem
+        return self.cache_relatorios.obter(chave, self.versao, eventos, formato)
+
+    def gerar_relatorio(self, eventos, nome, formato='txt', chave=None):
+        # Grava o relatório em relatorios/<nome>_<data e hora>.<formato>. `eventos`
+        # é uma função que gera os eventos; com `chave`, o texto vem do cache.
+        nome_arquivo = f"relatorios/{nome}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+        if chave is None:
+            escrever_relatorio(eventos(), nome_arquivo, formato)
+        else:
+            with open(nome_arquivo, 'w', encoding='utf-8', newline='', buffering=TAMANHO_BUFFER) as arquivo:
+                self.cache_relatorios.gravar(chave, self.versao, eventos, arquivo, formato)
         print(f"Relatório salvo em {nome_arquivo}")
+        return nome_arquivo
 
-    def estatisticas_mes(self):
-        relatorio = "\n--- Estatísticas do Mês ---\n"
-        relatorio += f"Saldo Atual: R$ {self.saldo:.2f}\n"
-
-        total_gastos = sum(sum(gasto['valor'] for gasto in gastos) for gastos in self.gastos.values())
-        relatorio += f"Total de Gastos: R$ {total_gastos:.2f}\n"
-
-        relatorio += "\nGastos por Categoria:\n"
-        for categoria, gastos in self.gastos.items():
-            total_categoria = sum(gasto['valor'] for gasto in gastos)
-            relatorio += f"{categoria}: R$ {total_categoria:.2f}\n"
-
-        relatorio += "\nFinanciamentos:\n"
+    def _eventos_financiamentos(self):
+        yield ('secao', "Financiamentos")
         for financiamento in self.financiamentos:
-            relatorio += f"{financiamento['descricao']}: {financiamento['parcelas_pagas']}/{financiamento['parcelas']} parcelas pagas\n"
+            andamento = f"{financiamento['parcelas_pagas']}/{financiamento['parcelas']} parcelas pagas"
+            yield evento_linha(f"{financiamento['descricao']}: {andamento}", financiamento['descricao'], detalhe=andamento)
 
-        relatorio += "\nFaturas Pendentes:\n"
+    def _eventos_pendencias(self):
+        yield ('secao', "Faturas Pendentes")
+        faturas_pendentes = self.faturas_pendentes()
         for cartao in self.cartoes:
-            fatura = sum(f['valor'] for f in self.faturas if f['cartao'] == cartao['nome'] and not f['pago'])
-            relatorio += f"{cartao['nome']}: R$ {fatura:.2f}\n"
+            valor = faturas_pendentes.get(cartao['nome'], 0.0)
+            yield evento_linha(f"{cartao['nome']}: R$ {valor:.2f}", cartao['nome'], valor)
 
-        relatorio += "\nParcelas Pendentes:\n"
-        for parcela in self.parcelas:
-            if not parcela['pago']:
-                relatorio += f"{parcela['descricao']} (Parcela {parcela['parcela_atual']}/{parcela['parcelas_total']}): R$ {parcela['valor']:.2f}\n"
+        yield ('secao', "Parcelas Pendentes")
+        for parcela in self.parcelas.registros(self.parcelas_pendentes()):
+            item = f"{parcela['descricao']} (Parcela {parcela['parcela_atual']}/{parcela['parcelas_total']})"
+            yield evento_linha(f"{item}: R$ {parcela['valor']:.2f}", item, parcela['valor'])
 
-        nome_arquivo = f"relatorios/estatisticas_mes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        self.gerar_relatorio_txt(relatorio, nome_arquivo)
+    def _eventos_estatisticas(self):
+        yield ('titulo', "Estatísticas do Mês")
+        yield evento_linha(f"Saldo Atual: R$ {self.saldo:.2f}", "Saldo Atual", self.saldo)
+        yield evento_linha(f"Total de Gastos: R$ {self.agregados.gastos / 100:.2f}", "Total de Gastos", self.agregados.gastos / 100)
 
-    def relatorio_completo(self):
-        relatorio = "\n--- Relatório Completo ---\n"
-        relatorio += f"Saldo Atual: R$ {self.saldo:.2f}\n"
+        yield ('secao', "Gastos por Categoria")
+        for categoria, total_categoria in self.agregados.por_categoria.items():
+            yield evento_linha(f"{categoria}: R$ {total_categoria / 100:.2f}", categoria, total_categoria / 100)
 
-        relatorio += "\nRecebimentos:\n"
-        for recebimento in self.recebimentos:
-            relatorio += f"Dia {recebimento['dia']}: R$ {recebimento['valor']:.2f} - {recebimento['descricao']}\n"
+        yield ('secao', "Gastos no Crédito por Cartão")
+        for cartao, total_cartao in self.agregados.por_cartao.items():
+            yield evento_linha(f"{cartao}: R$ {total_cartao / 100:.2f}", cartao, total_cartao / 100)
 
-        relatorio += "\nGastos por Categoria:\n"
-        for categoria, gastos in self.gastos.items():
-            relatorio += f"\n{categoria}:\n"
-            for gasto in gastos:
-                relatorio += f"  {gasto['descricao']}: R$ {gasto['valor']:.2f} ({gasto['tipo']})\n"
+        yield from self._eventos_financiamentos()
+        yield from self._eventos_pendencias()
 
-        relatorio += "\nFinanciamentos:\n"
-        for financiamento in self.financiamentos:
-            relatorio += f"{financiamento['descricao']}: {financiamento['parcelas_pagas']}/{financiamento['parcelas']} parcelas pagas\n"
+    def estatisticas_mes(self, formato='txt'):
+        return self.gerar_relatorio(self._eventos_estatisticas, "estatisticas_mes", formato, chave=('estatisticas',))
 
-        relatorio += "\nCartões de Crédito:\n"
-        for cartao in self.cartoes:
-            relatorio += f"{cartao['nome']}: Limite R$ {cartao['limite']:.2f}, Vencimento dia {cartao['dia_vencimento']}\n"
+    def _eventos_completo(self):
+        yield ('titulo', "Relatório Completo")
+        yield evento_linha(f"Saldo Atual: R$ {self.saldo:.2f}", "Saldo Atual", self.saldo)
 
-        relatorio += "\nFaturas Pendentes:\n"
+        yield ('secao', "Recebimentos")
+        for recebimento in self.recebimentos:
+            yield evento_linha(f"Dia {recebimento['dia']}: R$ {recebimento['valor']:.2f} - {recebimento['descricao']}",
+                        f"Dia {recebimento['dia']}", recebimento['valor'], recebimento['descricao'])
+
+        yield ('secao', "Gastos por Categoria")
+        categoria_atual = None
+        # Ordenação estável pelo código da categoria: agrupa mantendo a ordem de cadastro
+        for gasto in self.gastos.registros(np.argsort(self.gastos.coluna('categoria'), kind='stable')):
+            if gasto['categoria'] != categoria_atual:
+                categoria_atual = gasto['categoria']
+                yield ('grupo', categoria_atual)
+            yield evento_linha(f"{gasto['descricao']}: R$ {gasto['valor']:.2f} ({gasto['tipo']})",
+                        gasto['descricao'], gasto['valor'], gasto['tipo'])
+
+        yield from self._eventos_financiamentos()
+
+        yield ('secao', "Cartões de Crédito")
         for cartao in self.cartoes:
-            fatura = sum(f['valor'] for f in self.faturas if f['cartao'] == cartao['nome'] and not f['pago'])
-            relatorio += f"{cartao['nome']}: R$ {fatura:.2f}\n"
-
-        relatorio += "\nParcelas Pendentes:\n"
-        for parcela in self.parcelas:
-            if not parcela['pago']:
-                relatorio += f"{parcela['descricao']} (Parcela {parcela['parcela_atual']}/{parcela['parcelas_total']}): R$ {parcela['valor']:.2f}\n"
-
-        nome_arquivo = f"relatorios/relatorio_completo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        self.gerar_relatorio_txt(relatorio, nome_arquivo)
-
-    def relatorio_mensal(self, mes, ano):
-        relatorio = f"\n--- Relatório Mensal: {mes}/{ano} ---\n"
-        recebimentos_mes = [r for r in self.recebimentos if datetime.strptime(str(r['dia']), '%d').month == mes and datetime.strptime(str(r['dia']), '%d').year == ano]
-        gastos_mes = [g for gastos in self.gastos.values() for g in gastos if datetime.strptime(str(g['dia']), '%d').month == mes and datetime.strptime(str(g['dia']), '%d').year == ano]
-
-        total_recebimentos = sum(r['valor'] for r in recebimentos_mes)
-        total_gastos = sum(g['valor'] for g in gastos_mes)
-
-        relatorio += f"Total de Recebimentos: R$ {total_recebimentos:.2f}\n"
-        relatorio += f"Total de Gastos: R$ {total_gastos:.2f}\n"
-        relatorio += f"Saldo do Mês: R$ {total_recebimentos - total_gastos:.2f}\n"
-
-        nome_arquivo = f"relatorios/relatorio_mensal_{mes}_{ano}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        self.gerar_relatorio_txt(relatorio, nome_arquivo)
-
-    def relatorio_anual(self, ano):
-        relatorio = f"\n--- Relatório Anual: {ano} ---\n"
-        for mes in range(1, 13):
-            recebimentos_mes = [r for r in self.recebimentos if datetime.strptime(str(r['dia']), '%d').month == mes and datetime.strptime(str(r['dia']), '%d').year == ano]
-            gastos_mes = [g for gastos in self.gastos.values() for g in gastos if datetime.strptime(str(g['dia']), '%d').month == mes and datetime.strptime(str(g['dia']), '%d').year == ano]
-
-            total_recebimentos = sum(r['valor'] for r in recebimentos_mes)
-            total_gastos = sum(g['valor'] for g in gastos_mes)
-
-            relatorio += f"\n--- Mês {mes} ---\n"
-            relatorio += f"Total de Recebimentos: R$ {total_recebimentos:.2f}\n"
-            relatorio += f"Total de Gastos: R$ {total_gastos:.2f}\n"
-            relatorio += f"Saldo do Mês: R$ {total_recebimentos - total_gastos:.2f}\n"
-
-        nome_arquivo = f"relatorios/relatorio_anual_{ano}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        self.gerar_relatorio_txt(relatorio, nome_arquivo)
+            vencimento = f"Vencimento dia {cartao['dia_vencimento']}"
+            yield evento_linha(f"{cartao['nome']}: Limite R$ {cartao['limite']:.2f}, {vencimento}",
+                        cartao['nome'], cartao['limite'], vencimento)
+
+        yield from self._eventos_pendencias()
+
+    def relatorio_completo(self, formato='txt'):
+        return self.gerar_relatorio(self._eventos_completo, "relatorio_completo", formato, chave=('completo',))
+
+    def _eventos_mensal(self, mes, ano):
+        return eventos_mensal(self.agregados, mes, ano)
+
+    def relatorio_mensal(self, mes, ano, formato='txt'):
+        return self.gerar_relatorio(lambda: self._eventos_mensal(mes, ano), f"relatorio_mensal_{mes}_{ano}", formato,
+                                    chave=('mensal', mes, ano))
+
+    def _eventos_anual(self, ano):
+        return eventos_anual(self.agregados, ano)
+
+    def relatorio_anual(self, ano, formato='txt'):
+        return self.gerar_relatorio(lambda: self._eventos_anual(ano), f"relatorio_anual_{ano}", formato,
+                                    chave=('anual', ano))
+
+    def projecao(self, meses=12, recebimento_mensal=None, gasto_mensal=0):
+        # Sem recebimento informado, usa a média dos últimos 3 meses completos
+        if recebimento_mensal is None:
+            recebimento_mensal = media_mensal(self.agregados.recebimentos_por_mes, date.today()) / 100
+        return projetar(self, meses, recebimento_mensal, gasto_mensal)
+
+    def _eventos_projecao(self, projecao):
+        yield ('titulo', f"Projeção de Saldo: {len(projecao['meses'])} meses")
+        yield evento_linha(f"Saldo Atual: R$ {self.saldo:.2f}", "Saldo Atual", self.saldo)
+
+        yield ('secao', "Saldo Projetado por Mês")
+        for i, mes in enumerate(projecao['meses']):
+            saldo = projecao['saldo'][i] / 100
+            detalhe = (f"Recebimentos R$ {projecao['recebimentos'][i] / 100:.2f}, Saídas R$ {projecao['saidas'][i] / 100:.2f} "
+                       f"(Faturas R$ {projecao['faturas'][i] / 100:.2f}, Parcelas R$ {projecao['parcelas'][i] / 100:.2f}, "
+                       f"Financiamentos R$ {projecao['financiamentos'][i] / 100:.2f})")
+            yield evento_linha(f"{mes}: R$ {saldo:.2f} - {detalhe}", mes, saldo, detalhe)
+
+        yield ('secao', "Cartões por Mês")
+        for cartao, valores in projecao['por_cartao'].items():
+            yield ('grupo', cartao)
+            for mes, centavos, vencimento in zip(projecao['meses'], valores.tolist(), projecao['vencimentos'][cartao].tolist()):
+                if centavos:
+                    detalhe = f"vencimento {vencimento:%d/%m/%Y}"
+                    yield evento_linha(f"{mes}: R$ {centavos / 100:.2f} ({detalhe})", mes, centavos / 100, detalhe)
+
+    def _eventos_relatorio_projecao(self, meses=12, recebimento_mensal=None, gasto_mensal=0):
+        return self._eventos_projecao(self.projecao(meses, recebimento_mensal, gasto_mensal))
+
+    def relatorio_projecao(self, meses=12, recebimento_mensal=None, gasto_mensal=0, formato='txt'):
+        # A projeção parte do mês atual, então a data também faz parte da chave
+        return self.gerar_relatorio(lambda: self._eventos_relatorio_projecao(meses, recebimento_mensal, gasto_mensal),
+                                    f"projecao_{meses}_meses", formato,
+                                    chave=('projecao', meses, recebimento_mensal, gasto_mensal, date.today()))
+
+    def _eventos_simulacao(self, meses, projecao, simulacao):
+        yield ('titulo', f"Simulação de Investimentos: {meses} meses")
+
+        yield ('secao', "Projeção pelo Rendimento Cadastrado")
+        for investimento, valores in zip(self.investimentos, projecao['por_investimento']):
+            item = f"{investimento['produto']} ({investimento['banco']})"
+            yield evento_linha(f"{item}: R$ {valores[0]:.2f} -> R$ {valores[-1]:.2f}", item, float(valores[-1]))
+        yield evento_linha(f"Total: R$ {projecao['total'][-1]:.2f}", "Total", float(projecao['total'][-1]))
+
+        rotulos = [f"P{p}" for p in simulacao['percentis']]
+        yield ('secao', f"Total em {simulacao['cenarios']} Cenários")
+        for mes in range(1, meses + 1):
+            faixas = ', '.join(f"{rotulo} R$ {valor:.2f}" for rotulo, valor in zip(rotulos, simulacao['total'][:, mes]))
+            yield evento_linha(f"Mês {mes}: {faixas}", f"Mês {mes}", float(simulacao['total'][len(rotulos) // 2, mes]), faixas)
+
+        yield ('secao', "Valor Final por Investimento")
+        for i, investimento in enumerate(self.investimentos):
+            item = f"{investimento['produto']} ({investimento['banco']})"
+            faixas = ', '.join(f"{rotulo} R$ {valor:.2f}" for rotulo, valor in zip(rotulos, simulacao['por_investimento'][:, i]))
+            yield evento_linha(f"{item}: {faixas}", item, float(simulacao['por_investimento'][len(rotulos) // 2, i]), faixas)
+
+    def relatorio_simulacao(self, meses, cenarios=10000, desvio_mensal=0.2, processos=1, formato='txt'):
+        # Projeção dos investimentos pelo rendimento cadastrado e faixas de valores
+        # (percentis) em cenários com taxas mensais variando em torno dele
+        if not self.investimentos:
+            print("Nenhum investimento cadastrado.")
+            return None
+        # Conferidos antes de abrir o arquivo do relatório
+        if meses < 1:
+            print("O número de meses deve ser pelo menos 1.")
+            return None
+        if cenarios < 1:
+            print("O número de cenários deve ser pelo menos 1.")
+            return None
+        projecao = projetar_investimentos(self.investimentos, meses)
+        simulacao = simular_investimentos(self.investimentos, meses, cenarios, desvio_mensal, processos=processos)
+        return self.gerar_relatorio(lambda: self._eventos_simulacao(meses, projecao, simulacao),
+                                    f"simulacao_investimentos_{meses}_meses", formato)
 
     def adicionar_categoria(self, categoria):
         if categoria in self.categorias:
@@ -455,34 +1354,40 @@ class FinancasPessoais:
         else:
             self.categorias.add(categoria)
             print(f"Categoria '{categoria}' adicionada com sucesso!")
-            self.salvar_dados()
+            self._marcar('Categorias', categoria)
+            self._concluir('categoria', categoria)
 
     def adicionar_investimento(self, valor, produto, banco, rendimento_mensal):
-        investimento_existente = next((inv for inv in self.investimentos if inv['produto'] == produto and inv['banco'] == banco), None)
-        if investimento_existente:
+        indice = next((i for i, inv in enumerate(self.investimentos) if inv['produto'] == produto and inv['banco'] == banco), None)
+        if indice is not None:
+            investimento_existente = self.investimentos[indice]
             print(f"Investimento no produto '{produto}' do banco '{banco}' já existe.")
             opcao = input("Deseja adicionar um valor a este investimento? (s/n): ").lower()
             if opcao == 's':
-                investimento_existente['valor'] += valor
+                investimento_existente['valor'] = para_reais(para_centavos(investimento_existente['valor']) + para_centavos(valor))
+                self._marcar('Investimentos', indice)
                 print(f"Valor adicionado ao investimento existente. Novo valor: R$ {investimento_existente['valor']:.2f}")
             else:
                 print("Nenhum valor adicionado.")
         else:
             self.investimentos.append({
-                'valor': valor,
+                'valor': arredondar(valor),
                 'produto': produto,
                 'banco': banco,
                 'rendimento_mensal': rendimento_mensal
             })
+            self._marcar_novo('Investimentos')
             print(f"Novo investimento cadastrado: {produto} no banco {banco}.")
-        self.salvar_dados()
+        self._concluir('investimento', produto)
 
     def adicionar_rendimento_investimento(self, produto, banco, rendimento):
-        investimento = next((inv for inv in self.investimentos if inv['produto'] == produto and inv['banco'] == banco), None)
-        if investimento:
-            investimento['valor'] += rendimento
+        indice = next((i for i, inv in enumerate(self.investimentos) if inv['produto'] == produto and inv['banco'] == banco), None)
+        if indice is not None:
+            investimento = self.investimentos[indice]
+            investimento['valor'] = para_reais(para_centavos(investimento['valor']) + para_centavos(rendimento))
+            self._marcar('Investimentos', indice)
             print(f"Rendimento de R$ {rendimento:.2f} adicionado ao investimento {produto} no banco {banco}.")
-            self.salvar_dados()
+            self._concluir('rendimento', produto)
         else:
             print(f"Investimento no produto '{produto}' do banco '{banco}' não encontrado.")
 
@@ -503,94 +1408,339 @@ def exibir_menu():
     print("12. Gerar Relatório Anual")
     print("13. Adicionar Investimento")
     print("14. Adicionar Rendimento de Investimento")
-    print("15. Sair")
+    print("15. Verificar Totais")
+    print("16. Importar Extrato (CSV/OFX)")
+    print("17. Projeção de Saldo")
+    print("18. Simular Investimentos")
+    print("19. Sair")
     return input("Escolha uma opção: ")
 
-# Exemplo de uso
-financas = FinancasPessoais()
-
-while True:
-    opcao = exibir_menu()
-
-    if opcao == '1':
-        valor = financas.solicitar_valor("Valor recebido: R$ ")
-        dia = int(input("Dia do recebimento (1-31): "))
-        descricao = input("Descrição do recebimento: ")
-        financas.adicionar_recebimento(valor, dia, descricao)
-
-    elif opcao == '2':
-        valor = financas.solicitar_valor("Valor gasto: R$ ")
-        categoria = input("Categoria do gasto: ")
-        descricao = input("Descrição do gasto: ")
-        tipo = input("Tipo (débito/crédito): ").lower()
-        cartao = None
-        parcelado = False
-        parcelas = 1
-        if tipo == 'crédito':
-            cartao = input("Nome do cartão: ")
-            parcelado = input("Parcelado? (s/n): ").lower() == 's'
-            if parcelado:
-                parcelas = int(input("Número de parcelas: "))
-        financas.adicionar_gasto(valor, categoria, descricao, tipo, cartao, parcelado, parcelas)
-
-    elif opcao == '3':
-        valor_total = financas.solicitar_valor("Valor total do financiamento: R$ ")
-        parcelas = int(input("Número de parcelas: "))
-        descricao = input("Descrição do financiamento: ")
-        financas.adicionar_financiamento(valor_total, parcelas, descricao)
-
-    elif opcao == '4':
-        descricao = input("Descrição do financiamento: ")
-        financas.pagar_parcela_financiamento(descricao)
-
-    elif opcao == '5':
-        nome = input("Nome do cartão: ")
-        limite = financas.solicitar_valor("Limite do cartão: R$ ")
-        dia_vencimento = int(input("Dia de vencimento da fatura: "))
-        financas.cadastrar_cartao(nome, limite, dia_vencimento)
-
-    elif opcao == '6':
-        cartao = input("Nome do cartão: ")
-        financas.pagar_fatura(cartao)
-
-    elif opcao == '7':
-        financas.pagar_parcela_antecipada()
-
-    elif opcao == '8':
-        financas.estatisticas_mes()
-
-    elif opcao == '9':
-        financas.relatorio_completo()
-
-    elif opcao == '10':
-        categoria = input("Nome da nova categoria: ")
-        financas.adicionar_categoria(categoria)
-
-    elif opcao == '11':
-        mes = int(input("Mês (1-12): "))
-        ano = int(input("Ano: "))
-        financas.relatorio_mensal(mes, ano)
-
-    elif opcao == '12':
-        ano = int(input("Ano: "))
-        financas.relatorio_anual(ano)
-
-    elif opcao == '13':
-        valor = financas.solicitar_valor("Valor do investimento: R$ ")
-        produto = input("Produto do investimento: ")
-        banco = input("Banco: ")
-        rendimento_mensal = financas.solicitar_valor("Rendimento mensal (%): ")
-        financas.adicionar_investimento(valor, produto, banco, rendimento_mensal)
-
-    elif opcao == '14':
-        produto = input("Produto do investimento: ")
-        banco = input("Banco: ")
-        rendimento = financas.solicitar_valor("Valor do rendimento: R$ ")
-        financas.adicionar_rendimento_investimento(produto, banco, rendimento)
-
-    elif opcao == '15':
-        print("Saindo do sistema...")
-        break
+def solicitar_formato():
+    formato = input(f"Formato ({'/'.join(FORMATOS)}, Enter para txt): ").strip().lower() or 'txt'
+    if formato not in FORMATOS:
+        print("Formato desconhecido. Usando txt.")
+        return 'txt'
+    return formato
 
+# Linha de comando: python main.py <comando> [argumentos]
+def _data_argumento(texto):
+    for formato in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"data inválida: {texto} (use dd/mm/aaaa ou aaaa-mm-dd)")
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog='financas', description="Sistema de Finanças Pessoais sem o menu interativo.")
+    parser.add_argument('--arquivo', default='financas.xlsx', help="arquivo de dados (.xlsx ou .db)")
+    parser.add_argument('--estatisticas', action='store_true',
+                        help="mostra tempo, chamadas e linhas de cada operação ao final")
+    parser.add_argument('--perfil', metavar='ARQUIVO', help="executa o comando sob o cProfile e grava o perfil")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    comando = comandos.add_parser('init', help="cria o arquivo de dados")
+    comando.add_argument('saldo_inicial', type=float)
+
+    comandos.add_parser('saldo', help="mostra o saldo atual")
+
+    comando = comandos.add_parser('add-recebimento', help="registra um recebimento")
+    comando.add_argument('valor', type=float)
+    comando.add_argument('descricao')
+    comando.add_argument('--data', type=_data_argumento, default=date.today())
+
+    comando = comandos.add_parser('add-gasto', help="registra um gasto")
+    comando.add_argument('valor', type=float)
+    comando.add_argument('categoria')
+    comando.add_argument('descricao')
+    comando.add_argument('--tipo', choices=('débito', 'crédito'), default='débito')
+    comando.add_argument('--cartao')
+    comando.add_argument('--parcelas', type=int, default=1)
+    comando.add_argument('--data', type=_data_argumento, default=date.today())
+
+    comando = comandos.add_parser('report', help="gera um relatório")
+    comando.add_argument('tipo', choices=('estatisticas', 'completo', 'mensal', 'anual', 'projecao'))
+    comando.add_argument('periodo', nargs='?', help="aaaa-mm (mensal), aaaa (anual) ou meses (projecao)")
+    comando.add_argument('--formato', choices=list(FORMATOS), default='txt')
+
+    comando = comandos.add_parser('import', help="importa um extrato CSV/OFX")
+    comando.add_argument('extrato')
+    comando.add_argument('--cartao')
+    comando.add_argument('--regras', help="arquivo de regras de categoria")
+
+    comando = comandos.add_parser('verificar', help="confere os totais com os lançamentos")
+    comando.add_argument('--corrigir', action='store_true')
+
+    comando = comandos.add_parser('buscar', help="busca gastos, recebimentos ou parcelas (CSV na saída)")
+    comando.add_argument('texto', nargs='?', help="palavras (ou inícios de palavras) da descrição")
+    comando.add_argument('--entidade', choices=ENTIDADES_BUSCA, default='gastos')
+    comando.add_argument('--categoria')
+    comando.add_argument('--cartao')
+    comando.add_argument('--tipo', choices=('débito', 'crédito'))
+    comando.add_argument('--valor-minimo', type=float)
+    comando.add_argument('--valor-maximo', type=float)
+    comando.add_argument('--de', type=_data_argumento, help="data inicial")
+    comando.add_argument('--ate', type=_data_argumento, help="data final")
+    comando.add_argument('--limite', type=int)
+
+    comando = comandos.add_parser('historico', help="saldo, limites e investimentos numa data")
+    comando.add_argument('data', type=_data_argumento, nargs='?', default=date.today())
+    return parser
+
+
+def ler_agregados(arquivo):
+    # Totais gravados (e do diário), sem carregar os registros; None em arquivos
+    # de versão anterior, que não guardam os totais
+    armazenamento = abrir_armazenamento(arquivo)
+    try:
+        meta = armazenamento.carregar_meta()
+    finally:
+        armazenamento.fechar()
+    if not armazenamento.incremental:
+        registros = DiarioTransacoes(caminho_diario(arquivo)).ler()
+        if registros and registros[-1]['seq'] > int(meta.get('seq_diario', 0)):
+            meta = registros[-1]['meta']
+    return Agregados.de_meta(meta)
+
+
+def ler_saldo(arquivo):
+    # Saldo lido só dos totais gravados (e do diário), sem carregar os registros
+    agregados = ler_agregados(arquivo)
+    return agregados.saldo / 100 if agregados else None
+
+
+def executar_comando(argumentos):
+    args = criar_parser().parse_args(argumentos)
+    existe = abrir_armazenamento(args.arquivo).existe()
+    if args.comando == 'init':
+        if existe:
+            print(f"O arquivo {args.arquivo} já existe.")
+            return 1
+        FinancasPessoais(args.arquivo, saldo_inicial=args.saldo_inicial).fechar()
+        return 0
+    if not existe:
+        print(f"Arquivo {args.arquivo} não encontrado. Crie-o com o comando 'init' ou pelo menu interativo.")
+        return 1
+
+    if args.comando == 'saldo':
+        saldo = ler_saldo(args.arquivo)
+        if saldo is None:
+            # Arquivo de versão anterior, sem os totais gravados
+            saldo = FinancasPessoais(args.arquivo).saldo
+        print(f"Saldo Atual: R$ {saldo:.2f}")
+        return 0
+
+    # Na busca a saída padrão é só o CSV: as mensagens da abertura e do
+    # fechamento (ex.: alterações recuperadas do diário) vão para o stderr
+    saida = sys.stdout
+    with redirect_stdout(sys.stderr) if args.comando == 'buscar' else nullcontext():
+        financas = FinancasPessoais(args.arquivo, diario=True, instrumentar=args.estatisticas)
+        try:
+            if args.perfil:
+                codigo, perfil = instrumentacao.perfilar(_executar_operacao, financas, args, saida,
+                                                         arquivo=args.perfil)
+                print(perfil, file=sys.stderr)
+            else:
+                codigo = _executar_operacao(financas, args, saida)
+        finally:
+            financas.fechar(compactar=False)
+            if financas.estatisticas:
+                print(financas.estatisticas.resumo(), file=sys.stderr)
+    return codigo
+
+
+def _executar_operacao(financas, args, saida):
+    # Comandos que alteram ou leem o arquivo carregado; retorna o código de saída.
+    # Só a busca escreve em `saida`, a saída padrão original.
+    versao = financas.versao
+    if args.comando == 'add-recebimento':
+        financas.adicionar_recebimento(args.valor, args.data.day, args.descricao, args.data)
+    elif args.comando == 'add-gasto':
+        financas.adicionar_gasto(args.valor, args.categoria, args.descricao, args.tipo, args.cartao,
+                                 args.parcelas > 1, args.parcelas, args.data)
+    elif args.comando == 'import':
+        regras = carregar_regras(args.regras) if args.regras else []
+        if financas.importar_extrato(args.extrato, args.cartao, regras) is None:
+            return 1
+    if args.comando in ('add-recebimento', 'add-gasto', 'import'):
+        # Nada mudou, como no servidor: operação recusada (saldo ou limite
+        # insuficiente, cartão inexistente...) ou extrato sem lançamentos novos.
+        # A mensagem já foi exibida.
+        return 0 if financas.versao != versao else 1
+
+    if args.comando == 'verificar':
+        if financas.verificar_agregados(corrigir=args.corrigir) and not args.corrigir:
+            return 1
+    elif args.comando == 'buscar':
+        try:
+            registros = financas.buscar(args.entidade, args.texto, args.categoria, args.cartao, args.tipo,
+                                        args.valor_minimo, args.valor_maximo, args.de, args.ate, args.limite)
+        except ValueError as e:
+            print(f"Busca inválida: {e}")
+            return 1
+        escritor = csv.writer(saida, delimiter=';')
+        escritor.writerow(getattr(financas, args.entidade).tipos)
+        escritor.writerows(registro.values() for registro in registros)
+        print(f"{len(registros)} registros encontrados.", file=sys.stderr)
+    elif args.comando == 'historico':
+        estado = financas.estado_em(args.data)
+        if estado is None:
+            print(f"O histórico não tem registros até {args.data:%d/%m/%Y}.")
+            return 1
+        print(f"Saldo em {args.data:%d/%m/%Y}: R$ {estado['saldo']:.2f}")
+        for nome, limite in estado['cartoes'].items():
+            print(f"Limite do cartão {nome}: R$ {limite:.2f}")
+        for investimento in estado['investimentos']:
+            print(f"{investimento['produto']} ({investimento['banco']}): R$ {investimento['valor']:.2f}")
+        for descricao, pago in estado['financiamentos'].items():
+            print(f"Financiamento {descricao}: R$ {pago:.2f} pagos")
+    elif args.tipo in ('estatisticas', 'completo'):
+        getattr(financas, 'estatisticas_mes' if args.tipo == 'estatisticas' else 'relatorio_completo')(args.formato)
+    elif args.periodo is None and args.tipo != 'projecao':
+        print(f"Informe o período do relatório {args.tipo}.")
+        return 1
     else:
-        print("Opção inválida. Tente novamente.")
+        try:
+            if args.tipo == 'projecao':
+                meses = int(args.periodo or 12)
+            elif args.tipo == 'mensal':
+                periodo = datetime.strptime(args.periodo, '%Y-%m')
+            else:
+                ano = int(args.periodo)
+        except ValueError:
+            print(f"Período inválido para o relatório {args.tipo}: {args.periodo} "
+                  "(use aaaa-mm no mensal, aaaa no anual e meses na projeção).")
+            return 1
+        if args.tipo == 'projecao':
+            financas.relatorio_projecao(meses, formato=args.formato)
+        elif args.tipo == 'mensal':
+            financas.relatorio_mensal(periodo.month, periodo.year, args.formato)
+        else:
+            financas.relatorio_anual(ano, args.formato)
+    return 0
+
+
+def executar_menu():
+    financas = FinancasPessoais(diario=True, segundo_plano=True)
+
+    while True:
+        opcao = exibir_menu()
+
+        if opcao == '1':
+            valor = financas.solicitar_valor("Valor recebido: R$ ")
+            data = financas.solicitar_data("Data do recebimento (dd/mm/aaaa, Enter para hoje): ")
+            descricao = input("Descrição do recebimento: ")
+            financas.adicionar_recebimento(valor, data.day, descricao, data)
+
+        elif opcao == '2':
+            valor = financas.solicitar_valor("Valor gasto: R$ ")
+            categoria = input("Categoria do gasto: ")
+            descricao = input("Descrição do gasto: ")
+            tipo = input("Tipo (débito/crédito): ").lower()
+            cartao = None
+            parcelado = False
+            parcelas = 1
+            if tipo == 'crédito':
+                cartao = input("Nome do cartão: ")
+                parcelado = input("Parcelado? (s/n): ").lower() == 's'
+                if parcelado:
+                    parcelas = int(input("Número de parcelas: "))
+            data = financas.solicitar_data("Data do gasto (dd/mm/aaaa, Enter para hoje): ")
+            financas.adicionar_gasto(valor, categoria, descricao, tipo, cartao, parcelado, parcelas, data)
+
+        elif opcao == '3':
+            valor_total = financas.solicitar_valor("Valor total do financiamento: R$ ")
+            parcelas = int(input("Número de parcelas: "))
+            descricao = input("Descrição do financiamento: ")
+            financas.adicionar_financiamento(valor_total, parcelas, descricao)
+
+        elif opcao == '4':
+            descricao = input("Descrição do financiamento: ")
+            financas.pagar_parcela_financiamento(descricao)
+
+        elif opcao == '5':
+            nome = input("Nome do cartão: ")
+            limite = financas.solicitar_valor("Limite do cartão: R$ ")
+            dia_vencimento = int(input("Dia de vencimento da fatura: "))
+            financas.cadastrar_cartao(nome, limite, dia_vencimento)
+
+        elif opcao == '6':
+            cartao = input("Nome do cartão: ")
+            financas.pagar_fatura(cartao)
+
+        elif opcao == '7':
+            financas.pagar_parcela_antecipada()
+
+        elif opcao == '8':
+            financas.estatisticas_mes(solicitar_formato())
+
+        elif opcao == '9':
+            financas.relatorio_completo(solicitar_formato())
+
+        elif opcao == '10':
+            categoria = input("Nome da nova categoria: ")
+            financas.adicionar_categoria(categoria)
+
+        elif opcao == '11':
+            mes = int(input("Mês (1-12): "))
+            ano = int(input("Ano: "))
+            financas.relatorio_mensal(mes, ano, solicitar_formato())
+
+        elif opcao == '12':
+            ano = int(input("Ano: "))
+            financas.relatorio_anual(ano, solicitar_formato())
+
+        elif opcao == '13':
+            valor = financas.solicitar_valor("Valor do investimento: R$ ")
+            produto = input("Produto do investimento: ")
+            banco = input("Banco: ")
+            rendimento_mensal = financas.solicitar_taxa("Rendimento mensal (%): ")
+            financas.adicionar_investimento(valor, produto, banco, rendimento_mensal)
+
+        elif opcao == '14':
+            produto = input("Produto do investimento: ")
+            banco = input("Banco: ")
+            rendimento = financas.solicitar_valor("Valor do rendimento: R$ ")
+            financas.adicionar_rendimento_investimento(produto, banco, rendimento)
+
+        elif opcao == '15':
+            divergencias = financas.verificar_agregados()
+            if divergencias and input("Corrigir os totais a partir dos lançamentos? (s/n): ").lower() == 's':
+                financas.verificar_agregados(corrigir=True)
+
+        elif opcao == '16':
+            caminho = input("Arquivo do extrato (.csv ou .ofx): ")
+            cartao = input("Cartão do extrato (Enter se for conta corrente): ") or None
+            arquivo_regras = input("Arquivo de regras de categoria (Enter para nenhum): ")
+            regras = carregar_regras(arquivo_regras) if arquivo_regras else []
+            financas.importar_extrato(caminho, cartao, regras)
+
+        elif opcao == '17':
+            meses = int(input("Número de meses: "))
+            recebimento = input("Recebimento mensal esperado (Enter para a média dos últimos 3 meses): R$ ")
+            recebimento_mensal = para_reais(ler_centavos(recebimento)) if recebimento.strip() else None
+            financas.relatorio_projecao(meses, recebimento_mensal, formato=solicitar_formato())
+
+        elif opcao == '18':
+            meses = int(input("Número de meses: "))
+            cenarios = int(input("Número de cenários (Enter para 10000): ") or 10000)
+            desvio = input("Variação mensal do rendimento, em pontos percentuais (Enter para 0.2): ")
+            desvio_mensal = float(desvio.replace(',', '.')) if desvio.strip() else 0.2
+            # Muitos cenários são divididos entre os processadores
+            processos = (os.cpu_count() or 1) if cenarios >= 100000 else 1
+            financas.relatorio_simulacao(meses, cenarios, desvio_mensal, processos, solicitar_formato())
+
+        elif opcao == '19':
+            print("Saindo do sistema...")
+            financas.fechar()
+            break
+
+        else:
+            print("Opção inválida. Tente novamente.")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sys.exit(executar_comando(sys.argv[1:]))
+    executar_menu()
@@ -0,0 +1,112 @@
+from datetime import date
+
+import numpy as np
+
+from dinheiro import para_centavos
+
+
+def meses_a_partir(hoje, quantidade):
+    # Meses (datetime64[M]) a partir do mês de `hoje`
+    return np.datetime64(hoje, 'M') + np.arange(quantidade)
+
+
+def vencimentos(dias_vencimento, hoje, quantidade):
+    # Data de vencimento de cada cartão em cada mês (cartões × meses) e o índice
+    # do mês do primeiro vencimento ainda não ocorrido (0 = mês atual, 1 = próximo)
+    dias = np.asarray(dias_vencimento, dtype=np.int64).reshape(-1, 1)
+    primeiro = (hoje.day > dias[:, 0]).astype(np.int64)
+    meses = meses_a_partir(hoje, quantidade)
+    inicio_mes = meses.astype('datetime64[D]')
+    dias_no_mes = ((meses + 1).astype('datetime64[D]') - inicio_mes).astype(np.int64)
+    return inicio_mes + (np.minimum(dias, dias_no_mes) - 1), primeiro
+
+
+def media_mensal(por_mes, hoje, quantidade=3):
+    # Média, em centavos, dos `quantidade` meses completos anteriores a `hoje`
+    meses = np.datetime64(hoje, 'M') - np.arange(1, quantidade + 1)
+    return int(round(sum(por_mes.get(str(mes), 0) for mes in meses) / quantidade))
+
+
+def _posicoes_cartao(tabela, cartoes):
+    # Código do cartão na tabela -> posição em `cartoes` (-1 se não cadastrado)
+    posicoes = {cartao['nome']: i for i, cartao in enumerate(cartoes)}
+    return np.array([posicoes.get(rotulo, -1) for rotulo in tabela.rotulos('cartao')] + [-1], dtype=np.int64)
+
+
+def _faturas_por_mes(faturas, cartoes, primeiro, meses):
+    # Faturas não pagas vencem no próximo vencimento do cartão
+    abertas = ~faturas.coluna('pago')
+    posicoes = _posicoes_cartao(faturas, cartoes)[faturas.coluna('cartao')[abertas]]
+    return _por_cartao_e_mes(posicoes, primeiro[posicoes], faturas.coluna('valor')[abertas], len(cartoes), meses)
+
+
+def _parcelas_por_mes(parcelas, cartoes, primeiro, meses):
+    # Parcelas não pagas vencem uma por mês: dentro de cada compra (cartão,
+    # descrição e número de parcelas), a de menor número vence no primeiro
+    # vencimento do cartão e as seguintes nos meses subsequentes
+    abertas = ~parcelas.coluna('pago')
+    if not abertas.any():
+        return np.zeros((len(cartoes), meses), dtype=np.int64)
+    posicoes = _posicoes_cartao(parcelas, cartoes)[parcelas.coluna('cartao')[abertas]]
+    numero = parcelas.coluna('parcela_atual')[abertas].astype(np.int64)
+    chaves = np.stack([parcelas.coluna('cartao')[abertas], parcelas.coluna('descricao')[abertas],
+                       parcelas.coluna('parcelas_total')[abertas]], axis=1)
+    _, compras = np.unique(chaves, axis=0, return_inverse=True)
+    compras = compras.reshape(-1)
+    menor = np.full(compras.max() + 1, np.iinfo(np.int64).max)
+    np.minimum.at(menor, compras, numero)
+    return _por_cartao_e_mes(posicoes, primeiro[posicoes] + numero - menor[compras],
+                             parcelas.coluna('valor')[abertas], len(cartoes), meses)
+
+
+def _por_cartao_e_mes(cartoes, mes, valores, quantidade_cartoes, meses):
+    # Soma os valores numa matriz cartões × meses, ignorando o que vence depois do horizonte
+    dentro = (cartoes >= 0) & (mes < meses)
+    posicoes = cartoes[dentro] * meses + mes[dentro]
+    totais = np.bincount(posicoes, weights=valores[dentro], minlength=quantidade_cartoes * meses)
+    return totais.round().astype(np.int64).reshape(quantidade_cartoes, meses)
+
+
+def _financiamentos_por_mes(financiamentos, meses):
+    # Parcelas nominais restantes de cada financiamento, a partir do mês atual.
+    # Usa a mesma divisão exata dos agregados (resto na última parcela), para que
+    # o total projetado feche com o valor nominal do financiamento.
+    if not financiamentos:
+        return np.zeros(meses, dtype=np.int64)
+    total = np.array([para_centavos(f['valor_total']) for f in financiamentos], dtype=np.int64)[:, None]
+    parcelas = np.array([f['parcelas'] for f in financiamentos], dtype=np.int64)[:, None]
+    pagas = np.array([f['parcelas_pagas'] for f in financiamentos], dtype=np.int64)[:, None]
+    acumuladas = np.minimum(pagas + np.arange(meses + 1), parcelas)
+    pago = np.where(acumuladas >= parcelas, total, total // parcelas * acumuladas)
+    return np.diff(pago, axis=1).sum(axis=0)
+
+
+def projetar(financas, meses=12, recebimento_mensal=0, gasto_mensal=0, hoje=None):
+    # Projeção mês a mês (em centavos) do que vence e do saldo resultante.
+    # O índice 0 é o mês atual; recebimento_mensal e gasto_mensal (em reais)
+    # são valores recorrentes esperados em todos os meses.
+    hoje = hoje or date.today()
+    cartoes = financas.cartoes
+    datas, primeiro = vencimentos([c['dia_vencimento'] for c in cartoes], hoje, meses)
+    primeiro = np.append(primeiro, 0)  # A posição -1 (cartão não cadastrado) cai neste 0
+
+    faturas = _faturas_por_mes(financas.faturas, cartoes, primeiro, meses)
+    parcelas = _parcelas_por_mes(financas.parcelas, cartoes, primeiro, meses)
+    por_cartao = faturas + parcelas
+
+    financiamentos = _financiamentos_por_mes(financas.financiamentos, meses)
+    recebimentos = np.full(meses, para_centavos(recebimento_mensal), dtype=np.int64)
+    saidas = por_cartao.sum(axis=0) + financiamentos + para_centavos(gasto_mensal)
+    saldo = financas.agregados.saldo + np.cumsum(recebimentos - saidas)
+
+    return {
+        'meses': [str(mes) for mes in meses_a_partir(hoje, meses)],
+        'faturas': faturas.sum(axis=0),
+        'parcelas': parcelas.sum(axis=0),
+        'financiamentos': financiamentos,
+        'recebimentos': recebimentos,
+        'saidas': saidas,
+        'saldo': saldo,
+        'por_cartao': {cartao['nome']: por_cartao[i] for i, cartao in enumerate(cartoes)},
+        'vencimentos': {cartao['nome']: datas[i] for i, cartao in enumerate(cartoes)},
+    }
@@ -0,0 +1,235 @@
+import csv
+import io
+import json
+import threading
+from collections import OrderedDict
+
+# Os relatórios são gerados como uma sequência de eventos, consumida por um
+# escritor que grava cada um assim que chega, sem montar o documento em memória:
+#   ('titulo', texto)          título do relatório ou de um bloco (ex.: mês)
+#   ('secao', texto)           seção (ex.: "Gastos por Categoria")
+#   ('grupo', texto)           subdivisão da seção (ex.: uma categoria)
+#   ('linha', texto, campos)   texto pronto e campos {'item', 'valor', 'detalhe'}
+
+CAMPOS = ('secao', 'grupo', 'item', 'valor', 'detalhe')
+
+TAMANHO_BUFFER = 1 << 16
+
+
+def evento_linha(texto, item, valor=None, detalhe=None):
+    return ('linha', texto, {'item': item, 'valor': valor, 'detalhe': detalhe})
+
+
+class EscritorTexto:
+    extensao = 'txt'
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.recuo = ''
+
+    def evento(self, evento):
+        tipo, texto = evento[0], evento[1]
+        if tipo == 'titulo':
+            self.recuo = ''
+            self.arquivo.write(f"\n--- {texto} ---\n")
+        elif tipo == 'secao':
+            self.recuo = ''
+            self.arquivo.write(f"\n{texto}:\n")
+        elif tipo == 'grupo':
+            self.recuo = '  '
+            self.arquivo.write(f"\n{texto}:\n")
+        else:
+            self.arquivo.write(f"{self.recuo}{texto}\n")
+
+    def finalizar(self):
+        pass
+
+
+class EscritorMarkdown:
+    extensao = 'md'
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.nivel = 0  # Nível do último título
+        self.em_lista = False  # Uma lista precisa de linha em branco antes do próximo título
+
+    def evento(self, evento):
+        tipo, texto = evento[0], evento[1]
+        if tipo == 'linha':
+            self.arquivo.write(f"- {texto}\n")
+            self.em_lista = True
+            return
+        if tipo == 'titulo':
+            self.nivel = 1 if self.nivel == 0 else 2
+            marcador = '#' * self.nivel
+        else:
+            marcador = '#' * (self.nivel + (1 if tipo == 'secao' else 2))
+        separador = '\n' if self.em_lista else ''
+        self.arquivo.write(f"{separador}{marcador} {texto}\n\n")
+        self.em_lista = False
+
+    def finalizar(self):
+        pass
+
+
+class _EscritorTabular:
+    # Base dos formatos com uma linha de dados por evento 'linha'
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.titulo = None
+        self.secao = None
+        self.grupo = None
+
+    def evento(self, evento):
+        tipo = evento[0]
+        if tipo == 'titulo' and self.titulo is None:
+            self.titulo = evento[1]
+            self.iniciar()
+        elif tipo in ('titulo', 'secao'):
+            self.secao, self.grupo = evento[1], None
+        elif tipo == 'grupo':
+            self.grupo = evento[1]
+        else:
+            self.registro(dict(evento[2], secao=self.secao, grupo=self.grupo))
+
+    def iniciar(self):
+        pass
+
+    def finalizar(self):
+        pass
+
+
+class EscritorCSV(_EscritorTabular):
+    extensao = 'csv'
+
+    def iniciar(self):
+        self.escritor = csv.DictWriter(self.arquivo, fieldnames=CAMPOS, delimiter=';')
+        self.escritor.writeheader()
+
+    def registro(self, registro):
+        self.escritor.writerow(registro)
+
+
+class EscritorJSON(_EscritorTabular):
+    extensao = 'json'
+
+    def __init__(self, arquivo):
+        super().__init__(arquivo)
+        self.separador = '\n'
+
+    def iniciar(self):
+        self.arquivo.write(f'{{"relatorio": {json.dumps(self.titulo, ensure_ascii=False)}, "linhas": [')
+
+    def registro(self, registro):
+        self.arquivo.write(self.separador + json.dumps({campo: registro[campo] for campo in CAMPOS}, ensure_ascii=False))
+        self.separador = ',\n'
+
+    def finalizar(self):
+        self.arquivo.write('\n]}\n')
+
+
+FORMATOS = {escritor.extensao: escritor for escritor in (EscritorTexto, EscritorCSV, EscritorJSON, EscritorMarkdown)}
+
+
+def escrever_relatorio(eventos, destino, formato='txt'):
+    # Grava os eventos em `destino` (caminho ou objeto com write) no formato pedido
+    escritor_classe = FORMATOS[formato]
+    if hasattr(destino, 'write'):
+        escritor = escritor_classe(destino)
+        for evento in eventos:
+            escritor.evento(evento)
+        escritor.finalizar()
+        return
+    with open(destino, 'w', encoding='utf-8', newline='', buffering=TAMANHO_BUFFER) as arquivo:
+        escrever_relatorio(eventos, arquivo, formato)
+
+
+def renderizar(eventos, formato='txt'):
+    # Relatório completo como texto
+    saida = io.StringIO()
+    escrever_relatorio(eventos, saida, formato)
+    return saida.getvalue()
+
+
+class _CopiaLimitada:
+    # Repassa o texto ao arquivo e guarda uma cópia enquanto ela couber em `limite`
+    # caracteres; acima disso a cópia é descartada e o relatório só vai para o arquivo
+    def __init__(self, arquivo, limite):
+        self.arquivo = arquivo
+        self.limite = limite
+        self.partes = []
+        self.tamanho = 0
+
+    def write(self, texto):
+        self.arquivo.write(texto)
+        if self.partes is not None:
+            self.tamanho += len(texto)
+            if self.tamanho <= self.limite:
+                self.partes.append(texto)
+            else:
+                self.partes = None
+        return len(texto)
+
+    def texto(self):
+        return ''.join(self.partes) if self.partes is not None else None
+
+
+class CacheRelatorios:
+    # Textos de relatórios já gerados, por (relatório e parâmetros, formato),
+    # válidos enquanto a versão dos dados for a mesma: ao mudar a versão, o
+    # cache é esvaziado. LRU limitado em quantidade e em tamanho total.
+    def __init__(self, maximo=32, limite=1 << 25):
+        self.maximo = maximo
+        self.limite = limite  # Caracteres somados de todos os textos
+        self.acertos = 0
+        self.falhas = 0
+        self._textos = OrderedDict()
+        self._tamanho = 0
+        self._versao = None
+        self._trava = threading.Lock()  # Leituras simultâneas no servidor
+
+    def _consultar(self, chave, versao):
+        with self._trava:
+            if versao != self._versao:
+                self._textos.clear()
+                self._tamanho = 0
+                self._versao = versao
+            texto = self._textos.get(chave)
+            if texto is not None:
+                self._textos.move_to_end(chave)
+                self.acertos += 1
+            else:
+                self.falhas += 1
+            return texto
+
+    def _guardar(self, chave, versao, texto):
+        with self._trava:
+            if versao == self._versao and chave not in self._textos and len(texto) <= self.limite:
+                self._textos[chave] = texto
+                self._tamanho += len(texto)
+                while len(self._textos) > self.maximo or self._tamanho > self.limite:
+                    _, antigo = self._textos.popitem(last=False)
+                    self._tamanho -= len(antigo)
+
+    def obter(self, chave, versao, eventos, formato='txt'):
+        # `eventos` (função sem argumentos) só é chamada se o texto não estiver no cache
+        chave = (chave, formato)
+        texto = self._consultar(chave, versao)
+        if texto is None:
+            texto = renderizar(eventos(), formato)
+            self._guardar(chave, versao, texto)
+        return texto
+
+    def gravar(self, chave, versao, eventos, arquivo, formato='txt'):
+        # Como `obter`, mas escreve em `arquivo` à medida que o relatório é gerado:
+        # relatórios maiores que o limite do cache nunca ficam inteiros na memória
+        chave = (chave, formato)
+        texto = self._consultar(chave, versao)
+        if texto is not None:
+            arquivo.write(texto)
+            return
+        copia = _CopiaLimitada(arquivo, self.limite)
+        escrever_relatorio(eventos(), copia, formato)
+        texto = copia.texto()
+        if texto is not None:
+            self._guardar(chave, versao, texto)
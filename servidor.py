@@ -0,0 +1,472 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from urllib.parse import parse_qs, urlsplit
+
+from armazenamento import abrir_armazenamento
+from main import FinancasPessoais
+from relatorios import FORMATOS
+
+# Servidor HTTP/JSON local com vários ledgers (um arquivo por família):
+#   python servidor.py --diretorio ledgers --porta 8080
+#
+#   POST /ledgers/<nome>                         {"saldo_inicial": 1000}
+#   GET  /ledgers/<nome>                         saldo e resumo
+#   POST /ledgers/<nome>/recebimentos            {"valor", "descricao", "data"}
+#   POST /ledgers/<nome>/gastos                  {"valor", "categoria", "descricao", "tipo", "cartao", "parcelas", "data"}
+#   POST /ledgers/<nome>/financiamentos          {"valor_total", "parcelas", "descricao"}
+#   POST /ledgers/<nome>/cartoes                 {"nome", "limite", "dia_vencimento"}
+#   POST /ledgers/<nome>/faturas/pagar           {"cartao"}
+#   POST /ledgers/<nome>/categorias              {"nome"}
+#   POST /ledgers/<nome>/investimentos           {"valor", "produto", "banco", "rendimento_mensal"}
+#   GET  /ledgers/<nome>/relatorios/<tipo>       ?periodo=...&formato=json|csv|txt|md
+#   GET  /ledgers/<nome>/busca/<entidade>        ?texto=&categoria=&cartao=&tipo=&valor_minimo=&valor_maximo=
+#                                                &data_inicial=&data_final=&limite= (gastos, recebimentos, parcelas)
+#   GET  /ledgers/<nome>/historico               ?data=aaaa-mm-dd (saldo, limites e investimentos na data)
+#   GET  /status
+#
+# Os ledgers usados recentemente ficam carregados (LRU com limite de
+# quantidade e de tempo ocioso). Em cada um, as escritas são exclusivas e as
+# leituras podem ocorrer ao mesmo tempo; as operações rodam num pool de threads
+# para não bloquear os demais ledgers.
+
+NOME_LEDGER = re.compile(r'[A-Za-z0-9_-]{1,64}')
+TAMANHO_MAXIMO_CORPO = 1 << 20
+
+TIPOS_CONTEUDO = {'json': 'application/json', 'csv': 'text/csv', 'txt': 'text/plain', 'md': 'text/markdown'}
+MENSAGENS_STATUS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                    409: 'Conflict', 413: 'Payload Too Large', 422: 'Unprocessable Entity',
+                    500: 'Internal Server Error'}
+
+
+class ErroRequisicao(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class TravaLeituraEscrita:
+    # Várias leituras ao mesmo tempo ou uma escrita; escritas à espera têm
+    # prioridade sobre novas leituras
+    def __init__(self):
+        self._condicao = asyncio.Condition()
+        self._leitores = 0
+        self._escrevendo = False
+        self._escritores_esperando = 0
+
+    @asynccontextmanager
+    async def leitura(self):
+        async with self._condicao:
+            await self._condicao.wait_for(lambda: not self._escrevendo and not self._escritores_esperando)
+            self._leitores += 1
+        try:
+            yield
+        finally:
+            async with self._condicao:
+                self._leitores -= 1
+                self._condicao.notify_all()
+
+    @asynccontextmanager
+    async def escrita(self):
+        async with self._condicao:
+            self._escritores_esperando += 1
+            try:
+                await self._condicao.wait_for(lambda: not self._escrevendo and not self._leitores)
+            finally:
+                self._escritores_esperando -= 1
+            self._escrevendo = True
+        try:
+            yield
+        finally:
+            async with self._condicao:
+                self._escrevendo = False
+                self._condicao.notify_all()
+
+
+class _SaidaPorThread:
+    # Substitui sys.stdout: o que uma operação imprime na thread do pool vai
+    # para as mensagens da resposta; o restante segue para a saída original
+    def __init__(self, original):
+        self.original = original
+        self.local = threading.local()
+
+    def write(self, texto):
+        buffer = getattr(self.local, 'buffer', None)
+        return (self.original if buffer is None else buffer).write(texto)
+
+    def flush(self):
+        self.original.flush()
+
+    def __getattr__(self, nome):
+        return getattr(self.original, nome)
+
+
+class _Ledger:
+    def __init__(self, financas):
+        self.financas = financas
+        self.trava = TravaLeituraEscrita()
+        self.em_uso = 0  # Requisições em andamento
+        self.ultimo_uso = time.monotonic()
+
+
+def _data(dados):
+    return date.fromisoformat(dados['data']) if dados.get('data') else date.today()
+
+
+def _adicionar_recebimento(financas, dados):
+    data = _data(dados)
+    financas.adicionar_recebimento(float(dados['valor']), data.day, dados['descricao'], data)
+
+
+def _adicionar_gasto(financas, dados):
+    tipo = dados.get('tipo', 'débito')
+    if tipo not in ('débito', 'crédito'):
+        raise ValueError("tipo deve ser 'débito' ou 'crédito'")
+    parcelas = int(dados.get('parcelas', 1))
+    financas.adicionar_gasto(float(dados['valor']), dados['categoria'], dados['descricao'], tipo, dados.get('cartao'),
+                             parcelas > 1, parcelas, _data(dados))
+
+
+def _adicionar_financiamento(financas, dados):
+    financas.adicionar_financiamento(float(dados['valor_total']), int(dados['parcelas']), dados['descricao'])
+
+
+def _cadastrar_cartao(financas, dados):
+    financas.cadastrar_cartao(dados['nome'], float(dados['limite']), int(dados['dia_vencimento']))
+
+
+def _pagar_fatura(financas, dados):
+    financas.pagar_fatura(dados['cartao'])
+
+
+def _adicionar_categoria(financas, dados):
+    financas.adicionar_categoria(dados['nome'])
+
+
+def _adicionar_investimento(financas, dados):
+    financas.adicionar_investimento(float(dados['valor']), dados['produto'], dados['banco'],
+                                    float(dados['rendimento_mensal']))
+
+
+ESCRITAS = {
+    ('recebimentos',): _adicionar_recebimento,
+    ('gastos',): _adicionar_gasto,
+    ('financiamentos',): _adicionar_financiamento,
+    ('cartoes',): _cadastrar_cartao,
+    ('faturas', 'pagar'): _pagar_fatura,
+    ('categorias',): _adicionar_categoria,
+    ('investimentos',): _adicionar_investimento,
+}
+
+
+def _definir_relatorio(financas, tipo, periodo):
+    # Chave no cache e gerador de eventos dos mesmos relatórios da linha de comando
+    if tipo == 'estatisticas':
+        return ('estatisticas',), financas._eventos_estatisticas
+    if tipo == 'completo':
+        return ('completo',), financas._eventos_completo
+    if tipo == 'projecao':
+        meses = int(periodo or 12)
+        return (('projecao', meses, None, 0, date.today()),
+                lambda: financas._eventos_relatorio_projecao(meses))
+    if periodo is None:
+        raise ValueError(f"informe o período do relatório {tipo}")
+    if tipo == 'mensal':
+        periodo = datetime.strptime(periodo, '%Y-%m')
+        return ('mensal', periodo.month, periodo.year), lambda: financas._eventos_mensal(periodo.month, periodo.year)
+    if tipo == 'anual':
+        ano = int(periodo)
+        return ('anual', ano), lambda: financas._eventos_anual(ano)
+    raise ErroRequisicao(404, f"Relatório desconhecido: {tipo}")
+
+
+def _relatorio(financas, tipo, periodo, formato):
+    chave, eventos = _definir_relatorio(financas, tipo, periodo)
+    return financas.texto_relatorio(chave, eventos, formato)
+
+
+def _buscar(financas, entidade, parametros):
+    def valor(nome, converter=str):
+        return converter(parametros[nome][0]) if nome in parametros else None
+
+    registros = financas.buscar(entidade, valor('texto'), valor('categoria'), valor('cartao'), valor('tipo'),
+                                valor('valor_minimo', float), valor('valor_maximo', float),
+                                valor('data_inicial', date.fromisoformat), valor('data_final', date.fromisoformat),
+                                valor('limite', int))
+    return {'quantidade': len(registros), 'registros': registros}
+
+
+def _resumo(financas):
+    return {
+        'saldo': financas.saldo,
+        'recebimentos': len(financas.recebimentos),
+        'gastos': len(financas.gastos),
+        'cartoes': [cartao['nome'] for cartao in financas.cartoes],
+        'faturas_pendentes': financas.faturas_pendentes(),
+        'versao': financas.versao,
+    }
+
+
+class Servidor:
+    def __init__(self, diretorio='ledgers', formato='db', capacidade=64, ocioso=300, threads=None):
+        self.diretorio = diretorio
+        self.formato = formato
+        self.capacidade = capacidade  # Ledgers carregados ao mesmo tempo
+        self.ocioso = ocioso  # Segundos sem uso até o ledger ser fechado
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self._ledgers = OrderedDict()  # nome -> _Ledger, do menos para o mais recente
+        self._abrindo = {}  # nome -> tarefa de abertura em andamento
+        self._fechando = {}  # nome -> fechamento em andamento
+        self._saida = None
+
+    def caminho(self, nome):
+        return os.path.join(self.diretorio, f"{nome}.{self.formato}")
+
+    async def _em_thread(self, funcao, *args):
+        # Executa no pool, juntando o que a operação imprimir
+        def executar():
+            buffer = self._saida.local.buffer = io.StringIO()
+            try:
+                return funcao(*args), [linha.strip() for linha in buffer.getvalue().splitlines() if linha.strip()]
+            finally:
+                self._saida.local.buffer = None
+        return await asyncio.get_running_loop().run_in_executor(self.executor, executar)
+
+    def _carregar(self, nome, saldo_inicial):
+        caminho = self.caminho(nome)
+        existe = abrir_armazenamento(caminho).existe()
+        if saldo_inicial is None and not existe:
+            raise ErroRequisicao(404, f"Ledger {nome} não encontrado.")
+        if saldo_inicial is not None and existe:
+            raise ErroRequisicao(409, f"O ledger {nome} já existe.")
+        # Tudo é lido na abertura, para que as leituras simultâneas não acessem o arquivo
+        excel = self.formato == 'xlsx'
+        return FinancasPessoais(caminho, diario=excel, segundo_plano=excel, sob_demanda=False,
+                                saldo_inicial=saldo_inicial)
+
+    async def _abrir(self, nome, saldo_inicial=None):
+        if nome in self._fechando:
+            await self._fechando[nome]
+        financas, _ = await self._em_thread(self._carregar, nome, saldo_inicial)
+        ledger = self._ledgers[nome] = _Ledger(financas)
+        self._liberar_espaco(manter=nome)
+        return ledger
+
+    async def _ledger(self, nome, saldo_inicial=None):
+        ledger = self._ledgers.get(nome)
+        if ledger is not None:
+            if saldo_inicial is not None:
+                raise ErroRequisicao(409, f"O ledger {nome} já existe.")
+            self._ledgers.move_to_end(nome)
+            return ledger
+        tarefa = self._abrindo.get(nome)
+        if tarefa is None:
+            tarefa = self._abrindo[nome] = asyncio.ensure_future(self._abrir(nome, saldo_inicial))
+            tarefa.add_done_callback(lambda _: self._abrindo.pop(nome, None))
+        elif saldo_inicial is not None:
+            raise ErroRequisicao(409, f"O ledger {nome} já existe.")
+        return await asyncio.shield(tarefa)
+
+    @asynccontextmanager
+    async def usar(self, nome, escrita=False, saldo_inicial=None):
+        ledger = await self._ledger(nome, saldo_inicial)
+        ledger.em_uso += 1
+        try:
+            async with (ledger.trava.escrita() if escrita else ledger.trava.leitura()):
+                yield ledger.financas
+        finally:
+            ledger.em_uso -= 1
+            ledger.ultimo_uso = time.monotonic()
+            if len(self._ledgers) > self.capacidade:
+                self._liberar_espaco(manter=None)
+
+    def _fechar(self, nome):
+        # Retira o ledger do cache na hora; o fechamento (gravação do que
+        # estiver pendente) termina no pool antes de uma nova abertura
+        ledger = self._ledgers.pop(nome)
+        futuro = asyncio.ensure_future(self._em_thread(ledger.financas.fechar))
+        self._fechando[nome] = futuro
+        futuro.add_done_callback(lambda _: self._fechando.pop(nome, None))
+        return futuro
+
+    def _liberar_espaco(self, manter):
+        # Fecha os ledgers ociosos menos usados acima da capacidade
+        excesso = len(self._ledgers) - self.capacidade
+        ociosos = [nome for nome, ledger in self._ledgers.items() if not ledger.em_uso and nome != manter]
+        for nome in ociosos[:max(excesso, 0)]:
+            self._fechar(nome)
+
+    async def _expirar_ociosos(self):
+        while True:
+            await asyncio.sleep(max(1, self.ocioso / 4))
+            limite = time.monotonic() - self.ocioso
+            for nome, ledger in list(self._ledgers.items()):
+                if not ledger.em_uso and ledger.ultimo_uso < limite:
+                    self._fechar(nome)
+
+    async def fechar_todos(self):
+        for nome in list(self._ledgers):
+            self._fechar(nome)
+        if self._fechando:
+            await asyncio.gather(*self._fechando.values())
+
+    def status(self):
+        return {'ledgers': list(self._ledgers), 'capacidade': self.capacidade, 'ocioso': self.ocioso}
+
+    async def processar(self, metodo, alvo, corpo):
+        # (status, tipo de conteúdo, corpo da resposta)
+        url = urlsplit(alvo)
+        partes = [parte for parte in url.path.split('/') if parte]
+        if partes == ['status']:
+            return 200, 'json', self.status()
+        if len(partes) < 2 or partes[0] != 'ledgers' or not NOME_LEDGER.fullmatch(partes[1]):
+            raise ErroRequisicao(404, "Recurso não encontrado.")
+        nome, recurso = partes[1], tuple(partes[2:])
+
+        if metodo == 'POST':
+            try:
+                dados = json.loads(corpo or b'{}')
+            except ValueError:
+                raise ErroRequisicao(400, "Corpo JSON inválido.")
+            if not isinstance(dados, dict):
+                raise ErroRequisicao(400, "O corpo deve ser um objeto JSON.")
+            if not recurso:
+                saldo_inicial = float(dados.get('saldo_inicial', 0))
+                async with self.usar(nome, escrita=True, saldo_inicial=saldo_inicial) as financas:
+                    return 201, 'json', _resumo(financas)
+            if recurso not in ESCRITAS:
+                raise ErroRequisicao(404, "Recurso não encontrado.")
+            async with self.usar(nome, escrita=True) as financas:
+                versao = financas.versao
+                _, mensagens = await self._em_thread(ESCRITAS[recurso], financas, dados)
+                alterou = financas.versao != versao
+                return (200 if alterou else 422), 'json', {'ok': alterou, 'saldo': financas.saldo, 'mensagens': mensagens}
+
+        if metodo != 'GET':
+            raise ErroRequisicao(405, "Método não permitido.")
+        if recurso == ('historico',):
+            # A consulta grava instantâneos no histórico, por isso é exclusiva
+            data = parse_qs(url.query).get('data', [None])[0]
+            data = date.fromisoformat(data) if data else date.today()
+            async with self.usar(nome, escrita=True) as financas:
+                estado, _ = await self._em_thread(financas.estado_em, data)
+            if estado is None:
+                raise ErroRequisicao(404, f"O histórico não tem registros até {data.isoformat()}.")
+            return 200, 'json', estado
+        async with self.usar(nome) as financas:
+            if not recurso:
+                resumo, _ = await self._em_thread(_resumo, financas)
+                return 200, 'json', resumo
+            if len(recurso) == 2 and recurso[0] == 'relatorios':
+                parametros = parse_qs(url.query)
+                formato = parametros.get('formato', ['json'])[0]
+                if formato not in FORMATOS:
+                    raise ErroRequisicao(400, f"Formato desconhecido: {formato}")
+                periodo = parametros.get('periodo', [None])[0]
+                texto, _ = await self._em_thread(_relatorio, financas, recurso[1], periodo, formato)
+                return 200, formato, texto
+            if len(recurso) == 2 and recurso[0] == 'busca':
+                resultado, _ = await self._em_thread(_buscar, financas, recurso[1], parse_qs(url.query))
+                return 200, 'json', resultado
+        raise ErroRequisicao(404, "Recurso não encontrado.")
+
+    async def _responder(self, escritor, status, formato, conteudo, manter):
+        if formato == 'json' and not isinstance(conteudo, str):
+            conteudo = json.dumps(conteudo, ensure_ascii=False, default=str)
+        dados = conteudo.encode('utf-8')
+        cabecalho = (f"HTTP/1.1 {status} {MENSAGENS_STATUS.get(status, '')}\r\n"
+                     f"Content-Type: {TIPOS_CONTEUDO[formato]}; charset=utf-8\r\n"
+                     f"Content-Length: {len(dados)}\r\n"
+                     f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n")
+        escritor.write(cabecalho.encode('latin-1') + dados)
+        await escritor.drain()
+
+    async def atender(self, leitor, escritor):
+        # Uma conexão HTTP/1.1, com várias requisições em sequência (keep-alive)
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha:
+                    break
+                try:
+                    metodo, alvo, _ = linha.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    await self._responder(escritor, 400, 'json', {'erro': "Requisição inválida."}, False)
+                    break
+                cabecalhos = {}
+                while True:
+                    linha = await leitor.readline()
+                    if linha in (b'\r\n', b'\n', b''):
+                        break
+                    nome, _, valor = linha.decode('latin-1').partition(':')
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                manter = cabecalhos.get('connection', '').lower() != 'close'
+
+                tamanho = int(cabecalhos.get('content-length') or 0)
+                if tamanho > TAMANHO_MAXIMO_CORPO:
+                    await self._responder(escritor, 413, 'json', {'erro': "Corpo muito grande."}, False)
+                    break
+                corpo = await leitor.readexactly(tamanho) if tamanho else b''
+                try:
+                    status, formato, conteudo = await self.processar(metodo, alvo, corpo)
+                except ErroRequisicao as e:
+                    status, formato, conteudo = e.status, 'json', {'erro': str(e)}
+                except (KeyError, TypeError, ValueError) as e:
+                    detalhe = f"campo obrigatório ausente: {e}" if isinstance(e, KeyError) else str(e)
+                    status, formato, conteudo = 400, 'json', {'erro': detalhe}
+                except Exception as e:
+                    status, formato, conteudo = 500, 'json', {'erro': str(e)}
+                await self._responder(escritor, status, formato, conteudo, manter)
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def executar(self, host='127.0.0.1', porta=8080):
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._saida = sys.stdout = _SaidaPorThread(sys.stdout)
+        servidor = await asyncio.start_server(self.atender, host, porta)
+        expiracao = asyncio.ensure_future(self._expirar_ociosos())
+        print(f"Servindo {self.diretorio} em http://{host}:{porta}")
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            expiracao.cancel()
+            await self.fechar_todos()
+            sys.stdout = self._saida.original
+            self.executor.shutdown()
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Servidor HTTP/JSON local para vários ledgers.")
+    parser.add_argument('--diretorio', default='ledgers', help="pasta com um arquivo por ledger")
+    parser.add_argument('--formato', choices=('db', 'xlsx'), default='db')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--max-ledgers', type=int, default=64, help="ledgers mantidos carregados")
+    parser.add_argument('--ocioso', type=float, default=300, help="segundos sem uso até fechar um ledger")
+    parser.add_argument('--threads', type=int, help="threads para as operações (padrão do Python)")
+    args = parser.parse_args(argumentos)
+
+    servidor = Servidor(args.diretorio, args.formato, args.max_ledgers, args.ocioso, args.threads)
+    try:
+        asyncio.run(servidor.executar(args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Elementos (investimentos × meses × cenários) calculados por vez, ~32 MB em float64
+ELEMENTOS_POR_BLOCO = 4_000_000
+
+
+def _valores_e_taxas(investimentos):
+    valores = np.array([inv['valor'] for inv in investimentos], dtype=float)
+    taxas = np.array([inv['rendimento_mensal'] for inv in investimentos], dtype=float) / 100
+    return valores, taxas
+
+
+def projetar_investimentos(investimentos, meses):
+    # Valor de cada investimento mês a mês (investimentos × meses+1), com juros
+    # compostos pelo rendimento mensal cadastrado; a coluna 0 é o valor atual
+    valores, taxas = _valores_e_taxas(investimentos)
+    fatores = (1 + taxas)[:, None] ** np.arange(meses + 1)
+    por_investimento = valores[:, None] * fatores
+    return {'por_investimento': por_investimento, 'total': por_investimento.sum(axis=0)}
+
+
+def _simular_bloco(valores, taxas, meses, cenarios, desvio, semente):
+    # Um bloco de cenários: taxas mensais sorteadas em torno do rendimento de cada
+    # investimento, compostas ao longo dos meses (investimentos × meses × cenários)
+    gerador = np.random.default_rng(semente)
+    sorteadas = gerador.normal(taxas[:, None, None], desvio, size=(len(valores), meses, cenarios))
+    acumulado = np.cumprod(1 + sorteadas, axis=1) * valores[:, None, None]
+    return acumulado.sum(axis=0), acumulado[:, -1, :]  # Total (meses × cenários) e valor final por investimento
+
+
+def simular_investimentos(investimentos, meses, cenarios=10000, desvio_mensal=0.2, percentis=(5, 50, 95),
+                          semente=None, processos=1):
+    # Monte Carlo dos investimentos. desvio_mensal é o desvio padrão da taxa
+    # mensal, em pontos percentuais. Os cenários são divididos em blocos com
+    # sementes derivadas de `semente`, então o resultado não depende de `processos`.
+    if cenarios < 1:
+        raise ValueError(f"a simulação precisa de pelo menos um cenário (recebeu {cenarios})")
+    valores, taxas = _valores_e_taxas(investimentos)
+    if not len(valores) or meses < 1:
+        return None
+    desvio = desvio_mensal / 100
+    por_bloco = max(1, ELEMENTOS_POR_BLOCO // (len(valores) * meses))
+    tamanhos = [min(por_bloco, cenarios - inicio) for inicio in range(0, cenarios, por_bloco)]
+    sementes = np.random.SeedSequence(semente).spawn(len(tamanhos))
+    argumentos = [(valores, taxas, meses, tamanho, desvio, s) for tamanho, s in zip(tamanhos, sementes)]
+
+    if processos > 1 and len(tamanhos) > 1:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            resultados = list(executor.map(_simular_bloco, *zip(*argumentos)))
+    else:
+        resultados = [_simular_bloco(*args) for args in argumentos]
+
+    totais = np.concatenate([total for total, _ in resultados], axis=1)
+    finais = np.concatenate([final for _, final in resultados], axis=1)
+    total_atual = np.full((len(percentis), 1), valores.sum())
+    return {
+        'percentis': list(percentis),
+        'total': np.hstack([total_atual, np.percentile(totais, percentis, axis=1)]),  # percentis × meses+1
+        'por_investimento': np.percentile(finais, percentis, axis=1),  # percentis × investimentos
+        'media_final': float(totais[-1].mean()),
+        'cenarios': cenarios,
+    }
@@ -0,0 +1,298 @@
+import numpy as np
+
+from dinheiro import para_centavos
+
+# O pandas só é importado ao converter de/para DataFrame
+
+# Tipo lógico da coluna -> dtype do array
+DTYPES = {
+    'centavos': np.int64,  # Valores monetários em centavos inteiros
+    'int': np.int32,
+    'bool': np.bool_,
+    'categoria': np.int32,  # Código no dicionário de rótulos (-1 = vazio)
+    'data': 'datetime64[D]',  # Data da transação (NaT = sem data)
+}
+
+# Linhas decodificadas por vez ao percorrer a tabela
+TAMANHO_BLOCO = 65536
+
+# Valor das linhas sem o campo preenchido
+VAZIOS = {'data': np.datetime64('NaT', 'D')}
+
+# Linhas novas conferidas uma a uma antes de serem intercaladas no índice ordenado
+LINHAS_FORA_DO_INDICE = 1024
+
+
+# Posições das linhas ordenadas pelo valor de uma coluna, para buscas por faixa
+# com searchsorted. Não é alterado depois de criado: linhas acrescentadas à
+# tabela ficam após `tamanho` até que uma nova versão as intercale.
+class IndiceOrdenado:
+    def __init__(self, coluna, ordem=None, chaves=None):
+        if ordem is None:
+            ordem = np.argsort(coluna, kind='stable')
+            chaves = coluna[ordem]
+        self.tamanho = len(ordem)
+        self.ordem = ordem
+        self.chaves = chaves
+        # Datas vazias (NaT) ficam no fim da ordem e fora de qualquer faixa
+        self.validos = self.tamanho - int(np.isnat(chaves).sum()) if chaves.dtype.kind == 'M' else self.tamanho
+
+    def intercalar(self, coluna):
+        # Nova versão com as linhas acrescentadas desde a criação, sem reordenar tudo
+        novas = np.arange(self.tamanho, len(coluna))
+        valores = coluna[novas]
+        ordem = np.argsort(valores, kind='stable')
+        posicoes = np.searchsorted(self.chaves, valores[ordem], 'right')
+        return IndiceOrdenado(coluna, np.insert(self.ordem, posicoes, novas[ordem]),
+                              np.insert(self.chaves, posicoes, valores[ordem]))
+
+    def _procurar(self, valores, lado):
+        # Os valores são convertidos ao tipo das chaves; do contrário o numpy
+        # converteria o índice inteiro a cada busca
+        chaves = self.chaves[:self.validos]
+        return np.searchsorted(chaves, np.asarray(valores, chaves.dtype), lado)
+
+    def faixa(self, minimo=None, maximo=None):
+        # Posições (em ordem de valor) das linhas indexadas com minimo <= valor <= maximo
+        inicio = 0 if minimo is None else int(self._procurar(minimo, 'left'))
+        fim = self.validos if maximo is None else int(self._procurar(maximo, 'right'))
+        return self.ordem[inicio:max(inicio, fim)]
+
+    def _limites(self, valores):
+        return self._procurar(valores, 'left'), self._procurar(valores, 'right')
+
+    def contar_em(self, valores):
+        inicios, fins = self._limites(valores)
+        return int((fins - inicios).sum())
+
+    def em(self, valores):
+        # Posições das linhas indexadas com valor em `valores` (ordenados), juntando
+        # as faixas de cada valor sem laço em Python
+        inicios, fins = self._limites(valores)
+        tamanhos = fins - inicios
+        deslocamentos = np.repeat(inicios - (np.cumsum(tamanhos) - tamanhos), tamanhos)
+        return self.ordem[np.arange(int(tamanhos.sum())) + deslocamentos]
+
+
+# Tabela com uma coluna tipada (array do numpy) por campo. Substitui as listas
+# de dicionários nas entidades de alto volume: cada linha ocupa algumas dezenas
+# de bytes e os totais são somas vetorizadas sobre inteiros.
+class TabelaColunar:
+    def __init__(self, tipos):
+        self.tipos = dict(tipos)
+        self._tamanho = 0
+        self._dados = {nome: np.empty(0, DTYPES[tipo]) for nome, tipo in self.tipos.items()}
+        # Dicionários das colunas categóricas: código -> rótulo e rótulo -> código
+        self._rotulos = {nome: [] for nome, tipo in self.tipos.items() if tipo == 'categoria'}
+        self._codigos = {nome: {} for nome in self._rotulos}
+        # Valores originais das linhas alteradas durante uma transação
+        self._desfazer = None
+        self._tamanho_inicial = 0
+        self._indices = {}  # Coluna -> IndiceOrdenado, criado na primeira busca
+
+    def __len__(self):
+        return self._tamanho
+
+    def _reservar(self, quantidade):
+        necessario = self._tamanho + quantidade
+        capacidade = len(next(iter(self._dados.values())))
+        if necessario <= capacidade:
+            return
+        capacidade = max(necessario, capacidade * 2, 16)
+        for nome, coluna in self._dados.items():
+            nova = np.full(capacidade, VAZIOS.get(self.tipos[nome], 0), coluna.dtype)
+            nova[:self._tamanho] = coluna[:self._tamanho]
+            self._dados[nome] = nova
+
+    def codigo(self, nome, rotulo, criar=False):
+        # Código de um rótulo; -1 para vazio e -2 para rótulo inexistente
+        if rotulo is None or (isinstance(rotulo, float) and rotulo != rotulo):
+            return -1
+        codigos = self._codigos[nome]
+        if rotulo not in codigos:
+            if not criar:
+                return -2
+            codigos[rotulo] = len(self._rotulos[nome])
+            self._rotulos[nome].append(rotulo)
+        return codigos[rotulo]
+
+    def rotulos(self, nome, inicio=0):
+        # Rótulos a partir do código `inicio`; os códigos nunca mudam
+        return self._rotulos[nome][inicio:]
+
+    def _codificar(self, nome, valor):
+        tipo = self.tipos[nome]
+        if tipo == 'categoria':
+            return self.codigo(nome, valor, criar=True)
+        if valor is None or (isinstance(valor, float) and valor != valor):
+            return VAZIOS.get(tipo, 0)
+        if tipo == 'centavos':
+            return para_centavos(valor)
+        if tipo == 'data':
+            return np.datetime64(valor, 'D')
+        return valor
+
+    def _decodificar(self, nome, dados):
+        tipo = self.tipos[nome]
+        if tipo == 'centavos':
+            return (dados / 100).tolist()
+        if tipo == 'categoria':
+            rotulos = np.array(self._rotulos[nome] + [None], dtype=object)
+            return rotulos[dados].tolist()  # O código -1 aponta para o None final
+        if tipo == 'data':
+            return dados.astype(object).tolist()  # datetime.date, ou None para NaT
+        return dados.tolist()
+
+    def _decodificar_valor(self, nome, valor):
+        # Uma única célula: o rótulo é lido direto da lista, sem percorrer o dicionário
+        tipo = self.tipos[nome]
+        if tipo == 'centavos':
+            return int(valor) / 100
+        if tipo == 'categoria':
+            return self._rotulos[nome][valor] if valor >= 0 else None
+        return valor.item()  # datetime.date (None para NaT), bool ou int
+
+    def adicionar(self, registro):
+        self._reservar(1)
+        indice = self._tamanho
+        self._tamanho += 1
+        self[indice] = registro
+        return indice
+
+    def estender(self, df):
+        # Acrescenta todas as linhas de um DataFrame de forma vetorizada
+        quantidade = len(df)
+        if quantidade == 0:
+            return
+        import pandas as pd
+        self._reservar(quantidade)
+        inicio, fim = self._tamanho, self._tamanho + quantidade
+        for nome, tipo in self.tipos.items():
+            if nome not in df:
+                continue
+            serie = df[nome]
+            if tipo == 'categoria':
+                codigos, rotulos = pd.factorize(serie)
+                mapa = np.array([self.codigo(nome, r, criar=True) for r in rotulos] + [-1], dtype=np.int32)
+                valores = mapa[codigos]
+            elif tipo == 'centavos':
+                reais = pd.to_numeric(serie, errors='coerce').fillna(0).to_numpy(float)
+                valores = np.rint(reais * 100)
+            elif tipo == 'data':
+                valores = pd.to_datetime(serie, errors='coerce').to_numpy('datetime64[D]')
+            elif tipo == 'bool':
+                valores = serie.fillna(False).astype(bool).to_numpy()
+            else:
+                valores = pd.to_numeric(serie, errors='coerce').fillna(0).to_numpy()
+            self._dados[nome][inicio:fim] = valores
+        self._tamanho = fim
+
+    def __getitem__(self, indice):
+        if not 0 <= indice < self._tamanho:
+            raise IndexError(indice)
+        return {nome: self._decodificar_valor(nome, coluna[indice]) for nome, coluna in self._dados.items()}
+
+    def __setitem__(self, indice, registro):
+        for nome in self.tipos:
+            self.definir(indice, nome, registro.get(nome))
+
+    def definir(self, indice, nome, valor):
+        coluna = self._dados[nome]
+        if self._desfazer is not None and indice < self._tamanho_inicial:
+            self._desfazer.setdefault((indice, nome), coluna[indice])
+        if nome in self._indices and indice < self._indices[nome].tamanho:
+            del self._indices[nome]  # Linha já indexada mudou de valor
+        coluna[indice] = self._codificar(nome, valor)
+
+    def iniciar_transacao(self):
+        self._desfazer = {}
+        self._tamanho_inicial = self._tamanho
+
+    def confirmar(self):
+        self._desfazer = None
+
+    def desfazer(self):
+        # Descarta as linhas novas e restaura as alteradas desde o início da transação.
+        # Rótulos novos continuam no dicionário, sem efeito nos dados.
+        for (indice, nome), valor in self._desfazer.items():
+            self._dados[nome][indice] = valor
+        for nome, coluna in self._dados.items():
+            coluna[self._tamanho_inicial:self._tamanho] = VAZIOS.get(self.tipos[nome], 0)
+        self._tamanho = self._tamanho_inicial
+        self._desfazer = None
+        self._indices = {}
+
+    def coluna(self, nome):
+        # Visão dos dados brutos (centavos ou códigos) das linhas ocupadas
+        return self._dados[nome][:self._tamanho]
+
+    def indice(self, nome):
+        # Índice ordenado da coluna; as linhas após indice.tamanho ainda não
+        # entraram nele e devem ser conferidas diretamente
+        indice = self._indices.get(nome)
+        if indice is None:
+            indice = self._indices[nome] = IndiceOrdenado(self.coluna(nome))
+        elif self._tamanho - indice.tamanho > LINHAS_FORA_DO_INDICE:
+            indice = self._indices[nome] = indice.intercalar(self.coluna(nome))
+        return indice
+
+    def mascara(self, nome, rotulo):
+        return self.coluna(nome) == self.codigo(nome, rotulo)
+
+    def registros(self, indices=None, bloco=TAMANHO_BLOCO):
+        # Gera um dicionário por linha, decodificando as colunas em blocos para
+        # que percorrer a tabela inteira use memória constante
+        nomes = list(self.tipos)
+        total = self._tamanho if indices is None else len(indices)
+        for inicio in range(0, total, bloco):
+            fatia = slice(inicio, inicio + bloco) if indices is None else indices[inicio:inicio + bloco]
+            colunas = [self._decodificar(nome, self.coluna(nome)[fatia]) for nome in nomes]
+            for valores in zip(*colunas):
+                yield dict(zip(nomes, valores))
+
+    def __iter__(self):
+        return self.registros()
+
+    def soma(self, nome='valor', mascara=None, em_centavos=False):
+        coluna = self.coluna(nome)
+        if mascara is not None:
+            coluna = coluna[mascara]
+        total = int(coluna.sum())
+        return total if em_centavos else total / 100
+
+    def somar_por(self, grupo, nome='valor', mascara=None, em_centavos=False):
+        # Total por rótulo da coluna categórica `grupo`, na ordem de cadastro
+        codigos = self.coluna(grupo)
+        valores = self.coluna(nome)
+        validos = codigos >= 0
+        if mascara is not None:
+            validos &= mascara
+        rotulos = self._rotulos[grupo]
+        totais = np.bincount(codigos[validos], weights=valores[validos], minlength=len(rotulos))
+        quantidades = np.bincount(codigos[validos], minlength=len(rotulos))
+        por_rotulo = {rotulos[c]: int(totais[c]) for c in np.flatnonzero(quantidades)}
+        return por_rotulo if em_centavos else {rotulo: total / 100 for rotulo, total in por_rotulo.items()}
+
+    def somar_por_mes(self, nome_data='data', nome='valor', mascara=None):
+        # Total em centavos por mês ('AAAA-MM') numa única passada agrupada;
+        # linhas sem data ficam de fora
+        datas = self.coluna(nome_data)
+        validos = ~np.isnat(datas)
+        if mascara is not None:
+            validos &= mascara
+        meses, grupos = np.unique(datas[validos].astype('datetime64[M]'), return_inverse=True)
+        totais = np.bincount(grupos, weights=self.coluna(nome)[validos], minlength=len(meses))
+        return {str(mes): int(total) for mes, total in zip(meses, totais)}
+
+    def para_dataframe(self):
+        import pandas as pd
+        dados = {}
+        for nome, tipo in self.tipos.items():
+            coluna = self.coluna(nome)
+            if tipo == 'centavos':
+                dados[nome] = coluna / 100
+            elif tipo == 'categoria':
+                dados[nome] = pd.Categorical.from_codes(coluna, categories=pd.Index(self._rotulos[nome], dtype=object))
+            else:
+                dados[nome] = coluna.copy()
+        return pd.DataFrame(dados)
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def pasta(tmp_path, monkeypatch):
+    # A pasta de relatórios é criada no diretório atual
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,63 @@
+from datetime import date
+
+import pytest
+
+from main import FinancasPessoais
+
+
+def preencher(financas):
+    financas.adicionar_recebimento(3000, 5, 'Salário', data=date(2026, 9, 5))
+    financas.adicionar_gasto(120.55, 'Mercado', 'Feira', data=date(2026, 9, 6))
+    financas.cadastrar_cartao('Nubank', 2000, 10)
+    financas.adicionar_gasto(300, 'Eletrônicos', 'Fone', tipo='crédito', cartao='Nubank', parcelado=True,
+                             parcelas=3, data=date(2026, 9, 7))
+    financas.adicionar_gasto(45.9, 'Lazer', 'Cinema', tipo='crédito', cartao='Nubank', data=date(2026, 9, 8))
+    financas.adicionar_financiamento(1200, 12, 'Geladeira')
+    financas.adicionar_investimento(500, 'CDB', 'Banco X', 1.0)
+
+
+def estado(financas):
+    return {
+        'saldo': financas.saldo,
+        'categorias': set(financas.categorias),
+        'recebimentos': list(financas.recebimentos),
+        'gastos': list(financas.gastos),
+        'faturas': list(financas.faturas),
+        'parcelas': list(financas.parcelas),
+        'cartoes': list(financas.cartoes),
+        'financiamentos': list(financas.financiamentos),
+        'investimentos': list(financas.investimentos),
+        'pendentes': financas.faturas_pendentes(),
+    }
+
+
+@pytest.mark.parametrize('arquivo', ['financas.xlsx', 'financas.db'])
+@pytest.mark.parametrize('sob_demanda', [True, False])
+def test_dados_sobrevivem_a_gravacao_e_leitura(pasta, arquivo, sob_demanda):
+    financas = FinancasPessoais(arquivo, saldo_inicial=1000)
+    preencher(financas)
+    esperado = estado(financas)
+    financas.fechar()
+
+    reaberto = FinancasPessoais(arquivo, sob_demanda=sob_demanda)
+    assert estado(reaberto) == esperado
+    assert reaberto.verificar_agregados() == []
+    reaberto.fechar()
+
+
+@pytest.mark.parametrize('arquivo', ['financas.xlsx', 'financas.db'])
+def test_exportar_e_importar_planilha(pasta, arquivo):
+    financas = FinancasPessoais(arquivo, saldo_inicial=1000)
+    preencher(financas)
+    esperado = estado(financas)
+    financas.exportar_excel('exportado.xlsx')
+    financas.fechar()
+
+    destino = 'copia.db' if arquivo.endswith('.xlsx') else 'copia.xlsx'
+    convertido = FinancasPessoais(destino, saldo_inicial=0)
+    convertido.importar_excel('exportado.xlsx')
+    convertido.fechar()
+
+    reaberto = FinancasPessoais(destino)
+    assert estado(reaberto) == esperado
+    reaberto.fechar()
@@ -0,0 +1,115 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from busca import termos
+from main import FinancasPessoais
+
+PALAVRAS = ['Supermercado', 'Açaí', 'Padaria', 'Pão', 'Farmácia', 'Posto', 'Uber', 'Cinema', 'Livraria', 'Mercadão']
+CATEGORIAS = ['Alimentação', 'Transporte', 'Saúde', 'Lazer']
+CARTOES = ['Visa', 'Master']
+
+
+def gastos_aleatorios(gerador, quantidade):
+    credito = gerador.random(quantidade) < 0.5
+    return pd.DataFrame({
+        'categoria': gerador.choice(np.array(CATEGORIAS, dtype=object), quantidade),
+        'valor': gerador.integers(100, 100000, quantidade) / 100,
+        'descricao': [' '.join(gerador.choice(PALAVRAS, gerador.integers(1, 4))) + f' {numero % 50}'
+                      for numero in gerador.integers(0, 1000, quantidade)],
+        'tipo': np.where(credito, 'crédito', 'débito').astype(object),
+        'cartao': np.where(credito, gerador.choice(np.array(CARTOES, dtype=object), quantidade), None),
+        'parcelado': False,
+        'parcelas_total': 1,
+        'parcelas_restantes': 1,
+        'data': np.datetime64('2026-01-01') + gerador.integers(0, 365, quantidade),
+    })
+
+
+def com_termos(financas):
+    return [(gasto, termos(gasto['descricao'])) for gasto in financas.gastos]
+
+
+def forca_bruta(gastos, texto=None, categoria=None, cartao=None, tipo=None, valor_minimo=None,
+                valor_maximo=None, data_inicial=None, data_final=None):
+    # Confere cada gasto de com_termos() contra todos os filtros
+    procurados = termos(texto) if texto is not None else []
+    encontrados = []
+    for gasto, descricao in gastos:
+        if not all(any(termo.startswith(procurado) for termo in descricao) for procurado in procurados):
+            continue
+        if any(valor is not None and gasto[nome] != valor
+               for nome, valor in (('categoria', categoria), ('cartao', cartao), ('tipo', tipo))):
+            continue
+        if valor_minimo is not None and gasto['valor'] < valor_minimo:
+            continue
+        if valor_maximo is not None and gasto['valor'] > valor_maximo:
+            continue
+        if data_inicial is not None and gasto['data'] < data_inicial:
+            continue
+        if data_final is not None and gasto['data'] > data_final:
+            continue
+        encontrados.append(gasto)
+    return encontrados
+
+
+def consultas(gerador, quantidade):
+    for _ in range(quantidade):
+        filtros = {}
+        if gerador.random() < 0.6:
+            palavras = gerador.choice(PALAVRAS + ['super', 'pa', 'acai', 'mercad', '7', 'inexistente'],
+                                      gerador.integers(1, 3))
+            filtros['texto'] = ' '.join(palavras)
+        if gerador.random() < 0.3:
+            filtros['categoria'] = str(gerador.choice(CATEGORIAS + ['Nunca usada']))
+        if gerador.random() < 0.3:
+            filtros['cartao'] = str(gerador.choice(CARTOES))
+        if gerador.random() < 0.2:
+            filtros['tipo'] = str(gerador.choice(['crédito', 'débito']))
+        if gerador.random() < 0.4:
+            minimo = int(gerador.integers(100, 100000))
+            filtros['valor_minimo'] = minimo / 100
+            filtros['valor_maximo'] = (minimo + int(gerador.integers(0, 30000))) / 100
+        if gerador.random() < 0.4:
+            inicio = date(2026, 1, 1) + timedelta(days=int(gerador.integers(0, 365)))
+            filtros['data_inicial'] = inicio
+            filtros['data_final'] = inicio + timedelta(days=int(gerador.integers(0, 60)))
+        yield filtros
+
+
+@pytest.fixture
+def financas(pasta):
+    financas = FinancasPessoais('financas.db', saldo_inicial=10 ** 7, autosave=False, historico=False)
+    financas.carregar_em_lote({'Gastos': gastos_aleatorios(np.random.default_rng(1), 3000)})
+    return financas
+
+
+def test_busca_confere_com_forca_bruta(financas):
+    gastos = com_termos(financas)
+    for filtros in consultas(np.random.default_rng(2), 200):
+        assert financas.buscar(**filtros) == forca_bruta(gastos, **filtros), filtros
+
+
+def test_busca_inclui_linhas_acrescentadas_depois_dos_indices(financas):
+    gerador = np.random.default_rng(3)
+    for filtros in consultas(gerador, 50):
+        financas.buscar(**filtros)
+
+    # Lote maior que as linhas toleradas fora do índice, e lançamentos avulsos
+    # com descrições ainda não indexadas
+    financas.carregar_em_lote({'Gastos': gastos_aleatorios(gerador, 1500)})
+    financas.adicionar_gasto(12.34, 'Lazer', 'Pipoca Gourmet', data=date(2026, 6, 1))
+    financas.adicionar_gasto(99.9, 'Saúde', 'Farmácia Nova', tipo='débito', data=date(2026, 6, 2))
+
+    gastos = com_termos(financas)
+    for filtros in list(consultas(gerador, 200)) + [{'texto': 'pipoca'}, {'texto': 'farm nova'}]:
+        assert financas.buscar(**filtros) == forca_bruta(gastos, **filtros), filtros
+    assert len(financas.buscar(texto='gourmet')) == 1
+
+
+def test_limite_e_entidade_invalida(financas):
+    assert financas.buscar(texto='pao', limite=5) == forca_bruta(com_termos(financas), texto='pao')[:5]
+    with pytest.raises(ValueError):
+        financas.buscar('faturas')
@@ -0,0 +1,63 @@
+from datetime import date
+
+from main import FinancasPessoais
+from relatorios import CacheRelatorios
+
+
+def eventos_contados(chamadas, titulo='Relatório'):
+    def eventos():
+        chamadas.append(titulo)
+        yield ('titulo', titulo)
+    return eventos
+
+
+def test_texto_reaproveitado_enquanto_a_versao_nao_muda():
+    cache, chamadas = CacheRelatorios(), []
+    primeiro = cache.obter('completo', 1, eventos_contados(chamadas))
+    assert cache.obter('completo', 1, eventos_contados(chamadas)) == primeiro
+    assert (cache.acertos, cache.falhas, len(chamadas)) == (1, 1, 1)
+
+    # Outro formato é outro texto
+    assert cache.obter('completo', 1, eventos_contados(chamadas), 'json') != primeiro
+    assert len(chamadas) == 2
+
+    cache.obter('completo', 2, eventos_contados(chamadas))
+    assert len(chamadas) == 3
+
+
+def test_limites_de_quantidade_e_de_tamanho():
+    cache, chamadas = CacheRelatorios(maximo=2, limite=200), []
+    for chave in ('a', 'b', 'a', 'c'):
+        cache.obter(chave, 1, eventos_contados(chamadas, chave))
+    # 'b' era o menos usado quando 'c' entrou
+    assert chamadas == ['a', 'b', 'c']
+    cache.obter('a', 1, eventos_contados(chamadas, 'a'))
+    cache.obter('b', 1, eventos_contados(chamadas, 'b'))
+    assert chamadas == ['a', 'b', 'c', 'b']
+
+    grande = 'x' * 300
+    cache.obter('grande', 1, eventos_contados(chamadas, grande))
+    cache.obter('grande', 1, eventos_contados(chamadas, grande))
+    assert chamadas[-2:] == [grande, grande]
+
+
+def test_relatorio_refeito_somente_apos_alteracao(pasta):
+    financas = FinancasPessoais('financas.db', saldo_inicial=100)
+    financas.adicionar_recebimento(50, 1, 'Salário', data=date(2026, 9, 1))
+
+    with open(financas.relatorio_completo(), encoding='utf-8') as arquivo:
+        primeiro = arquivo.read()
+    with open(financas.relatorio_completo(), encoding='utf-8') as arquivo:
+        assert arquivo.read() == primeiro
+    assert financas.cache_relatorios.acertos == 1
+
+    # Operação recusada não muda a versão nem o relatório
+    financas.adicionar_gasto(10 ** 6, 'Mercado', 'Compra grande')
+    assert financas.texto_relatorio(('completo',), financas._eventos_completo) == primeiro
+    assert financas.cache_relatorios.acertos == 2
+
+    financas.adicionar_recebimento(75, 2, 'Freelance', data=date(2026, 9, 2))
+    atualizado = financas.texto_relatorio(('completo',), financas._eventos_completo)
+    assert 'Freelance' in atualizado and 'Freelance' not in primeiro
+    assert financas.cache_relatorios.acertos == 2
+    financas.fechar()
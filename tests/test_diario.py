@@ -0,0 +1,72 @@
+import os
+from datetime import date
+
+from armazenamento import caminho_diario
+from main import FinancasPessoais
+
+
+def lancar(financas, quantidade):
+    for dia in range(1, quantidade + 1):
+        financas.adicionar_recebimento(100 + dia, dia, f'Recebimento {dia}', data=date(2026, 9, dia))
+        financas.adicionar_gasto(10.5 * dia, 'Mercado', f'Gasto {dia}', data=date(2026, 9, dia))
+
+
+def estado(financas):
+    return financas.saldo, list(financas.recebimentos), list(financas.gastos), set(financas.categorias)
+
+
+def test_alteracoes_nao_compactadas_sao_recuperadas(pasta, capsys):
+    financas = FinancasPessoais('financas.xlsx', diario=True, saldo_inicial=1000)
+    lancar(financas, 3)
+    esperado = estado(financas)
+    financas.fechar(compactar=False)
+    assert os.path.getsize(caminho_diario('financas.xlsx')) > 0
+
+    # Sem o diário, o Excel ainda está como na criação
+    assert FinancasPessoais('financas.xlsx').saldo == 1000
+
+    capsys.readouterr()
+    reaberto = FinancasPessoais('financas.xlsx', diario=True)
+    assert '6 alterações recuperadas do diário.' in capsys.readouterr().out
+    assert estado(reaberto) == esperado
+    assert reaberto.verificar_agregados() == []
+
+
+def test_linha_truncada_do_diario_e_descartada(pasta):
+    financas = FinancasPessoais('financas.xlsx', diario=True, saldo_inicial=1000)
+    lancar(financas, 2)
+    esperado = estado(financas)
+    financas.fechar(compactar=False)
+
+    diario = caminho_diario('financas.xlsx')
+    tamanho = os.path.getsize(diario)
+    with open(diario, 'a', encoding='utf-8') as arquivo:
+        arquivo.write('{"seq": 5, "alteracoes": [["Recebimentos", 2, {"valor": 9')
+
+    reaberto = FinancasPessoais('financas.xlsx', diario=True)
+    assert estado(reaberto) == esperado
+    assert os.path.getsize(diario) == tamanho
+
+
+def test_registros_ja_compactados_nao_sao_reaplicados(pasta):
+    # A compactação a cada 4 registros grava o Excel no meio dos lançamentos;
+    # os registros seguintes ficam só no diário
+    financas = FinancasPessoais('financas.xlsx', diario=True, compactar_a_cada=4, saldo_inicial=1000)
+    lancar(financas, 3)
+    esperado = estado(financas)
+    financas.fechar(compactar=False)
+    assert FinancasPessoais('financas.xlsx').saldo == 1000 + 101 + 102 - 10.5 - 21
+
+    reaberto = FinancasPessoais('financas.xlsx', diario=True)
+    assert estado(reaberto) == esperado
+    assert len(reaberto.gastos) == 3
+
+
+def test_fechar_compacta_e_esvazia_o_diario(pasta):
+    financas = FinancasPessoais('financas.xlsx', diario=True, saldo_inicial=1000)
+    lancar(financas, 2)
+    esperado = estado(financas)
+    financas.fechar()
+
+    assert os.path.getsize(caminho_diario('financas.xlsx')) == 0
+    assert estado(FinancasPessoais('financas.xlsx')) == esperado
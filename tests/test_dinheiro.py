@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+import pytest
+
+from dinheiro import arredondar, dividir, ler_centavos, pago_ate, para_centavos, para_reais
+
+
+def test_para_centavos_arredonda_ao_centavo():
+    assert para_centavos(0.1 + 0.2) == 30
+    assert para_centavos(19.999) == 2000
+    assert para_centavos(-12.346) == -1235
+    assert para_centavos(Decimal('1.005')) == 101
+    assert para_centavos('1.005') == 101
+    assert para_centavos(7) == 700
+
+
+def test_para_reais_e_arredondar():
+    assert para_reais(12345) == 123.45
+    assert arredondar(0.1 + 0.2) == 0.3
+    assert arredondar(1.239) == 1.24
+
+
+@pytest.mark.parametrize('texto, centavos', [
+    ('1234.56', 123456),
+    ('-1.234,56', -123456),
+    ('R$ 50,00', 5000),
+    ('  7 ', 700),
+    ('0,005', 1),
+])
+def test_ler_centavos(texto, centavos):
+    assert ler_centavos(texto) == centavos
+
+
+@pytest.mark.parametrize('texto', ['', 'abc', '12,3,4', 'nan', 'inf', '-Infinity'])
+def test_ler_centavos_rejeita_texto_invalido(texto):
+    with pytest.raises(ValueError):
+        ler_centavos(texto)
+
+
+@pytest.mark.parametrize('centavos, partes', [(1000, 3), (100, 1), (1, 4), (99999, 7), (0, 5)])
+def test_dividir_soma_exatamente_o_total(centavos, partes):
+    parcelas = dividir(centavos, partes)
+    assert len(parcelas) == partes
+    assert sum(parcelas) == centavos
+    assert all(parcela == parcelas[0] for parcela in parcelas[:-1])
+    assert 0 <= parcelas[-1] - parcelas[0] < partes
+
+
+def test_dividir_deixa_o_resto_na_ultima():
+    assert dividir(1000, 3) == [333, 333, 334]
+
+
+@pytest.mark.parametrize('centavos, partes', [(1000, 3), (99999, 7), (5, 2)])
+def test_pago_ate_confere_com_dividir(centavos, partes):
+    parcelas = dividir(centavos, partes)
+    for pagas in range(partes + 2):
+        assert pago_ate(centavos, partes, pagas) == sum(parcelas[:pagas])
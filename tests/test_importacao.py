@@ -0,0 +1,73 @@
+from datetime import date
+
+import pytest
+
+from main import FinancasPessoais
+
+CSV = """data;valor;descricao;categoria
+01/09/2026;2500,00;Salário;
+02/09/2026;-35,90;Padaria;Alimentação
+02/09/2026;-35,90;Padaria;Alimentação
+03/09/2026;-120,00;Farmácia;
+31/02/2026;-10,00;Data inválida;
+"""
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20260901<TRNAMT>2500.00<MEMO>Salário</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20260902<TRNAMT>-35.90<MEMO>Padaria</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+@pytest.fixture
+def financas(pasta):
+    financas = FinancasPessoais('financas.db', saldo_inicial=10000)
+    yield financas
+    financas.fechar()
+
+
+def escrever(pasta, nome, conteudo, encoding='utf-8'):
+    caminho = pasta / nome
+    caminho.write_text(conteudo, encoding=encoding)
+    return str(caminho)
+
+
+def test_segunda_importacao_nao_repete_lancamentos(pasta, financas):
+    extrato = escrever(pasta, 'extrato.csv', CSV)
+    resumo = financas.importar_extrato(extrato)
+    assert (resumo['recebimentos'], resumo['gastos'], resumo['invalidos']) == (1, 3, 1)
+    saldo, versao = financas.saldo, financas.versao
+
+    resumo = financas.importar_extrato(extrato)
+    assert (resumo['recebimentos'], resumo['gastos'], resumo['duplicados']) == (0, 0, 4)
+    assert (financas.saldo, financas.versao) == (saldo, versao)
+    assert len(financas.gastos) == 3
+
+
+def test_linhas_iguais_sao_casadas_uma_a_uma(pasta, financas):
+    # Duas compras iguais no mesmo dia já lançadas; o extrato traz três
+    for _ in range(2):
+        financas.adicionar_gasto(35.9, 'Alimentação', 'Padaria', data=date(2026, 9, 2))
+    extrato = escrever(pasta, 'extrato.csv', "data;valor;descricao\n" + "02/09/2026;-35,90;Padaria\n" * 3)
+
+    resumo = financas.importar_extrato(extrato)
+    assert (resumo['gastos'], resumo['duplicados']) == (1, 2)
+    assert len(financas.gastos) == 3
+
+
+def test_duplicados_reconhecidos_depois_de_reabrir(pasta, financas):
+    extrato = escrever(pasta, 'extrato.csv', CSV)
+    financas.importar_extrato(extrato)
+    financas.fechar()
+
+    reaberto = FinancasPessoais('financas.db')
+    resumo = reaberto.importar_extrato(extrato)
+    assert (resumo['recebimentos'], resumo['gastos'], resumo['duplicados']) == (0, 0, 4)
+    reaberto.fechar()
+
+
+def test_ofx_e_csv_do_mesmo_periodo_nao_duplicam(pasta, financas):
+    financas.importar_extrato(escrever(pasta, 'extrato.ofx', OFX, encoding='latin-1'))
+    resumo = financas.importar_extrato(escrever(pasta, 'extrato.csv', CSV))
+    assert (resumo['recebimentos'], resumo['gastos'], resumo['duplicados']) == (0, 2, 2)
@@ -0,0 +1,54 @@
+from copy import deepcopy
+from datetime import date
+
+import pytest
+
+from main import FinancasPessoais
+
+
+@pytest.fixture(params=['financas.xlsx', 'financas.db'])
+def arquivo(pasta, request):
+    financas = FinancasPessoais(request.param, saldo_inicial=1000)
+    financas.cadastrar_cartao('Visa', 500, 10)
+    financas.adicionar_gasto(50, 'Mercado', 'Feira', data=date(2026, 9, 1))
+    financas.fechar()
+    return request.param
+
+
+def estado(financas):
+    # Cópia profunda: os registros pequenos (cartões) são alterados no lugar
+    return deepcopy((financas.saldo, list(financas.recebimentos), list(financas.gastos), list(financas.parcelas),
+            list(financas.cartoes), set(financas.categorias), financas.faturas_pendentes()))
+
+
+def test_excecao_desfaz_tudo_desde_o_inicio(arquivo):
+    financas = FinancasPessoais(arquivo)
+    antes = estado(financas)
+    with pytest.raises(RuntimeError):
+        with financas.transacao():
+            financas.adicionar_recebimento(200, 2, 'Bônus', data=date(2026, 9, 2))
+            financas.adicionar_gasto(120, 'Viagem', 'Hotel', tipo='crédito', cartao='Visa', parcelado=True,
+                                     parcelas=4, data=date(2026, 9, 3))
+            with financas.transacao():
+                financas.adicionar_gasto(30, 'Lazer', 'Cinema', data=date(2026, 9, 4))
+            raise RuntimeError('falha no meio do lote')
+    assert estado(financas) == antes
+    assert financas.verificar_agregados() == []
+    financas.fechar()
+
+    assert estado(FinancasPessoais(arquivo)) == antes
+
+
+def test_bloco_concluido_e_gravado_de_uma_vez(arquivo):
+    financas = FinancasPessoais(arquivo)
+    with financas.transacao():
+        financas.adicionar_recebimento(200, 2, 'Bônus', data=date(2026, 9, 2))
+        financas.adicionar_gasto(120, 'Viagem', 'Hotel', tipo='crédito', cartao='Visa', parcelado=True, parcelas=4,
+                                 data=date(2026, 9, 3))
+        # Nada é gravado antes da saída do bloco
+        assert FinancasPessoais(arquivo, historico=False).saldo == 950
+    depois = estado(financas)
+    financas.fechar()
+
+    assert estado(FinancasPessoais(arquivo)) == depois
+    assert depois[0] == 1150